@@ -2,10 +2,21 @@
 Generate a Files ORM object
 """
 import hashlib
+import mmap
+import os
 from datetime import datetime
 from pathlib import Path
+from typing import Dict, Iterable, Optional
 
 from ORMModel import ImageFile
+from records import FileRecord
+from util import time_proc
+
+# storage.files.digest and persistent_id are sized for it
+DIGEST_ALGORITHM: str = 'sha256'
+
+# Read size of the digest engine. See bench/digest_throughput.py
+DIGEST_BUFFER_SIZE: int = 1024 * 1024
 
 
 def f_validity(f: Path) -> ():
@@ -36,27 +47,122 @@ def f_md5(f: Path) -> str:
     return hash_md5.digest()
 
 
-def f_size(f: Path) -> int:
-    return f.stat().st_size
+def _fadvise(fd: int, advice_name: str):
+    # posix_fadvise is not available on every platform, and is only a hint
+    advice = getattr(os, advice_name, None)
+    if hasattr(os, 'posix_fadvise') and advice is not None:
+        try:
+            os.posix_fadvise(fd, 0, 0, advice)
+        except OSError:
+            pass
 
 
-def f_created(f: Path) -> datetime:
-    return datetime.fromtimestamp(f.stat().st_ctime)
+def f_digests(f: Path, algorithms: Iterable[str] = (DIGEST_ALGORITHM,), buffer_size: int = DIGEST_BUFFER_SIZE,
+              use_mmap: bool = False, drop_cache: bool = True) -> Dict[str, bytes]:
+    """
+    Compute several digests of a file in one read of it.
+    The kernel is told the file is read sequentially, and, when drop_cache is set,
+    that its pages are not needed afterwards, so that scanning terabytes does not
+    evict everything else from the page cache.
+    :param f: Path to file
+    :param algorithms: hashlib names, e.g. ('sha256', 'md5', 'sha512')
+    :param buffer_size: bytes handed to the hashes at a time
+    :param use_mmap: hash a memory map of the file instead of read() buffers
+    :param drop_cache: advise POSIX_FADV_DONTNEED once the file is hashed
+    :return: {algorithm: digest}
+    """
+    hashes = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    with time_proc.stage('hash'), open(f, "rb", buffering=0) as fh:
+        fd = fh.fileno()
+        _fadvise(fd, 'POSIX_FADV_SEQUENTIAL')
+        size = os.fstat(fd).st_size
+        if use_mmap and size > 0:
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, 'madvise'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mm) as view:
+                    for offset in range(0, size, buffer_size):
+                        for h in hashes.values():
+                            h.update(view[offset:offset + buffer_size])
+        else:
+            buffer = bytearray(buffer_size)
+            with memoryview(buffer) as view:
+                while True:
+                    n = fh.readinto(buffer)
+                    if not n:
+                        break
+                    for h in hashes.values():
+                        h.update(view[:n])
+        if drop_cache:
+            _fadvise(fd, 'POSIX_FADV_DONTNEED')
+    return {algorithm: h.digest() for algorithm, h in hashes.items()}
 
 
-def f_to_files(f: Path) -> ImageFile:
+def f_digests_bytes(data: bytes, algorithms: Iterable[str] = (DIGEST_ALGORITHM,)) -> Dict[str, bytes]:
+    """
+    Same as f_digests, for a file already read into memory, see f_read
     """
-    Generate a Files ORM object
+    with time_proc.stage('hash'):
+        return {algorithm: hashlib.new(algorithm, data).digest() for algorithm in algorithms}
+
+
+def f_sha256(f: Path) -> bytes:
+    """
+    Generate a sha256 hash of the file
     :param f: Path to file
-    :return: Files ORM object
+    :return: sha256 hash (32 bytes)
+    """
+    return f_digests(f, ('sha256',))['sha256']
+
+
+def f_read(f: Path) -> bytes:
+    """
+    Read a whole file in one call, so that the same bytes can be hashed and parsed
+    :param f: Path to file
+    :return: the file's content
     """
-    f_digest = f_md5(f)
+    with time_proc.stage('read'), open(f, "rb") as fh:
+        return fh.read()
+
+
+def f_size(f: Path, st: Optional[os.stat_result] = None) -> int:
+    return (st or f.stat()).st_size
+
+
+def f_created(f: Path, st: Optional[os.stat_result] = None) -> datetime:
+    return datetime.fromtimestamp((st or f.stat()).st_ctime)
+
+
+def f_to_file_record(f: Path, st: Optional[os.stat_result] = None, data: Optional[bytes] = None,
+                     digest: Optional[bytes] = None) -> FileRecord:
+    """
+    Generate the record of a file's storage.files row
+    :param f: Path to file
+    :param st: the file's stat result, if the caller already has it
+    :param data: the file's content, if the caller already read it (see f_read). The file is not read again.
+    :param digest: the file's DIGEST_ALGORITHM digest, if the caller already computed it
+    :return: FileRecord
+    """
+    if st is None:
+        st = f.stat()
+    f_digest = digest
+    if f_digest is None:
+        f_digest = (f_digests(f) if data is None else f_digests_bytes(data))[DIGEST_ALGORITHM]
     f_pronom: () = f_pronoms(f)
-    return ImageFile(
+    return FileRecord(
         digest=f_digest,
-        size=f_size(f),
-        persistent_id=f_digest,  # provisional
+        size=f_size(f, st),
+        persistent_id=f_digest,  # the sha256, until a collision forces a random id
         validity="not_set",
         pronom_number=f_pronom[0],
-        created_at=f_created(f),
+        created_at=f_created(f, st),
         earliest_mdate=None)
+
+
+def f_to_files(f: Path, st: Optional[os.stat_result] = None, data: Optional[bytes] = None,
+               digest: Optional[bytes] = None) -> ImageFile:
+    """
+    Generate a Files ORM object, see f_to_file_record
+    :return: Files ORM object
+    """
+    return ImageFile(**f_to_file_record(f, st, data, digest).to_row())
@@ -22,7 +22,7 @@ class ImageFileInfo(Base):
     __table_args__ = {'schema':'content','comment': 'Table containing information about image files'}
 
     id = Column(INTEGER, primary_key=True)
-    storage_file_id = Column(ForeignKey('storage.files.id'), index=True, comment='storage.files.id FK')
+    storage_file_id = Column(ForeignKey('storage.files.id'), index=True, unique=True, comment='storage.files.id FK')
     image_type = Column(Enum('jpg', 'png', 'single_image_tiff', 'jp2', 'raw'), nullable=False)
     image_mode = Column(Enum('1', 'L', 'RGB', 'RGBA', 'CMYK', 'P', 'OTHER'), nullable=False)
     tiff_compression = Column(Enum('raw', 'tiff_ccitt', 'group3', 'group4', 'tiff_lzw', 'tiff_jpeg', 'jpeg', 'tiff_adobe_deflate', 'lzma', 'other'), comment='names are from PIL version 10')
@@ -61,8 +61,9 @@ class PdfFileInfo(Base):
     number_of_pages = Column(SMALLINT, comment='the number of pages')
     median_nb_chr_per_page = Column(SMALLINT, comment='the average number of characters in a page')
     median_nb_images_per_page = Column(SMALLINT, comment='the average number of images per page')
+    median_sample_size = Column(SMALLINT, comment='the number of pages the medians were computed on, NULL when computed on all pages')
     recorded_date = Column(TIMESTAMP, comment='the timestamp recorded in the exif metadata')
-    storage_file_id = Column(Integer, comment='storage.files.id FK')
+    storage_file_id = Column(Integer, unique=True, comment='storage.files.id FK')
     create_time = Column(TIMESTAMP, server_default=text("CURRENT_TIMESTAMP"))
     update_time = Column(TIMESTAMP, server_default=text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"))
 
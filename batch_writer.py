@@ -0,0 +1,174 @@
+"""
+Batched writer of scan records: one multi-row upsert per table per batch
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert
+
+from ORMModel import ImageFileInfo, ImagePath, PdfFileInfo
+from records import FileRecord, ImageInfoRecord, PdfInfoRecord
+from resolver import StorageResolver
+from util import time_proc
+from util.file_walker import image_group_of
+
+__all__ = ['FILE_COLUMNS', 'IMAGE_INFO_COLUMNS', 'PDF_INFO_COLUMNS', 'BatchWriter']
+
+# Every row of a multi-row insert must have the same keys: those of the records
+FILE_COLUMNS = FileRecord.__slots__
+IMAGE_INFO_COLUMNS = ('storage_file_id',) + ImageInfoRecord.__slots__
+PDF_INFO_COLUMNS = ('storage_file_id',) + PdfInfoRecord.__slots__
+
+_INFO_TABLES = {
+    'image': (ImageFileInfo.__table__, IMAGE_INFO_COLUMNS),
+    'pdf': (PdfFileInfo.__table__, PDF_INFO_COLUMNS),
+}
+
+
+class BatchWriter:
+    """
+    Collects scan records (see run/read_write.extract_one) and writes them with
+    Core statements, bypassing the ORM unit of work. Rows are built from the records here, and only here:
+
+    - storage.files ids, through a StorageResolver: nothing for the files it has cached, else one SELECT
+      for the batch, and one INSERT of its new files
+    - one upsert per info table, keyed on the unique storage_file_id
+    - one SELECT per info table resolving the info row ids
+    - with a root_id, storage.objects ids of the batch's OCFL objects (see util.file_walker.StorageObject),
+      through the resolver in the same way
+    - one SELECT of the batch's existing storage.paths, and one insert of the new ones
+
+    Records which already carry a 'file_id' (files found by KnownFiles) only get their path written.
+    Each flushed record gets 'file_id' and 'info_id' keys, and 'object_id' with a root_id.
+    The paths of files in an object are relative to the object root.
+    """
+
+    def __init__(self, session, batch_size: int = 500, commit_interval: int = 5000,
+                 on_commit: Optional[Callable[[List[dict]], None]] = None,
+                 resolver: Optional[StorageResolver] = None, root_id: Optional[int] = None):
+        """
+        :param session: SQLAlchemy session, e.g. DrsDbContextBase.session
+        :param batch_size: records per multi-row statement
+        :param commit_interval: records between commits. Rounded up to whole batches
+        :param on_commit: called with the records of each commit, after the commit
+        :param resolver: resolves and adds files and objects. Default: a new one, on session
+        :param root_id: storage.roots.id of the OCFL storage root the records' objects are in. Without it,
+        storage objects are ignored
+        """
+        self._session = session
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self._on_commit = on_commit
+        self._resolver = resolver if resolver is not None else StorageResolver(session)
+        self.root_id = root_id
+        self._pending: List[dict] = []
+        self._uncommitted: List[dict] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+
+    def add(self, record: dict):
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the pending records, and commit if commit_interval is reached
+        """
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        new_files = [r for r in batch if r.get('file_id') is None]
+        for record in batch:
+            record['info_id'] = None
+        with time_proc.stage('db_write', time_proc.ANY_FORMAT):
+            if new_files:
+                self._write_files(new_files)
+                for info_type, (table, columns) in _INFO_TABLES.items():
+                    self._write_infos([r for r in new_files if r['info_type'] == info_type], table, columns)
+            if self.root_id is not None:
+                self._write_objects(batch)
+            self._write_paths(batch)
+        self._uncommitted.extend(batch)
+        if len(self._uncommitted) >= self.commit_interval:
+            self.commit()
+
+    def commit(self):
+        with time_proc.stage('db_commit', time_proc.ANY_FORMAT):
+            self._session.commit()
+        committed, self._uncommitted = self._uncommitted, []
+        if self._on_commit and committed:
+            self._on_commit(committed)
+
+    def close(self):
+        """
+        Flush and commit whatever is left
+        """
+        self.flush()
+        self.commit()
+
+    def _write_files(self, batch: List[dict]):
+        rows: Dict[Tuple[bytes, int], dict] = {}
+        for record in batch:
+            file = record['file']
+            rows[(file.digest, file.size)] = file.to_row()
+        ids = self._resolver.file_ids(rows)
+        for record in batch:
+            record['file_id'] = ids.get((record['file'].digest, record['file'].size))
+
+    def _write_infos(self, batch: List[dict], table, columns: Tuple[str, ...]):
+        rows: Dict[int, dict] = {}
+        for record in batch:
+            if record['file_id'] is None:
+                continue
+            row = record['info'].to_row()
+            row['storage_file_id'] = record['file_id']
+            rows[record['file_id']] = row
+        if not rows:
+            return
+        stmt = insert(table).values(list(rows.values()))
+        self._session.execute(stmt.on_duplicate_key_update(
+            **{column: stmt.inserted[column] for column in columns if column != 'storage_file_id'}))
+        info_ids = dict(self._session.execute(
+            select(table.c.storage_file_id, table.c.id).where(table.c.storage_file_id.in_(list(rows.keys())))).all())
+        for record in batch:
+            record['info_id'] = info_ids.get(record['file_id'])
+
+    def _write_objects(self, batch: List[dict]):
+        objects = [record['storage_object'] for record in batch if record.get('storage_object') is not None]
+        object_ids = self._resolver.object_ids(self.root_id, objects) if objects else {}
+        for record in batch:
+            obj = record.get('storage_object')
+            record['object_id'] = object_ids.get(obj.bdrc_id) if obj is not None else None
+
+    def _write_paths(self, batch: List[dict]):
+        table = ImagePath.__table__
+        rows: Dict[Tuple[int, Optional[int], str], dict] = {}
+        for record in batch:
+            if record['file_id'] is None:
+                continue
+            rel_path = record.get('rel_path') or record['path']
+            object_id = record.get('object_id')
+            path = record['storage_object'].content_path(rel_path) if object_id is not None else rel_path
+            rows[(record['file_id'], object_id, path)] = {
+                'file': record['file_id'],
+                'storage_object': object_id,
+                'path': path,
+                'image_group': record.get('image_group') or image_group_of(rel_path),
+                'root_folder': record.get('root_folder') or 'other'
+            }
+        if not rows:
+            return
+        # storage.paths has no unique key, so rescans must not re-insert existing paths
+        existing = self._session.execute(
+            select(table.c.file, table.c.storage_object, table.c.path)
+            .where(table.c.file.in_({file_id for file_id, _, _ in rows}))).all()
+        for file_id, object_id, path in existing:
+            rows.pop((file_id, object_id, path), None)
+        if rows:
+            self._session.execute(insert(table).values(list(rows.values())))
@@ -0,0 +1,172 @@
+"""
+Generate a reproducible synthetic corpus for the benchmarks, laid out like an archive work:
+
+    python -m bench.corpus OUT_DIR [--seed 0] [--scale 1] [--large]
+
+OUT_DIR/W0BENCH/images/W0BENCH-I0BENCH{n}/ gets group4 and LZW TIFFs, a multi-page
+TIFF, JPEGs at several qualities and PNGs; OUT_DIR/W0BENCH/sources/W0BENCH-I0BENCH1/
+gets text and image PDFs. The same seed and scale always give the same bytes.
+"""
+import argparse
+import io
+import random
+from datetime import datetime
+from pathlib import Path
+from typing import List, NamedTuple
+
+from PIL import Image
+
+__all__ = ['JPEG_QUALITIES', 'CorpusFile', 'generate_corpus']
+
+WORK = 'W0BENCH'
+JPEG_QUALITIES = (50, 75, 90, 95)
+
+# Scan-like page sizes: (width, height)
+PAGE_SIZE = (1700, 2200)
+LARGE_PAGE_SIZE = (7000, 9000)
+
+# pdf dates, which PIL would otherwise set to now
+CORPUS_DATE = datetime(2024, 1, 1)
+
+_WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do',
+          'eiusmod', 'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna', 'aliqua')
+
+
+class CorpusFile(NamedTuple):
+    path: Path
+    # what it exercises, e.g. 'tiff_group4', 'jpeg_q75', 'pdf_text'
+    kind: str
+
+
+def _scan(rng: random.Random, size, mode: str) -> Image.Image:
+    """
+    A page with text-like strokes on a plain background: compresses like a scan,
+    unlike pure noise
+    """
+    width, height = size
+    image = Image.new('L', (width, height), 235)
+    # dark horizontal runs of random length, in lines
+    for y in range(height // 10, height - height // 10, 24):
+        x = width // 10
+        while x < width - width // 10:
+            run = rng.randint(4, 60)
+            image.paste(rng.randint(0, 60), (x, y, min(x + run, width), y + rng.randint(8, 14)))
+            x += run + rng.randint(3, 20)
+    if mode == '1':
+        return image.point(lambda v: 255 if v > 128 else 0, '1')
+    if mode == 'RGB':
+        tint = Image.new('RGB', size, (rng.randint(200, 255), rng.randint(190, 240), rng.randint(150, 220)))
+        return Image.composite(tint, Image.merge('RGB', (image,) * 3), image.point(lambda v: 255 if v > 128 else 0))
+    return image
+
+
+def _text_pdf(rng: random.Random, pages: int, lines: int) -> bytes:
+    """
+    A pdf of Helvetica text pages, written by hand so that it needs no pdf writer
+    """
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+               b'<< /Producer (bench.corpus) /CreationDate (D:%s) >>'
+               % CORPUS_DATE.strftime('%Y%m%d%H%M%S').encode()]
+    page_ids = []
+    for _ in range(pages):
+        text = b''.join(b'(%s) Tj T* ' % ' '.join(rng.choice(_WORDS) for _ in range(12)).encode()
+                        for _ in range(lines))
+        content = b'BT /F1 10 Tf 12 TL 50 740 Td ' + text + b'ET'
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (len(objects)))
+        page_ids.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % i for i in page_ids), len(page_ids))
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+    xref = out.tell()
+    out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b'%010d 00000 n \n' % offset)
+    out.write(b'trailer\n<< /Size %d /Root 1 0 R /Info 4 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+              % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def generate_corpus(out_dir: Path, seed: int = 0, scale: int = 1, large: bool = False) -> List[CorpusFile]:
+    """
+    Write the corpus under out_dir
+    :param out_dir: created if needed
+    :param seed: seed of every random choice
+    :param scale: multiplies the number of files of each kind
+    :param large: add full size scans of archival masters (tens of MB each)
+    :return: the files written
+    """
+    rng = random.Random(seed)
+    images = Path(out_dir, WORK, 'images', f'{WORK}-I0BENCH1')
+    sources = Path(out_dir, WORK, 'sources', f'{WORK}-I0BENCH1')
+    images.mkdir(parents=True, exist_ok=True)
+    sources.mkdir(parents=True, exist_ok=True)
+    files: List[CorpusFile] = []
+
+    def add(path: Path, kind: str):
+        files.append(CorpusFile(path, kind))
+
+    for i in range(4 * scale):
+        path = images / f'I0BENCH1{i:04}.tif'
+        _scan(rng, PAGE_SIZE, '1').save(path, compression='group4', dpi=(400, 400))
+        add(path, 'tiff_group4')
+    for i in range(2 * scale):
+        path = images / f'I0BENCH1lzw{i:04}.tif'
+        _scan(rng, PAGE_SIZE, 'L').save(path, compression='tiff_lzw', dpi=(300, 300))
+        add(path, 'tiff_lzw')
+    path = images / 'I0BENCH1multi.tif'
+    pages = [_scan(rng, PAGE_SIZE, '1') for _ in range(4)]
+    pages[0].save(path, compression='group4', save_all=True, append_images=pages[1:], dpi=(400, 400))
+    add(path, 'tiff_multipage')
+    for quality in JPEG_QUALITIES:
+        for i in range(scale):
+            path = images / f'I0BENCH1q{quality}_{i:04}.jpg'
+            _scan(rng, PAGE_SIZE, 'RGB').save(path, quality=quality, dpi=(300, 300))
+            add(path, f'jpeg_q{quality}')
+    for i in range(2 * scale):
+        path = images / f'I0BENCH1png{i:04}.png'
+        _scan(rng, PAGE_SIZE, 'L').save(path, dpi=(300, 300))
+        add(path, 'png')
+    for i in range(scale):
+        path = sources / f'text{i:04}.pdf'
+        path.write_bytes(_text_pdf(rng, 40, 50))
+        add(path, 'pdf_text')
+        path = sources / f'images{i:04}.pdf'
+        pages = [_scan(rng, (850, 1100), 'L') for _ in range(8)]
+        pages[0].save(path, save_all=True, append_images=pages[1:], resolution=100,
+                      creationDate=CORPUS_DATE.timetuple(), modDate=CORPUS_DATE.timetuple())
+        add(path, 'pdf_image')
+    if large:
+        path = images / 'I0BENCH1large.tif'
+        _scan(rng, LARGE_PAGE_SIZE, 'RGB').save(path, compression='tiff_lzw', dpi=(600, 600))
+        add(path, 'tiff_large')
+        path = images / 'I0BENCH1large.jpg'
+        _scan(rng, LARGE_PAGE_SIZE, 'RGB').save(path, quality=95)
+        add(path, 'jpeg_large')
+        path = sources / 'text_large.pdf'
+        path.write_bytes(_text_pdf(rng, 1000, 50))
+        add(path, 'pdf_text_large')
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the synthetic benchmark corpus")
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=int, default=1, help="multiplies the number of files of each kind")
+    parser.add_argument("--large", action="store_true", help="add large archival masters")
+    args = parser.parse_args()
+    files = generate_corpus(args.out_dir, args.seed, args.scale, args.large)
+    total = sum(f.path.stat().st_size for f in files)
+    print(f"{len(files)} files, {total / 1e6:.1f} MB in {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
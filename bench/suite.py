@@ -0,0 +1,281 @@
+"""
+Ingest benchmark: each extractor, and the read_write scan pipeline, over the synthetic corpus.
+
+    python -m bench.suite [--corpus DIR] [--scale 1] [--large] [--workers 4]
+                          [--output results.json] [--baseline baseline.json] [--save-baseline baseline.json]
+
+Reports files/s, MB/s, p50/p99 latency per file and peak RSS for every stage. Each
+stage runs in a fresh process, so that its peak RSS is its own. With --baseline, a
+stage whose metric is more than --tolerance worse than the baseline's is flagged as
+a regression, and the exit status is 1.
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from bench.corpus import generate_corpus
+
+__all__ = ['HIGHER_IS_BETTER', 'LOWER_IS_BETTER', 'run_suite', 'compare']
+
+HIGHER_IS_BETTER = ('files_per_s', 'mb_per_s')
+LOWER_IS_BETTER = ('p50_ms', 'p99_ms', 'peak_rss_mb')
+
+DEFAULT_TOLERANCE = 0.10
+# latencies below this are timer noise, not compared
+MIN_COMPARED_LATENCY_MS = 1.0
+# extractors go over their files again until this long, as fast stages on a small corpus take microseconds
+MIN_STAGE_SECONDS = 0.5
+
+
+def _peak_rss_mb() -> float:
+    """
+    Peak RSS of this process and of its terminated children
+    """
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    try:
+        # Linux carries ru_maxrss over exec, so a spawned process would report its parent's peak
+        with open('/proc/self/status') as status:
+            own = next(int(line.split()[1]) * 1024 for line in status if line.startswith('VmHWM:'))
+    except (OSError, StopIteration):
+        pass
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return max(own, children) / (1024 * 1024)
+
+
+def _sniff(path: Path):
+    from format_sniffer import sniff_file
+    return sniff_file(path)
+
+
+def _digest(path: Path):
+    import FileInfo as fi
+    return fi.f_digests(path, drop_cache=False)
+
+
+def _image_info(path: Path):
+    import image_info as ii
+    try:
+        return ii.image_info_factory(path).extract()
+    except ii.ImageMetadataException:
+        # multi-page TIFFs are rejected once their IFDs are walked, which is what is timed
+        return None
+
+
+def _tiff_ifd(path: Path):
+    from tiff_ifd import read_tiff_info
+    return read_tiff_info(path)
+
+
+def _jpeg_quality(path: Path):
+    from jpeg_header import read_jpeg_quality
+    return read_jpeg_quality(path)
+
+
+_EXTRACTORS: Dict[str, Callable[[Path], object]] = {
+    'sniff': _sniff,
+    'digest': _digest,
+    'image_info': _image_info,
+    'tiff_ifd': _tiff_ifd,
+    'jpeg_quality': _jpeg_quality,
+}
+
+
+def _time_extractor(extractor: str, paths: List[Path]) -> Tuple[List[float], float, float]:
+    """
+    Child side: run an extractor on each file, over and over for at least MIN_STAGE_SECONDS
+    :return: per-file seconds, total seconds, peak RSS in MB
+    """
+    extract = _EXTRACTORS[extractor]
+    # imports and caches, not timed
+    extract(paths[0])
+    latencies = []
+    begin = time.perf_counter()
+    while time.perf_counter() - begin < MIN_STAGE_SECONDS:
+        for path in paths:
+            start = time.perf_counter()
+            extract(path)
+            latencies.append(time.perf_counter() - start)
+    return latencies, time.perf_counter() - begin, _peak_rss_mb()
+
+
+def _time_pipeline(root: str, workers: int, single_pass: bool) -> Tuple[List[float], float, float]:
+    """
+    Child side: run read_write.scan over the corpus, without a database
+    :return: seconds between consecutive records, total seconds, peak RSS in MB
+    """
+    from run import read_write
+    from util.file_walker import walk_files
+    latencies = []
+    begin = last = time.perf_counter()
+    for _ in read_write.scan(walk_files(root), workers, single_pass):
+        now = time.perf_counter()
+        latencies.append(now - last)
+        last = now
+    return latencies, last - begin, _peak_rss_mb()
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def _metrics(paths: List[Path], latencies: List[float], elapsed: float, peak_rss_mb: float) -> dict:
+    """
+    :param latencies: one per file processed, len(paths) or a multiple of it
+    """
+    passes = len(latencies) / len(paths) if paths else 0
+    nbytes = sum(p.stat().st_size for p in paths) * passes
+    return {
+        'files': len(paths),
+        'files_per_s': len(latencies) / elapsed if elapsed else 0.0,
+        'mb_per_s': nbytes / 1e6 / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 0.50) * 1000 if latencies else 0.0,
+        'p99_ms': _percentile(latencies, 0.99) * 1000 if latencies else 0.0,
+        'peak_rss_mb': peak_rss_mb,
+    }
+
+
+def _run_isolated(func, *args) -> Tuple[List[float], float, float]:
+    """
+    Run a timing function in a fresh process, so that the peak RSS it reports is its own
+    """
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        latencies, elapsed, peak_rss_mb = executor.submit(func, *args).result()
+    return latencies, elapsed, peak_rss_mb
+
+
+def _median_metrics(runs: List[dict]) -> dict:
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def run_suite(corpus: Path, workers: int = 1, repeat: int = 1, pipeline: bool = True) -> Dict[str, dict]:
+    """
+    :param corpus: directory of files, e.g. made by bench.corpus
+    :param workers: processes of the pipeline stage
+    :param repeat: runs per stage. Each metric is the median of the runs
+    :param pipeline: also benchmark read_write.scan
+    :return: {stage: {metric: value}}
+    """
+    from format_sniffer import sniff_file
+    paths = sorted(p for p in corpus.rglob('*') if p.is_file())
+    by_format: Dict[str, List[Path]] = {}
+    for path in paths:
+        by_format.setdefault(sniff_file(path) or 'unknown', []).append(path)
+
+    stages: List[Tuple[str, str, List[Path]]] = [('sniff', 'sniff', paths), ('digest', 'digest', paths)]
+    for format_name, format_paths in sorted(by_format.items()):
+        if format_name != 'unknown':
+            stages.append((f'image_info:{format_name}', 'image_info', format_paths))
+    stages.append(('tiff_ifd', 'tiff_ifd', by_format.get('tiff', [])))
+    stages.append(('jpeg_quality', 'jpeg_quality', by_format.get('jpeg', [])))
+
+    results: Dict[str, dict] = {}
+    for stage, extractor, stage_paths in stages:
+        if not stage_paths:
+            continue
+        runs = []
+        for _ in range(repeat):
+            latencies, elapsed, peak_rss_mb = _run_isolated(_time_extractor, extractor, stage_paths)
+            runs.append(_metrics(stage_paths, latencies, elapsed, peak_rss_mb))
+        results[stage] = _median_metrics(runs)
+    if pipeline:
+        for single_pass in (False, True):
+            runs = []
+            for _ in range(repeat):
+                try:
+                    latencies, elapsed, peak_rss_mb = _run_isolated(_time_pipeline, str(corpus), workers, single_pass)
+                except ImportError as e:
+                    print(f"Skipping the pipeline: {e}")
+                    return results
+                runs.append(_metrics(paths, latencies, elapsed, peak_rss_mb))
+            results[f"pipeline:w{workers}{':single_pass' if single_pass else ''}"] = _median_metrics(runs)
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[Tuple[str, str, float, float]]:
+    """
+    :return: (stage, metric, baseline value, value) of each metric worse than the baseline by more than tolerance
+    """
+    regressions = []
+    for stage, metrics in results.items():
+        base = baseline.get(stage)
+        if not base:
+            continue
+        for metric in HIGHER_IS_BETTER:
+            if metric in base and metrics[metric] < base[metric] * (1 - tolerance):
+                regressions.append((stage, metric, base[metric], metrics[metric]))
+        for metric in LOWER_IS_BETTER:
+            if metric.endswith('_ms') and max(metrics[metric], base.get(metric, 0)) < MIN_COMPARED_LATENCY_MS:
+                continue
+            if metric in base and metrics[metric] > base[metric] * (1 + tolerance):
+                regressions.append((stage, metric, base[metric], metrics[metric]))
+    return regressions
+
+
+def _print_table(results: Dict[str, dict], regressions: List[Tuple[str, str, float, float]]):
+    flagged = {(stage, metric) for stage, metric, _, _ in regressions}
+    columns = ('files',) + HIGHER_IS_BETTER + LOWER_IS_BETTER
+    print(f"{'stage':<32}" + ''.join(f"{column:>13}" for column in columns))
+    for stage, metrics in results.items():
+        cells = []
+        for column in columns:
+            value = f"{metrics[column]:.1f}" if isinstance(metrics[column], float) else str(metrics[column])
+            cells.append(f"{value + ('!' if (stage, column) in flagged else ''):>13}")
+        print(f"{stage:<32}" + ''.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the extractors and the scan pipeline")
+    parser.add_argument("--corpus", type=Path, help="existing corpus. Default: generate one in a temporary directory")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated corpus")
+    parser.add_argument("--scale", type=int, default=1, help="size of the generated corpus, see bench.corpus")
+    parser.add_argument("--large", action="store_true", help="add large files to the generated corpus")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="processes of the pipeline stage")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, metrics are their medians")
+    parser.add_argument("--no-pipeline", action="store_true", help="only benchmark the extractors")
+    parser.add_argument("-o", "--output", type=Path, help="write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="JSON results to compare with")
+    parser.add_argument("--save-baseline", type=Path, help="write the results as a baseline to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative change of a metric flagged as a regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench_corpus_') as scratch:
+        corpus = args.corpus
+        if corpus is None:
+            corpus = Path(scratch)
+            files = generate_corpus(corpus, args.seed, args.scale, args.large)
+            print(f"Generated {len(files)} files in {corpus}")
+        results = run_suite(corpus, args.workers, args.repeat, not args.no_pipeline)
+
+    regressions: List[Tuple[str, str, float, float]] = []
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(results, baseline.get('stages', {}), args.tolerance)
+    _print_table(results, regressions)
+    document = {
+        'corpus': {'path': str(args.corpus) if args.corpus else None, 'seed': args.seed, 'scale': args.scale,
+                   'large': args.large},
+        'stages': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            path.write_text(json.dumps(document, indent=2))
+    for stage, metric, base, value in regressions:
+        print(f"REGRESSION {stage} {metric}: {base:.1f} -> {value:.1f}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Durable journal of a scan's progress, kept in step with the database commits, so that a scan can resume
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from util.file_walker import WalkEntry, root_folder_of
+
+__all__ = ['ScanCheckpoint', 'directory_of']
+
+
+def directory_of(rel_path: str) -> str:
+    """
+    Relative path of the directory of a file, as walk_files gives it: '' for the root, else ending in '/'
+    """
+    head, sep, _ = rel_path.rpartition('/')
+    return head + sep
+
+
+def _parent_of(rel_dir: str) -> str:
+    return directory_of(rel_dir[:-1])
+
+
+def _prefix_end(prefix: str) -> str:
+    # smallest string greater than every string starting with prefix
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class _Directory:
+    __slots__ = ('pending_files', 'pending_subdirs', 'listed')
+
+    def __init__(self):
+        self.pending_files = 0
+        self.pending_subdirs = 0
+        self.listed = False
+
+
+class ScanCheckpoint:
+    """
+    SQLite journal of the files and directories a scan is done with, by path relative to the walked root.
+
+    A file is done once its record is committed to the database (committed()), or once it failed
+    (failed(), which also keeps it in a list of files to retry). A directory is done once it has been
+    listed by the walker and all its files and subdirectories are done: it is then journaled instead of
+    its files, and a resumed walk prunes it without listing it.
+
+    Like ScanManifest, changes are only durable after commit(), which callers should do right after
+    committing the same records to the database.
+
+    track() and the walker callbacks may run in a pool's feeder thread: the journal itself is only
+    touched by the constructor, commit() and failures().
+    """
+
+    def __init__(self, db_path: str, root: str, resume: bool = False):
+        """
+        :param db_path: SQLite file, created if needed
+        :param root: the walked root, which journaled paths are relative to
+        :param resume: continue the scan journaled in db_path. Otherwise its journal is cleared,
+        but not its failed files
+        :raise ValueError: if resuming a journal of another root
+        """
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'root'").fetchone()
+        if resume and row is not None and row[0] != root:
+            self._conn.close()
+            raise ValueError(f"{db_path} is the checkpoint of a scan of {row[0]}, not of {root}")
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('root', ?)", (root,))
+        self._conn.execute("CREATE TABLE IF NOT EXISTS done_dirs (path TEXT PRIMARY KEY)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS done_files (path TEXT PRIMARY KEY)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS failed_files (rel_path TEXT PRIMARY KEY, path TEXT NOT NULL, "
+                           "error TEXT, failed_at TEXT)")
+        if not resume:
+            self._conn.execute("DELETE FROM done_dirs")
+            self._conn.execute("DELETE FROM done_files")
+        self._conn.commit()
+        # loaded once: only directories still in progress have their files journaled
+        self._done_dirs: Set[str] = {row[0] for row in self._conn.execute("SELECT path FROM done_dirs")}
+        self._done_files: Set[str] = {row[0] for row in self._conn.execute("SELECT path FROM done_files")}
+        self._lock = threading.Lock()
+        self._directories: Dict[str, _Directory] = {}
+        self._new_done_files: List[str] = []
+        self._new_done_dirs: List[str] = []
+        self._new_failed: List[Tuple[str, str, str, str]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
+        self.close()
+
+    def is_done(self, rel_dir: str) -> bool:
+        """
+        True if a directory was done by a previous run. walk_files prune
+        """
+        return rel_dir in self._done_dirs
+
+    def _directory(self, rel_dir: str) -> _Directory:
+        directory = self._directories.get(rel_dir)
+        if directory is None:
+            directory = self._directories[rel_dir] = _Directory()
+        return directory
+
+    def on_directory_listed(self, rel_dir: str, subdirs: List[str]):
+        """
+        walk_files on_directory_listed
+        """
+        with self._lock:
+            directory = self._directory(rel_dir)
+            directory.listed = True
+            directory.pending_subdirs += len(subdirs)
+            self._settle(rel_dir)
+
+    def track(self, entries: Iterable[WalkEntry]) -> Iterator[WalkEntry]:
+        """
+        Leave out the files a previous run was done with, and count the others as pending.
+        Must be the last filter before the files are scanned: every file it yields must come back
+        to committed() or failed()
+        """
+        for entry in entries:
+            if entry.rel_path in self._done_files:
+                continue
+            with self._lock:
+                self._directory(directory_of(entry.rel_path)).pending_files += 1
+            yield entry
+
+    def _settle(self, rel_dir: str):
+        # with the lock: mark the directory done if it is, and its parents in turn
+        while True:
+            directory = self._directories.get(rel_dir)
+            if directory is None or not directory.listed or directory.pending_files or directory.pending_subdirs:
+                return
+            del self._directories[rel_dir]
+            self._new_done_dirs.append(rel_dir)
+            if not rel_dir:
+                return
+            rel_dir = _parent_of(rel_dir)
+            self._directory(rel_dir).pending_subdirs -= 1
+
+    def _file_done(self, rel_path: str):
+        rel_dir = directory_of(rel_path)
+        with self._lock:
+            self._new_done_files.append(rel_path)
+            directory = self._directories.get(rel_dir)
+            # files of a single file scan have no tracked directory
+            if directory is not None:
+                directory.pending_files -= 1
+                self._settle(rel_dir)
+
+    def committed(self, records: Iterable[dict]):
+        """
+        These records are committed to the database. Not durable until commit()
+        """
+        for record in records:
+            self._file_done(record.get('rel_path') or record['path'])
+
+    def failed(self, record: dict):
+        """
+        This file could not be read: it is done, and listed for a retry. Not durable until commit()
+        :param record: with 'path', 'rel_path' and 'error'
+        """
+        rel_path = record.get('rel_path') or record['path']
+        self._new_failed.append((rel_path, record['path'], record.get('error'), datetime.now().isoformat()))
+        self._file_done(rel_path)
+
+    def commit(self):
+        """
+        Journal what was done since the last commit
+        """
+        with self._lock:
+            done_files, self._new_done_files = self._new_done_files, []
+            done_dirs, self._new_done_dirs = self._new_done_dirs, []
+            failed, self._new_failed = self._new_failed, []
+        self._conn.executemany("INSERT OR REPLACE INTO failed_files (rel_path, path, error, failed_at) "
+                               "VALUES (?, ?, ?, ?)", failed)
+        failed_paths = {rel_path for rel_path, _, _, _ in failed}
+        self._conn.executemany("DELETE FROM failed_files WHERE rel_path = ?",
+                               [(rel_path,) for rel_path in done_files if rel_path not in failed_paths])
+        self._conn.executemany("INSERT OR IGNORE INTO done_files (path) VALUES (?)", [(p,) for p in done_files])
+        for rel_dir in done_dirs:
+            # the directory stands for everything under it
+            if rel_dir:
+                self._conn.execute("DELETE FROM done_files WHERE path >= ? AND path < ?",
+                                   (rel_dir, _prefix_end(rel_dir)))
+                self._conn.execute("DELETE FROM done_dirs WHERE path >= ? AND path < ?",
+                                   (rel_dir, _prefix_end(rel_dir)))
+            else:
+                self._conn.execute("DELETE FROM done_files")
+                self._conn.execute("DELETE FROM done_dirs")
+            self._conn.execute("INSERT OR IGNORE INTO done_dirs (path) VALUES (?)", (rel_dir,))
+        self._conn.commit()
+
+    def failures(self) -> List[Tuple[str, str, Optional[str]]]:
+        """
+        The files which failed, in this run or previous ones, and were not read since
+        :return: (relative path, path, error)
+        """
+        return self._conn.execute("SELECT rel_path, path, error FROM failed_files ORDER BY rel_path").fetchall()
+
+    def failed_entries(self) -> Iterator[WalkEntry]:
+        """
+        The failed files which still exist, to scan them again.
+        The journal is read here, not by the iterator, which may run in a pool's feeder thread
+        """
+        return self._failed_entries(self.failures())
+
+    @staticmethod
+    def _failed_entries(failures: List[Tuple[str, str, Optional[str]]]) -> Iterator[WalkEntry]:
+        for rel_path, path, _ in failures:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield WalkEntry(path, st, root_folder_of(rel_path), rel_path)
+
+    def close(self):
+        self._conn.close()
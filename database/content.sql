@@ -19,6 +19,8 @@ CREATE TABLE `content`.`image_file_infos` (
 
 )COMMENT = 'Table containing information about image files';
 ALTER TABLE `content`.`image_file_infos` ADD FOREIGN KEY (`storage_file_id`) REFERENCES `storage`.`files` (`id`);
+# one info row per file, so that rescans can upsert
+CREATE UNIQUE INDEX `image_file_infos_index_0` ON `content`.`image_file_infos` (`storage_file_id`);
 
 CREATE TABLE `content`.`pdf_file_infos` (
   # image information
@@ -26,6 +28,7 @@ CREATE TABLE `content`.`pdf_file_infos` (
   `number_of_pages` smallint UNSIGNED COMMENT 'the number of pages',
   `median_nb_chr_per_page` smallint UNSIGNED COMMENT 'the average number of characters in a page',
   `median_nb_images_per_page` smallint UNSIGNED COMMENT 'the average number of images per page',
+  `median_sample_size` smallint UNSIGNED COMMENT 'the number of pages the medians were computed on, NULL when computed on all pages',
   `recorded_date` timestamp COMMENT 'the timestamp recorded in the exif metadata',
   `storage_file_id` INTEGER COMMENT 'storage.files.id FK',
   create_time timestamp default CURRENT_TIMESTAMP null,
@@ -33,3 +36,4 @@ CREATE TABLE `content`.`pdf_file_infos` (
 
 );
 ALTER TABLE `content`.`pdf_file_infos` ADD FOREIGN KEY (`storage_file_id`) REFERENCES `storage`.`files` (`id`);
+CREATE UNIQUE INDEX `pdf_file_infos_index_0` ON `content`.`pdf_file_infos` (`storage_file_id`);
@@ -0,0 +1,129 @@
+"""
+Identify a file's format from its leading bytes, so that only one
+library ever has to open it.
+"""
+from os import PathLike
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, Union
+
+__all__ = ['SNIFF_SIZE', 'RAW_TIFF_SUFFIXES', 'SignatureMatcher', 'read_header', 'sniff_format',
+           'sniff_file', 'register_signature']
+
+# Enough to find %PDF- after leading garbage and the CR2 marker after the TIFF header
+SNIFF_SIZE: int = 4096
+
+# Raw formats which are plain TIFF containers: only the extension tells them apart
+RAW_TIFF_SUFFIXES = frozenset(['.arw', '.srf', '.sr2', '.nef', '.nrw', '.cr2', '.dng', '.pef', '.3fr', '.erf',
+                               '.kdc', '.mos', '.iiq', '.rwl', '.srw'])
+
+# A matcher gets the header bytes and the lower-case file suffix
+SignatureMatcher = Callable[[bytes, str], bool]
+
+_TIFF_MAGICS = (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+')
+
+
+def _is_tiff(header: bytes, suffix: str) -> bool:
+    return header[:4] in _TIFF_MAGICS
+
+
+def _is_raw(header: bytes, suffix: str) -> bool:
+    # Canon CR2 carries its own marker after the TIFF header
+    if header[:4] == b'II*\x00' and header[8:11] == b'CR\x02':
+        return True
+    # Olympus ORF and Panasonic RW2 use private TIFF magics
+    if header[:4] in (b'IIRO', b'IIRS', b'MMOR', b'IIU\x00'):
+        return True
+    # Fuji RAF and Canon CR3
+    if header.startswith(b'FUJIFILMCCD-RAW') or header[4:12] == b'ftypcrx ':
+        return True
+    return _is_tiff(header, suffix) and suffix in RAW_TIFF_SUFFIXES
+
+
+def _is_jpeg(header: bytes, suffix: str) -> bool:
+    return header[:3] == b'\xff\xd8\xff'
+
+
+def _is_png(header: bytes, suffix: str) -> bool:
+    return header[:8] == b'\x89PNG\r\n\x1a\n'
+
+
+def _is_jp2(header: bytes, suffix: str) -> bool:
+    # JP2 signature box, or a bare J2K codestream (SOC followed by SIZ)
+    return header[:12] == b'\x00\x00\x00\x0cjP  \r\n\x87\n' or header[:4] == b'\xff\x4f\xff\x51'
+
+
+def _is_gif(header: bytes, suffix: str) -> bool:
+    return header[:6] in (b'GIF87a', b'GIF89a')
+
+
+def _is_bmp(header: bytes, suffix: str) -> bool:
+    # BM, then the file size and two reserved words
+    return header[:2] == b'BM' and len(header) >= 14
+
+
+def _is_webp(header: bytes, suffix: str) -> bool:
+    return header[:4] == b'RIFF' and header[8:12] == b'WEBP'
+
+
+def _is_pdf(header: bytes, suffix: str) -> bool:
+    # Readers accept the %PDF- marker anywhere in the first 1024 bytes
+    return b'%PDF-' in header[:1024]
+
+
+# Ordered: raw must be tested before tiff, since most raw files are TIFFs
+_signatures: List[Tuple[str, SignatureMatcher]] = [
+    ('raw', _is_raw),
+    ('tiff', _is_tiff),
+    ('jpeg', _is_jpeg),
+    ('png', _is_png),
+    ('jp2', _is_jp2),
+    ('gif', _is_gif),
+    ('bmp', _is_bmp),
+    ('webp', _is_webp),
+    ('pdf', _is_pdf),
+]
+
+
+def register_signature(format_name: str, matcher: SignatureMatcher, first: bool = True):
+    """
+    Add a signature test for a format.
+    :param format_name: key of the format, as given to image_info.register_image_opener
+    :param matcher: callable(header bytes, lower-case suffix) -> bool
+    :param first: test this signature before the built-in ones
+    """
+    if first:
+        _signatures.insert(0, (format_name, matcher))
+    else:
+        _signatures.append((format_name, matcher))
+
+
+def sniff_format(header: bytes, suffix: str = '') -> Optional[str]:
+    """
+    Return the key of the first format whose signature matches
+    :param header: leading bytes of the file (SNIFF_SIZE is enough)
+    :param suffix: file suffix, used only to tell raw TIFF variants apart
+    :return: format key ('raw', 'tiff', 'jpeg', 'png', 'jp2', 'gif', 'bmp', 'webp', 'pdf' or a registered one)
+    or None
+    """
+    suffix = suffix.lower()
+    for format_name, matcher in _signatures:
+        if matcher(header, suffix):
+            return format_name
+    return None
+
+
+def read_header(file_path: Union[str, PathLike], size: int = SNIFF_SIZE) -> bytes:
+    """
+    Read the leading bytes of a file
+    """
+    with open(file_path, 'rb') as f:
+        return f.read(size)
+
+
+def sniff_file(file_path: Union[str, PathLike]) -> Optional[str]:
+    """
+    Read the head of a file and identify it
+    :param file_path: Path to file
+    :return: format key or None
+    """
+    return sniff_format(read_header(file_path), Path(file_path).suffix)
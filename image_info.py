@@ -1,21 +1,30 @@
 #!/usr/bin/env python3
+import io
 import os
+import random
 import statistics
 from datetime import datetime
 from os import PathLike
 from pathlib import Path
-from typing import Union, IO, Any
+from typing import Union, IO, Any, Callable, Dict, List, Optional
 
 import rawpy
-from PIL import ExifTags
-from PIL import Image, UnidentifiedImageError
+from PIL import Image, ImageMode
 from pypdf import PdfReader
-from rawpy._rawpy import LibRawFileUnsupportedError, RawPy
+from rawpy._rawpy import RawPy
 
 from ORMModel import PdfFileInfo, ImageFileInfo
-
-__all__ = ['ImageMetadataException', 'PdfReaderType', 'BaseImage', 'PdfImage', 'PilImage', 'RawImage',
-           'extract_image_metadata', 'image_info_factory', 'base_image_to_image_file_infos',
+from format_sniffer import SNIFF_SIZE, read_header, sniff_format
+from jpeg_header import estimate_quality
+from tiff_ifd import RawHeader, TiffInfo, exif_dates_from_bytes, read_raw_header, read_tiff_info
+from pdf_stats import PageImageStats, PdfPageCounts, count_pages, page_image_stats, split_pages
+from records import ImageInfoRecord, PdfInfoRecord, Record
+from util import time_proc
+
+__all__ = ['ImageMetadataException', 'PdfReaderType', 'BaseImage', 'PdfImage', 'PilImage', 'TiffImage', 'RawImage',
+           'RawHeaderImage', 'ImageMetadata', 'PdfMetadata', 'ImageOpener', 'extract_image_metadata',
+           'configure_pdf_analysis', 'register_image_opener', 'image_info_factory',
+           'image_info_record', 'pdf_info_record', 'info_record', 'base_image_to_image_file_infos',
            'base_image_to_pdf_file_infos']
 
 
@@ -26,10 +35,29 @@ class ImageMetadataException(Exception):
 PdfReaderType = Union[str, Path, IO[Any]]
 
 
+class ImageMetadata(Record):
+    """
+    What image_file_infos is made from
+    """
+    __slots__ = ('image_type', 'image_mode', 'width', 'height', 'compression', 'quality', 'resolution',
+                 'bits_per_sample', 'recorded_date', 'modified_date')
+
+
+class PdfMetadata(Record):
+    """
+    What pdf_file_infos is made from
+    """
+    __slots__ = ('num_pages', 'creation_date', 'modification_date', 'median_nb_chr_per_page',
+                 'median_nb_images_per_page', 'medians_sample_size', 'modified_date')
+
+
 class BaseImage:
     def __init__(self, reader: object, file_path: Path):
         self.file_path = file_path
         self._reader = reader
+        self._type_hint_reader = reader
+        self._file_stat: Optional[os.stat_result] = None
+        self._metadata = None
 
     @property
     def image_path(self) -> Path:
@@ -41,44 +69,96 @@ class BaseImage:
 
     @property
     def image_type(self) -> str:
-        return self._get_image_type()
+        return self.metadata.image_type
 
     @property
     def image_mode(self) -> str:
-        return self._get_image_mode()
+        return self.metadata.image_mode
 
     @property
     def width(self) -> int:
-        return self._get_width()
+        return self.metadata.width
 
     @property
     def height(self) -> int:
-        return self._get_height()
+        return self.metadata.height
 
     @property
     def compression(self) -> str:
-        return self._get_compression()
+        return self.metadata.compression
 
     @property
-    def quality(self) -> str:
-        return self._get_compression()
+    def quality(self) -> Optional[int]:
+        return self.metadata.quality
 
     @property
-    def resolution(self) -> ():
+    def resolution(self) -> Optional[tuple]:
         """
-        Tuple?
-        :return:
+        (x, y) dots per inch, None if the file does not say
         """
-        return self._get_resolution()
+        return self.metadata.resolution
+
+    @property
+    def bits_per_sample(self) -> Optional[int]:
+        return self.metadata.bits_per_sample
 
     @property
     def recorded_date(self) -> datetime:
-        return self._get_recorded_date()
+        return self.metadata.recorded_date
+
+    @property
+    def metadata(self):
+        """
+        Snapshot of the file's metadata, extracted on first access
+        """
+        if self._metadata is None:
+            self._metadata = self._snapshot()
+        return self._metadata
+
+    def extract(self):
+        """
+        Extract the metadata snapshot and close the reader: the image holds no
+        open file or decoded data afterwards, only the snapshot
+        """
+        metadata = self.metadata
+        self.close()
+        return metadata
+
+    def close(self):
+        if self._reader is not None and hasattr(self._reader, 'close'):
+            self._reader.close()
+        self._reader = None
+        self._type_hint_reader = None
+
+    def _snapshot(self) -> 'ImageMetadata':
+        return ImageMetadata(
+            image_type=self._get_image_type(),
+            image_mode=self._get_image_mode(),
+            width=self._get_width(),
+            height=self._get_height(),
+            compression=self._get_compression(),
+            quality=self._get_quality(),
+            resolution=self._get_resolution(),
+            bits_per_sample=self._get_bits_per_sample(),
+            recorded_date=self._get_recorded_date(),
+            modified_date=self.modified_date)
+
+    @property
+    def file_stat(self) -> os.stat_result:
+        """
+        The file's stat result: the one handed over by the caller, or a single os.stat
+        """
+        if self._file_stat is None:
+            self._file_stat = os.stat(self.file_path)
+        return self._file_stat
+
+    @file_stat.setter
+    def file_stat(self, value: os.stat_result):
+        self._file_stat = value
 
     @property
     def modified_date(self) -> datetime:
-        import os
-        _md = datetime.fromtimestamp(os.path.getmtime(self.image_path))
+        _md = datetime.fromtimestamp(self.file_stat.st_mtime)
         return datetime(_md.year, _md.month, _md.day)
 
     def _get_object(self):
@@ -104,12 +184,16 @@ class BaseImage:
         """image_file_infos.tiff_compression"""
         raise NotImplementedError
 
-    def _get_quality(self):
-        """image_file_infos.quality"""
-        raise NotImplementedError
+    def _get_quality(self) -> Optional[int]:
+        """image_file_infos.quality, None for formats without a quality setting"""
+        return None
 
     def _get_resolution(self):
-        """image_file_infos.bps"""
+        """(x, y) dots per inch, None if the file does not say"""
+        raise NotImplementedError
+
+    def _get_bits_per_sample(self) -> Optional[int]:
+        """image_file_infos.bps_x and bps_y: bits of the first sample (channel) of a pixel"""
         raise NotImplementedError
 
     def _get_recorded_date(self) -> datetime:
@@ -119,8 +203,27 @@ class BaseImage:
 
 class PdfImage(BaseImage):
     """
-
+    The medians are computed on every page, unless sample_pages is set: they are then
+    computed on at most sample_pages pages, evenly spread through the document, or
+    drawn at random from sample_seed when it is set. Either way the choice is
+    deterministic.
+    Images are counted from the pages' XObject resources (image_count_mode 'xobject'),
+    or with pypdf's page.images ('pypdf'), which also counts inline images.
+    Characters are counted with pypdf's extract_text (char_count_mode 'exact'), or
+    from the text operators of the content streams ('fast'), within
+    pdf_stats.FAST_CHAR_COUNT_TOLERANCE of the exact count.
+    A PdfImage counts its pages in this process. Above parallel_page_threshold analysed
+    pages, page_chunks splits them in up to parallel_workers ranges, for a caller with a
+    pool of processes to count (see run/read_write): with split_page_counts set, the
+    snapshot then leaves the medians to that caller.
+    Instances take these settings from the class, see configure_pdf_analysis.
     """
+    sample_pages: Optional[int] = None
+    sample_seed: Optional[int] = None
+    image_count_mode: str = 'xobject'
+    char_count_mode: str = 'exact'
+    parallel_page_threshold: Optional[int] = None
+    parallel_workers: Optional[int] = None
 
     def __init__(self, reader: PdfReader, file_path: Path):
         """
@@ -130,12 +233,23 @@ class PdfImage(BaseImage):
         """
         super().__init__(reader, file_path)
         self._type_hint_reader: PdfReader = self._reader
+        self._num_pages: Optional[int] = None
         self._median_nb_chr_per_page = None
         self._median_nb_images_per_page = None
+        self.sample_pages = PdfImage.sample_pages
+        self.sample_seed = PdfImage.sample_seed
+        self.image_count_mode = PdfImage.image_count_mode
+        self.char_count_mode = PdfImage.char_count_mode
+        self.parallel_page_threshold = PdfImage.parallel_page_threshold
+        self.parallel_workers = PdfImage.parallel_workers
+        self.split_page_counts = False
+        self._page_counts: Optional[PdfPageCounts] = None
 
     @property
     def num_pages(self):
-        return self._type_hint_reader.get_num_pages()
+        if self._num_pages is None:
+            self._num_pages = self._type_hint_reader.get_num_pages()
+        return self._num_pages
 
     @property
     def creation_date(self):
@@ -155,27 +269,110 @@ class PdfImage(BaseImage):
         self.refresh_medians()
         return self._median_nb_images_per_page
 
+    @property
+    def sampled_page_indices(self) -> List[int]:
+        """
+        Indices of the pages the medians are computed on
+        """
+        n = self.num_pages
+        k = self.sample_pages
+        if not k or k >= n:
+            return list(range(n))
+        if self.sample_seed is not None:
+            return sorted(random.Random(self.sample_seed).sample(range(n), k))
+        if k == 1:
+            return [n // 2]
+        # evenly spread, first and last pages included
+        return sorted({i * (n - 1) // (k - 1) for i in range(k)})
+
+    @property
+    def medians_sample_size(self) -> Optional[int]:
+        """
+        Number of pages the medians are computed on, None when they are exact (all pages)
+        """
+        k = len(self.sampled_page_indices)
+        return None if k == self.num_pages else k
+
+    @property
+    def page_counts(self) -> PdfPageCounts:
+        """
+        Character and image counts of each sampled page, computed once
+        """
+        if self._page_counts is None:
+            self._page_counts = count_pages(self._type_hint_reader, self.sampled_page_indices,
+                                            self.image_count_mode, self.char_count_mode)
+        return self._page_counts
+
+    @property
+    def page_chunks(self) -> Optional[List[List[int]]]:
+        """
+        The sampled pages in page ranges to count in parallel (pdf_stats.split_pages), if there are more
+        than parallel_page_threshold of them and more than one range. None otherwise
+        """
+        indices = self.sampled_page_indices
+        if self.parallel_page_threshold is None or len(indices) <= self.parallel_page_threshold:
+            return None
+        chunks = split_pages(indices, self.parallel_workers or os.cpu_count() or 1)
+        return chunks if len(chunks) > 1 else None
+
+    @property
+    def page_image_stats(self) -> List[PageImageStats]:
+        """
+        Image count and encoded size in bytes of each sampled page, without decoding any image.
+        page_counts only has them with image_count_mode 'xobject', they are computed here otherwise
+        """
+        if self.image_count_mode == 'xobject':
+            return self.page_counts.image_stats
+        pages = self._type_hint_reader.pages
+        return [page_image_stats(pages[i]) for i in self.sampled_page_indices]
+
     def calc_median_nb_chars_per_page(self):
         """
         Calculate the median number of characters per page in the pdf
         """
-        char_counts = [len(page.extract_text()) for page in self._type_hint_reader.pages]
-        return statistics.median(char_counts)
+        return statistics.median(self.page_counts.char_counts)
 
     def calc_median_nb_images_per_page(self):
         """
         Calculate the median number of images per page in the pdf
         """
-        image_counts = [len(page.images) for page in self._type_hint_reader.pages]
-        return statistics.median(image_counts)
+        return statistics.median(self.page_counts.image_counts)
 
     def refresh_medians(self):
-        if not self._median_nb_chr_per_page:
+        # 0 is a legitimate median, e.g. a pdf of scans has no characters
+        if self._median_nb_chr_per_page is None:
             self._median_nb_chr_per_page = self.calc_median_nb_chars_per_page()
 
-        if not self._median_nb_images_per_page:
+        if self._median_nb_images_per_page is None:
             self._median_nb_images_per_page = self.calc_median_nb_images_per_page()
 
+    def _snapshot(self) -> PdfMetadata:
+        # left to the caller who counts the page chunks
+        split = self.split_page_counts and self.page_chunks is not None
+        return PdfMetadata(
+            num_pages=self.num_pages,
+            creation_date=self.creation_date,
+            modification_date=self.modification_date,
+            median_nb_chr_per_page=None if split else self.median_nb_chr_per_page,
+            median_nb_images_per_page=None if split else self.median_nb_images_per_page,
+            medians_sample_size=self.medians_sample_size,
+            modified_date=self.modified_date)
+
+
+def _mode_bits(mode: Optional[str]) -> Optional[int]:
+    """
+    Bits per sample of a PIL mode
+    """
+    if mode is None:
+        return None
+    if mode == '1':
+        return 1
+    try:
+        # e.g. '|u1', '<u2'
+        return int(ImageMode.getmode(mode).typestr[-1]) * 8
+    except (KeyError, ValueError):
+        return None
+
 
 class PilImage(BaseImage):
     def __init__(self, reader: Image.Image, file_path: Path):
@@ -201,26 +398,65 @@ class PilImage(BaseImage):
     def _get_compression(self):
         return self._type_hint_reader.info.get('compression', 'unknown')
 
-    def _get_quality(self):
-        # ? type
-        return self._type_hint_reader.info.get('quality', 0)
+    def _get_quality(self) -> Optional[int]:
+        # Estimated from the quantization tables Image.open already parsed
+        if self._type_hint_reader.format == 'JPEG':
+            return estimate_quality(self._type_hint_reader.quantization)
+        return None
+
+    def _get_resolution(self) -> Optional[tuple]:
+        return self._type_hint_reader.info.get('dpi')
 
-    def _get_resolution(self) -> int:
-        # ? type?
-        return self._type_hint_reader.info.get('dpi', 0)
+    def _get_bits_per_sample(self) -> Optional[int]:
+        return _mode_bits(self._type_hint_reader.mode)
 
     def _get_recorded_date(self) -> datetime:
-        exif_data = self._type_hint_reader.getexif()
-        if exif_data:
-            for tag, value in exif_data.items():
-                tag_name = ExifTags.TAGS.get(tag, tag)
-                if tag_name == 'DateTimeOriginal':
-                    return datetime.strptime(value, '%Y:%m:%d %H:%M:%S')
-        return None
+        # Image.open keeps the raw EXIF block of JPEG, PNG and WebP files
+        return exif_dates_from_bytes(self._type_hint_reader.info.get('exif')).date_time_original
 
     def _get_modified_date(self) -> datetime:
-        modified_time = os.path.getmtime(self.file_path)
-        return datetime.fromtimestamp(modified_time)
+        return datetime.fromtimestamp(self.file_stat.st_mtime)
+
+
+class TiffImage(BaseImage):
+    """
+    TIFF read from its IFDs, see tiff_ifd.read_tiff_info: PIL never opens it
+    """
+
+    def __init__(self, reader: TiffInfo, file_path: Path):
+        super().__init__(reader, file_path)
+        self._type_hint_reader: TiffInfo = self._reader
+
+    @property
+    def page_count(self) -> int:
+        return self._type_hint_reader.page_count
+
+    def _get_image_type(self) -> str:
+        if self.page_count != 1:
+            raise ImageMetadataException(f"{self.file_path} has {self.page_count} pages: image_file_infos only "
+                                         f"has an image_type for single image TIFFs")
+        return 'single_image_tiff'
+
+    def _get_image_mode(self) -> str:
+        return self._type_hint_reader.mode
+
+    def _get_width(self) -> int:
+        return self._type_hint_reader.width
+
+    def _get_height(self) -> int:
+        return self._type_hint_reader.height
+
+    def _get_compression(self):
+        return self._type_hint_reader.compression
+
+    def _get_resolution(self) -> Optional[tuple]:
+        return self._type_hint_reader.resolution
+
+    def _get_bits_per_sample(self) -> Optional[int]:
+        return self._type_hint_reader.bits_per_sample[0]
+
+    def _get_recorded_date(self) -> datetime:
+        return self._type_hint_reader.dates.date_time_original
 
 
 class RawImage(BaseImage):
@@ -244,17 +480,44 @@ class RawImage(BaseImage):
     def _get_compression(self):
         return 'raw'  # RAW images are typically uncompressed
 
-    def _get_quality(self) -> int:
-        return 0  # Not really implemented for RAW
-
     def _get_resolution(self) -> ():
         return self._type_hint_reader.sizes.width, self._type_hint_reader.sizes.height
 
+    def _get_bits_per_sample(self) -> Optional[int]:
+        # the sensor's bit depth
+        return int(self._type_hint_reader.white_level).bit_length()
+
     def _get_recorded_date(self) -> datetime:
         # RAW images may not have EXIF data, so this is a placeholder
         return None
 
 
+class RawHeaderImage(RawImage):
+    """
+    RawImage read from the TIFF IFDs of the raw file, see tiff_ifd.read_raw_header.
+    Only a few KB of the file are read, where rawpy.imread unpacks the whole sensor data.
+    """
+
+    def __init__(self, reader: RawHeader, file_path: Path):
+        super().__init__(reader, file_path)
+        self._type_hint_reader: RawHeader = self._reader
+
+    def _get_width(self):
+        return self._type_hint_reader.width
+
+    def _get_height(self):
+        return self._type_hint_reader.height
+
+    def _get_resolution(self) -> ():
+        return self._type_hint_reader.width, self._type_hint_reader.height
+
+    def _get_bits_per_sample(self) -> Optional[int]:
+        return self._type_hint_reader.bits_per_sample
+
+    def _get_recorded_date(self) -> datetime:
+        return self._type_hint_reader.dates.date_time_original
+
+
 def extract_image_metadata(file_path):
     metadata = {}
 
@@ -277,15 +540,8 @@ def extract_image_metadata(file_path):
         metadata['resolution'] = img.info.get('dpi', 'unknown')
 
         # Extract EXIF data if available
-        exif_data = img._getexif()
-        if exif_data:
-            for tag, value in exif_data.items():
-                tag_name = ExifTags.TAGS.get(tag, tag)
-                if tag_name == 'DateTimeOriginal':
-                    metadata['recorded_date'] = value
-                    break
-        else:
-            metadata['recorded_date'] = 'unknown'
+        recorded_date = exif_dates_from_bytes(img.info.get('exif')).date_time_original
+        metadata['recorded_date'] = recorded_date.strftime('%Y:%m:%d %H:%M:%S') if recorded_date else 'unknown'
 
     # Extract file modified date
     modified_time = os.path.getmtime(file_path)
@@ -307,48 +563,159 @@ def extract_image_metadata(file_path):
 #     return metadata
 
 
-def image_info_factory(file_path: PathLike[str]) -> BaseImage:
+def configure_pdf_analysis(sample_pages: Optional[int] = None, sample_seed: Optional[int] = None,
+                           image_count_mode: str = 'xobject', char_count_mode: str = 'exact',
+                           parallel_page_threshold: Optional[int] = None, parallel_workers: Optional[int] = None):
     """
-    Return a BaseImage subclass depending on the file
-    :param file_path: Path to the file
-    :return: BaseImage subclass
+    Set how the PdfImage instances created from now on compute their medians
+    :param sample_pages: maximum number of pages analysed per pdf. None analyses every page
+    :param sample_seed: draw the sampled pages at random from this seed, instead of spreading them evenly
+    :param image_count_mode: 'xobject' (no image decoding) or 'pypdf' (page.images, counts inline images)
+    :param char_count_mode: 'exact' (pypdf extract_text) or 'fast' (content stream text operators)
+    :param parallel_page_threshold: split the pages of pdfs with more analysed pages than this into ranges,
+    see PdfImage.page_chunks. None never does
+    :param parallel_workers: maximum number of ranges per pdf, default the number of CPUs
     """
-    # return the first thing that opens:
+    if image_count_mode not in ('xobject', 'pypdf'):
+        raise ValueError(f"Unknown image count mode {image_count_mode}")
+    if char_count_mode not in ('exact', 'fast'):
+        raise ValueError(f"Unknown char count mode {char_count_mode}")
+    PdfImage.sample_pages = sample_pages
+    PdfImage.sample_seed = sample_seed
+    PdfImage.image_count_mode = image_count_mode
+    PdfImage.char_count_mode = char_count_mode
+    PdfImage.parallel_page_threshold = parallel_page_threshold
+    PdfImage.parallel_workers = parallel_workers
+
+
+# An opener gets what its library should read (a path or a binary stream) and the file's path
+ImageOpener = Callable[[Union[Path, IO[bytes]], Path], BaseImage]
+
+
+def _open_pil(source: Union[Path, IO[bytes]], file_path: Path) -> BaseImage:
+    return PilImage(Image.open(source), file_path)
+
+
+def _open_tiff(source: Union[Path, IO[bytes]], file_path: Path) -> BaseImage:
+    info = read_tiff_info(source)
+    if info.mode is not None:
+        return TiffImage(info, file_path)
+    # Uncommon sample layouts: PIL knows best which mode they open in
+    if not isinstance(source, Path):
+        source.seek(0)
+    return _open_pil(source, file_path)
+
+
+def _open_raw(source: Union[Path, IO[bytes]], file_path: Path) -> BaseImage:
+    header = read_raw_header(source)
+    if header is not None:
+        return RawHeaderImage(header, file_path)
+    # Not a TIFF-based raw, or one whose IFDs lack the sensor dimensions: let LibRaw unpack it
+    if isinstance(source, Path):
+        return RawImage(rawpy.imread(str(source)), file_path)
+    source.seek(0)
+    return RawImage(rawpy.imread(source), file_path)
+
+
+def _open_pdf(source: Union[Path, IO[bytes]], file_path: Path) -> BaseImage:
+    return PdfImage(PdfReader(source), file_path)
+
+
+_image_openers: Dict[str, ImageOpener] = {
+    'tiff': _open_tiff,
+    'jpeg': _open_pil,
+    'png': _open_pil,
+    'jp2': _open_pil,
+    'gif': _open_pil,
+    'bmp': _open_pil,
+    'webp': _open_pil,
+    'raw': _open_raw,
+    'pdf': _open_pdf,
+}
 
-    try:
-        return PilImage(Image.open(file_path), Path(file_path))
-    except UnidentifiedImageError:
-        pass
-    try:
-        return RawImage(rawpy.imread(str(file_path)), Path(file_path))
-    except LibRawFileUnsupportedError:
-        pass
 
+def register_image_opener(format_name: str, opener: ImageOpener):
+    """
+    Plug an extractor into image_info_factory. Formats which the built-in signatures
+    do not know also need a format_sniffer.register_signature
+    :param format_name: format key returned by format_sniffer.sniff_format
+    :param opener: callable(source, file_path) -> BaseImage
+    """
+    _image_openers[format_name] = opener
+
+
+def image_info_factory(file_path: PathLike[str], stat_result: Optional[os.stat_result] = None,
+                       data: Optional[bytes] = None) -> BaseImage:
+    """
+    Return a BaseImage subclass depending on the file. The format is sniffed
+    from the file's leading bytes, so only the matching library opens it.
+    :param file_path: Path to the file
+    :param stat_result: the file's stat result, if the caller already has it
+    :param data: the file's content, if the caller already read it (see FileInfo.f_read).
+    The file is then parsed from memory and not opened again.
+    :return: BaseImage subclass
+    """
+    file_path = Path(file_path)
+    with time_proc.stage('sniff'):
+        header = read_header(file_path) if data is None else data[:SNIFF_SIZE]
+        format_name = sniff_format(header, file_path.suffix)
+    time_proc.note_format(format_name)
+    opener = _image_openers.get(format_name)
+    if opener is None:
+        raise ValueError(f"ImageFile {file_path} not supported - error unrecognized format {format_name}")
     try:
-        return PdfImage(PdfReader(file_path), Path(file_path))
+        with time_proc.stage('parse'):
+            base_image = opener(file_path if data is None else io.BytesIO(data), file_path)
     except Exception as e:
         raise ValueError(f"ImageFile {file_path} not supported - error {e}")
+    if stat_result is not None:
+        base_image.file_stat = stat_result
+    return base_image
+
+
+# convert a BaseImage object, or its metadata snapshot, into the record of its image_file_infos row
+def image_info_record(base_image: Union[BaseImage, ImageMetadata]) -> ImageInfoRecord:
+    metadata: ImageMetadata = base_image.metadata if isinstance(base_image, BaseImage) else base_image
+    return ImageInfoRecord(
+        image_type=metadata.image_type,
+        image_mode=metadata.image_mode,
+        width=metadata.width,
+        height=metadata.height,
+        tiff_compression=metadata.compression,
+        quality=metadata.quality,
+        # a depth per axis is meaningless: both are the bits per sample
+        bps_x=metadata.bits_per_sample,
+        bps_y=metadata.bits_per_sample,
+        recorded_date=metadata.recorded_date
+    )
 
 
-# convert a BaseImage object into an ImageFileInfos object
-def base_image_to_image_file_infos(base_image: BaseImage) -> ImageFileInfo:
-    return ImageFileInfo(
-        image_type=base_image.image_type,
-        image_mode=base_image.image_mode,
-        width=base_image.width,
-        height=base_image.height,
-        tiff_compression=base_image.compression,
-        quality=base_image.quality,
-        bps_x=base_image.resolution[0],
-        bps_y=base_image.resolution[1],
-        recorded_date=base_image.recorded_date
+def pdf_info_record(actual_pdf: Union[PdfImage, PdfMetadata]) -> PdfInfoRecord:
+    metadata: PdfMetadata = actual_pdf.metadata if isinstance(actual_pdf, BaseImage) else actual_pdf
+    return PdfInfoRecord(
+        number_of_pages=metadata.num_pages,
+        median_nb_chr_per_page=metadata.median_nb_chr_per_page,
+        median_nb_images_per_page=metadata.median_nb_images_per_page,
+        median_sample_size=metadata.medians_sample_size,
+        recorded_date=metadata.creation_date
     )
 
 
-def base_image_to_pdf_file_infos(actual_pdf: PdfImage) -> PdfFileInfo:
-    return PdfFileInfo(
-        number_of_pages=actual_pdf.num_pages,
-        median_nb_chr_per_page=actual_pdf.median_nb_chr_per_page,
-        median_nb_images_per_page=actual_pdf.median_nb_images_per_page,
-        recorded_date=actual_pdf.creation_date
-    )
+def info_record(metadata: Union[ImageMetadata, PdfMetadata]) -> Union[ImageInfoRecord, PdfInfoRecord]:
+    """
+    Record of the info row of a metadata snapshot, see BaseImage.extract
+    """
+    if isinstance(metadata, ImageMetadata):
+        return image_info_record(metadata)
+    if isinstance(metadata, PdfMetadata):
+        return pdf_info_record(metadata)
+    raise ValueError(f"No image or pdf metadata in {metadata!r}")
+
+
+# The ORM objects of the same: the scan itself only builds records, see batch_writer
+def base_image_to_image_file_infos(base_image: Union[BaseImage, ImageMetadata]) -> ImageFileInfo:
+    return ImageFileInfo(**image_info_record(base_image).to_row())
+
+
+def base_image_to_pdf_file_infos(actual_pdf: Union[PdfImage, PdfMetadata]) -> PdfFileInfo:
+    return PdfFileInfo(**pdf_info_record(actual_pdf).to_row())
@@ -0,0 +1,177 @@
+"""
+Header-only JPEG reader: walks the marker segments up to the scan data, never decoding pixels
+"""
+import struct
+from functools import lru_cache
+from os import PathLike
+from typing import IO, Dict, Iterator, Optional, Sequence, Tuple, Union
+
+from tiff_ifd import ExifDates, exif_dates_from_bytes
+
+__all__ = ['IJG_LUMINANCE_TABLE', 'IJG_CHROMINANCE_TABLE', 'jpeg_segments', 'read_quantization_tables',
+           'estimate_quality', 'read_jpeg_quality', 'read_jpeg_exif_dates']
+
+# Annex K tables which libjpeg (IJG) scales by quality, in natural (row major) order
+IJG_LUMINANCE_TABLE = (
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99)
+IJG_CHROMINANCE_TABLE = (
+    17, 18, 24, 47, 99, 99, 99, 99,
+    18, 21, 26, 66, 99, 99, 99, 99,
+    24, 26, 56, 99, 99, 99, 99, 99,
+    47, 66, 99, 99, 99, 99, 99, 99) + (99,) * 32
+
+# DQT stores tables in zigzag order: natural index of each zigzag position
+_ZIGZAG = (
+    0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
+    12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63)
+
+_SOI = 0xD8
+_EOI = 0xD9
+_SOS = 0xDA
+_DQT = 0xDB
+_APP1 = 0xE1
+# Markers without a length field
+_STANDALONE = frozenset([0x01, _SOI] + list(range(0xD0, 0xD8)))
+
+# A table: 64 values in natural order, as PIL's Image.quantization has them
+QuantizationTables = Dict[int, Sequence[int]]
+
+
+def jpeg_segments(f: IO[bytes], wanted: Optional[frozenset] = None) -> Iterator[Tuple[int, bytes]]:
+    """
+    The marker segments of a JPEG, up to the first scan. Segments which are not
+    wanted are seeked over, not read.
+    :param f: binary file object at the start of the JPEG
+    :param wanted: markers (the byte after 0xFF) whose payload to read. None reads all
+    :return: (marker, payload without the length field), payload b'' for skipped segments
+    """
+    if f.read(2) != b'\xff\xd8':
+        raise ValueError("Not a JPEG file")
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return
+        if byte != b'\xff':
+            raise ValueError(f"Corrupt JPEG: no marker at {f.tell() - 1}")
+        marker = f.read(1)
+        # fill bytes may precede a marker
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            return
+        marker = marker[0]
+        if marker in _STANDALONE:
+            continue
+        if marker in (_SOS, _EOI):
+            return
+        length_field = f.read(2)
+        if len(length_field) < 2:
+            return
+        length = struct.unpack('>H', length_field)[0] - 2
+        if wanted is None or marker in wanted:
+            yield marker, f.read(length)
+        else:
+            f.seek(length, 1)
+            yield marker, b''
+
+
+def read_quantization_tables(source: Union[str, PathLike, IO[bytes]]) -> QuantizationTables:
+    """
+    The quantization tables of a JPEG's DQT segments
+    :param source: path or binary file object at the start of the JPEG
+    :return: {table id: 64 values in natural order}
+    :raise ValueError: if source is not a JPEG
+    """
+    if isinstance(source, (str, PathLike)):
+        with open(source, 'rb') as f:
+            return read_quantization_tables(f)
+    tables: QuantizationTables = {}
+    for _, payload in jpeg_segments(source, frozenset([_DQT])):
+        if not payload:
+            continue
+        # a DQT segment holds one or more tables: Pq/Tq byte, then 64 8 or 16 bit values
+        position = 0
+        while position < len(payload):
+            precision, table_id = payload[position] >> 4, payload[position] & 15
+            value_size = 2 if precision else 1
+            values = struct.unpack_from('>' + ('H' if precision else 'B') * 64, payload, position + 1)
+            table = [0] * 64
+            for zigzag_position, value in enumerate(values):
+                table[_ZIGZAG[zigzag_position]] = value
+            tables[table_id] = table
+            position += 1 + 64 * value_size
+    return tables
+
+
+def _ijg_table(base: Sequence[int], quality: int) -> Tuple[int, ...]:
+    # jcparam.c jpeg_quality_scaling and jpeg_add_quant_table, baseline values
+    scale = 5000 // quality if quality < 50 else 200 - quality * 2
+    return tuple(min(max((value * scale + 50) // 100, 1), 255) for value in base)
+
+
+_IJG_TABLES = [(quality, _ijg_table(IJG_LUMINANCE_TABLE, quality), _ijg_table(IJG_CHROMINANCE_TABLE, quality))
+               for quality in range(100, 0, -1)]
+
+
+@lru_cache(maxsize=1024)
+def _estimate(luminance: Tuple[int, ...], chrominance: Optional[Tuple[int, ...]]) -> int:
+    best_quality, best_error = 0, None
+    for quality, ijg_luminance, ijg_chrominance in _IJG_TABLES:
+        error = sum(abs(a - b) for a, b in zip(luminance, ijg_luminance))
+        if chrominance is not None:
+            error += sum(abs(a - b) for a, b in zip(chrominance, ijg_chrominance))
+        # from 100 down, so that ties go to the highest quality
+        if best_error is None or error < best_error:
+            best_quality, best_error = quality, error
+            if not error:
+                break
+    return best_quality
+
+
+def estimate_quality(tables: QuantizationTables) -> Optional[int]:
+    """
+    The libjpeg (IJG) quality, 1 to 100, whose tables are closest to these.
+    Tables from other encoders get the quality of the nearest IJG tables.
+    Estimates are cached by table content, since an archive's JPEGs mostly come
+    from a handful of encoders and settings.
+    :param tables: {table id: 64 values in natural order}, see read_quantization_tables
+    :return: the quality, None without tables
+    """
+    if not tables:
+        return None
+    ids = sorted(tables)
+    luminance = tuple(tables[ids[0]])
+    chrominance = tuple(tables[ids[1]]) if len(ids) > 1 else None
+    return _estimate(luminance, chrominance)
+
+
+def read_jpeg_quality(source: Union[str, PathLike, IO[bytes]]) -> Optional[int]:
+    """
+    estimate_quality of a JPEG file's tables
+    """
+    return estimate_quality(read_quantization_tables(source))
+
+
+def read_jpeg_exif_dates(source: Union[str, PathLike, IO[bytes]]) -> ExifDates:
+    """
+    The EXIF dates of a JPEG, from its first Exif APP1 segment
+    :param source: path or binary file object at the start of the JPEG
+    :raise ValueError: if source is not a JPEG
+    """
+    if isinstance(source, (str, PathLike)):
+        with open(source, 'rb') as f:
+            return read_jpeg_exif_dates(f)
+    for _, payload in jpeg_segments(source, frozenset([_APP1])):
+        # XMP also lives in APP1 segments
+        if payload.startswith(b'Exif\x00\x00'):
+            return exif_dates_from_bytes(payload)
+    return ExifDates()
@@ -0,0 +1,72 @@
+"""
+Lookup of files already in storage.files, by (digest, size), with a local LRU cache
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+
+from ORMModel import ImageFile
+
+__all__ = ['FileKey', 'KnownFiles']
+
+# storage.files unique key files_index_1
+FileKey = Tuple[bytes, int]
+
+
+class KnownFiles:
+    """
+    Resolves (digest, size) to storage.files.id. Cache misses are looked up
+    with one IN query per call, so callers should resolve whole batches.
+    Only hits are cached: a file unknown now may be written later in the scan,
+    in which case the StorageResolver adding it calls add().
+    """
+
+    def __init__(self, session, cache_size: int = 100000):
+        """
+        :param session: SQLAlchemy session, e.g. DrsDbContextBase.session
+        :param cache_size: number of (digest, size) keys to remember
+        """
+        self._session = session
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[FileKey, int]' = OrderedDict()
+
+    def get(self, key: FileKey) -> Optional[int]:
+        """
+        Cached id of a file, without querying the database
+        """
+        file_id = self._cache.get(key)
+        if file_id is not None:
+            self._cache.move_to_end(key)
+        return file_id
+
+    def add(self, key: FileKey, file_id: int):
+        self._cache[key] = file_id
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def resolve(self, keys: Iterable[FileKey]) -> Dict[FileKey, int]:
+        """
+        Ids of the files which storage.files already has
+        :param keys: (digest, size) of the files
+        :return: {(digest, size): storage.files.id} for the known ones only
+        """
+        known: Dict[FileKey, int] = {}
+        misses = set()
+        for key in keys:
+            file_id = self.get(key)
+            if file_id is None:
+                misses.add(key)
+            else:
+                known[key] = file_id
+        if misses:
+            table = ImageFile.__table__
+            rows = self._session.execute(
+                select(table.c.id, table.c.digest, table.c.size)
+                .where(table.c.digest.in_({digest for digest, _ in misses}))).all()
+            for file_id, digest, size in rows:
+                if (digest, size) in misses:
+                    known[(digest, size)] = file_id
+                    self.add((digest, size), file_id)
+        return known
@@ -0,0 +1,197 @@
+"""
+OCFL storage roots: find their objects and read the objects' inventory.json, so that
+inventoried files are ingested with the digests the inventory already has
+"""
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from FileInfo import DIGEST_ALGORITHM
+from util.file_walker import StorageObject, WalkEntry, image_group_of, root_folder_of
+
+__all__ = ['INVENTORY', 'OBJECT_NAMASTE_PREFIX', 'OcflFile', 'OcflInventory', 'bdrc_id_of', 'read_inventory',
+           'storage_root_layout', 'find_objects', 'ocfl_entries']
+
+INVENTORY = 'inventory.json'
+# "0=ocfl_object_1.1" in every object root
+OBJECT_NAMASTE_PREFIX = '0=ocfl_object_'
+LAYOUT_FILE = 'ocfl_layout.json'
+
+
+class OcflFile(NamedTuple):
+    # path relative to the object root, e.g. v1/content/images/W1-I1/I10001.tif
+    content_path: str
+    # path in the object's state, e.g. images/W1-I1/I10001.tif
+    logical_path: str
+    # DIGEST_ALGORITHM digest, if the inventory has it, as digestAlgorithm or in its fixity block
+    digest: Optional[bytes]
+
+
+class OcflInventory(NamedTuple):
+    id: str
+    digest_algorithm: str
+    head: str
+    # of the first and the head version, naive UTC
+    created_at: Optional[datetime]
+    last_modified_at: Optional[datetime]
+    # every content file of the manifest
+    files: List[OcflFile]
+
+    @property
+    def bdrc_id(self) -> str:
+        return bdrc_id_of(self.id)
+
+
+def bdrc_id_of(ocfl_id: str) -> str:
+    """
+    The RID of an object id: http://purl.bdrc.io/resource/W22084 and bdr:W22084 are W22084
+    """
+    return ocfl_id.rstrip('/').rsplit('/', 1)[-1].rsplit(':', 1)[-1]
+
+
+def _parse_created(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        # RFC 3339. fromisoformat only takes a Z suffix from python 3.11
+        created = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if created.tzinfo is not None:
+        created = created.astimezone(timezone.utc).replace(tzinfo=None)
+    return created
+
+
+def _version_number(version: str) -> int:
+    # v1, or zero-padded v001
+    return int(version[1:])
+
+
+def _paths_by_digest(value, what: str, object_dir: str) -> Dict[str, List[str]]:
+    if not isinstance(value, dict) or not all(isinstance(paths, list) for paths in value.values()):
+        raise ValueError(f"{object_dir}/{INVENTORY} is not an OCFL inventory: {what} is not a map of digests to paths")
+    return value
+
+
+def read_inventory(object_dir: str) -> OcflInventory:
+    """
+    Parse the inventory.json of an object root
+    :raise OSError: if it cannot be read
+    :raise ValueError: if it is not an OCFL inventory
+    """
+    with open(os.path.join(object_dir, INVENTORY), 'rb') as fh:
+        inventory = json.load(fh)
+    try:
+        algorithm = inventory['digestAlgorithm']
+        manifest = _paths_by_digest(inventory['manifest'], 'its manifest', object_dir)
+        versions: Dict[str, dict] = inventory['versions']
+        head = inventory['head']
+        ocfl_id = inventory['id']
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"{object_dir}/{INVENTORY} is not an OCFL inventory: no {e}")
+    if not isinstance(versions, dict) or not versions or not all(isinstance(v, dict) for v in versions.values()):
+        raise ValueError(f"{object_dir}/{INVENTORY} is not an OCFL inventory: no versions")
+    content_directory = inventory.get('contentDirectory', 'content')
+
+    # content path -> our digest, from the manifest or its fixity block
+    digests: Dict[str, bytes] = {}
+    if algorithm == DIGEST_ALGORITHM:
+        ours = manifest
+    else:
+        fixity = inventory.get('fixity') or {}
+        ours = _paths_by_digest(fixity.get(DIGEST_ALGORITHM, {}) if isinstance(fixity, dict) else fixity,
+                                f'its {DIGEST_ALGORITHM} fixity', object_dir)
+    for digest, content_paths in ours.items():
+        for content_path in content_paths:
+            digests[content_path] = bytes.fromhex(digest)
+
+    # digest -> logical paths, in the latest version which has the digest
+    logical_paths: Dict[str, List[str]] = {}
+    ordered = sorted(versions, key=_version_number)
+    for version in ordered:
+        state = _paths_by_digest(versions[version].get('state', {}), f'the state of {version}', object_dir)
+        for digest, paths in state.items():
+            logical_paths[digest] = paths
+
+    files = []
+    for digest, content_paths in manifest.items():
+        candidates = logical_paths.get(digest, [])
+        for content_path in content_paths:
+            # content paths are conventionally {version}/{contentDirectory}/{logical path}
+            parts = content_path.split('/', 2)
+            stripped = parts[2] if len(parts) == 3 and parts[1] == content_directory else content_path
+            logical_path = stripped if stripped in candidates or not candidates else candidates[0]
+            files.append(OcflFile(content_path, logical_path, digests.get(content_path)))
+    return OcflInventory(ocfl_id, algorithm, head, _parse_created(versions[ordered[0]].get('created')),
+                         _parse_created(versions.get(head, {}).get('created')), files)
+
+
+def storage_root_layout(root: str) -> str:
+    """
+    Storage layout extension of an OCFL storage root, from its ocfl_layout.json, or 'unknown'
+    """
+    try:
+        with open(os.path.join(root, LAYOUT_FILE), 'rb') as fh:
+            return json.load(fh).get('extension') or 'unknown'
+    except (OSError, ValueError):
+        return 'unknown'
+
+
+def _is_object(names: List[str]) -> bool:
+    return any(name.startswith(OBJECT_NAMASTE_PREFIX) for name in names)
+
+
+def find_objects(root: str) -> Iterator[str]:
+    """
+    Object roots under an OCFL storage root (or root itself if it is an object root).
+    Objects are not descended into. Directories which cannot be read are reported and skipped
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError as e:
+            print(f"Skipping directory {directory}. Error {e}")
+            continue
+        if _is_object([entry.name for entry in entries]):
+            yield directory
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+            except OSError as e:
+                print(f"Skipping {entry.path}. Error {e}")
+        stack.extend(sorted(subdirs, reverse=True))
+
+
+def ocfl_entries(root: str) -> Iterator[WalkEntry]:
+    """
+    The content files of the objects under an OCFL storage root, as walk_files would give them, with
+    the digests their inventory has, and their object. The root folder is the one of the logical path.
+    Objects whose inventory cannot be read, and inventoried files which are missing, are reported and skipped
+    """
+    for object_dir in find_objects(root):
+        try:
+            inventory = read_inventory(object_dir)
+        except (OSError, ValueError) as e:
+            print(f"Skipping object {object_dir}. Error {e}")
+            continue
+        object_rel_path = os.path.relpath(object_dir, root).replace(os.sep, '/')
+        object_rel_path = '' if object_rel_path == '.' else object_rel_path
+        storage_object = StorageObject(inventory.bdrc_id, object_rel_path, inventory.created_at,
+                                       inventory.last_modified_at)
+        for ocfl_file in inventory.files:
+            path = os.path.join(object_dir, *ocfl_file.content_path.split('/'))
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                print(f"Skipping {path}, in the inventory of {inventory.id}. Error {e}")
+                continue
+            rel_path = f"{object_rel_path}/{ocfl_file.content_path}" if object_rel_path else ocfl_file.content_path
+            yield WalkEntry(path, st, root_folder_of(ocfl_file.logical_path), rel_path, ocfl_file.digest,
+                            storage_object, image_group_of(ocfl_file.logical_path))
@@ -0,0 +1,397 @@
+"""
+Per-page pdf statistics computed from the object structure, without decoding content
+"""
+import io
+import math
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+from pypdf import PageObject, PdfReader
+from pypdf.generic import DictionaryObject, IndirectObject, StreamObject
+
+__all__ = ['FAST_CHAR_COUNT_TOLERANCE', 'MIN_PARALLEL_CHUNK_PAGES', 'PageImageStats', 'PdfPageCounts',
+           'page_image_stats', 'ContentCharCounter', 'count_pages', 'count_pages_in_file', 'split_pages']
+
+# Relative difference between ContentCharCounter medians and extract_text ones
+# which test_PdfMetaData checks on the pdfs in test/sources
+FAST_CHAR_COUNT_TOLERANCE: float = 0.05
+
+# Fewer pages than this are not worth a process of their own
+MIN_PARALLEL_CHUNK_PAGES: int = 25
+
+
+class PageImageStats(NamedTuple):
+    # number of image XObject references drawn from the page, as pypdf's len(page.images) counts them
+    count: int
+    # sum of the images' encoded (/Length) sizes
+    nbytes: int
+
+
+def _stream_length(stream: StreamObject) -> int:
+    length = stream.get('/Length')
+    if isinstance(length, IndirectObject):
+        length = length.get_object()
+    try:
+        return int(length)
+    except (TypeError, ValueError):
+        return len(stream._data or b'')
+
+
+def _count_images(holder: DictionaryObject, seen: Set[Tuple[int, int]]) -> Tuple[int, int]:
+    """
+    Count the image XObjects in holder's /Resources /XObject, recursing into Form XObjects
+    :param holder: a page or a Form XObject
+    :param seen: (idnum, generation) of the forms on the current path, against reference cycles
+    """
+    resources = holder.get('/Resources')
+    if resources is None:
+        return 0, 0
+    xobjects = resources.get_object().get('/XObject')
+    if xobjects is None:
+        return 0, 0
+    xobjects = xobjects.get_object()
+    count = nbytes = 0
+    for name in xobjects:
+        reference = xobjects.raw_get(name)
+        key: Optional[Tuple[int, int]] = None
+        if isinstance(reference, IndirectObject):
+            key = (reference.idnum, reference.generation)
+            if key in seen:
+                continue
+        xobject = reference.get_object()
+        if not isinstance(xobject, StreamObject):
+            continue
+        if xobject.get('/Subtype') == '/Image':
+            count += 1
+            nbytes += _stream_length(xobject)
+        else:
+            if key is not None:
+                seen.add(key)
+            sub_count, sub_nbytes = _count_images(xobject, seen)
+            if key is not None:
+                seen.discard(key)
+            count += sub_count
+            nbytes += sub_nbytes
+    return count, nbytes
+
+
+def page_image_stats(page: PageObject) -> PageImageStats:
+    """
+    Count the images a page draws by walking its /Resources /XObject dictionaries,
+    nested Form XObjects included. Image streams are never decoded, unlike
+    pypdf's page.images. Inline images (BI ... EI in the content stream) are not
+    counted: finding them means parsing the content stream.
+    :param page: pypdf page
+    :return: image count and encoded size in bytes
+    """
+    return PageImageStats(*_count_images(page, set()))
+
+
+# Content stream tokens. Literal strings, which may nest parentheses, are scanned by hand.
+_TOKEN = re.compile(rb"""
+    (?:[\x00\t\n\x0c\r ]+|%[^\r\n]*)*
+    (?:(?P<lstr_simple>\((?:[^()\\]|\\[^0-7\r\n])*\))
+  | (?P<lstr>\()
+  | (?P<dict_open><<) | (?P<dict_close>>>)
+  | (?P<hstr><[0-9A-Fa-f\x00\t\n\x0c\r ]*>)
+  | (?P<arr_open>\[) | (?P<arr_close>\])
+  | (?P<name>/[^\x00\t\n\x0c\r /\[\]()<>{}%]*)
+  | (?P<number>[+-]?(?:\d+\.?\d*|\.\d+))
+  | (?P<op>[^\x00\t\n\x0c\r /\[\]()<>{}%]+)
+  | (?P<other>.)
+  | $)
+""", re.VERBOSE | re.DOTALL)
+
+_ESCAPES = {ord('n'): b'\n', ord('r'): b'\r', ord('t'): b'\t', ord('b'): b'\b', ord('f'): b'\f',
+            ord('('): b'(', ord(')'): b')', ord('\\'): b'\\'}
+
+# End of inline image data
+_INLINE_IMAGE_END = re.compile(rb'[\x00\t\n\x0c\r ]EI(?=[\x00\t\n\x0c\r /\[<(%]|$)')
+
+
+def _literal_string(data: bytes, pos: int) -> Tuple[bytes, int]:
+    """
+    :param pos: just after the opening parenthesis
+    :return: the string's bytes and the position after its closing parenthesis
+    """
+    out = bytearray()
+    depth = 1
+    end = len(data)
+    while pos < end:
+        c = data[pos]
+        if c == 0x5c:  # backslash
+            pos += 1
+            if pos >= end:
+                break
+            c = data[pos]
+            if c in _ESCAPES:
+                out += _ESCAPES[c]
+            elif 0x30 <= c <= 0x37:
+                digits = data[pos:pos + 3]
+                n = 1
+                while n < len(digits) and 0x30 <= digits[n] <= 0x37:
+                    n += 1
+                out.append(int(digits[:n], 8) & 0xff)
+                pos += n - 1
+            elif c == 0x0d:  # line continuation
+                if data[pos + 1:pos + 2] == b'\n':
+                    pos += 1
+            elif c != 0x0a:
+                out.append(c)
+            pos += 1
+            continue
+        if c == 0x28:
+            depth += 1
+        elif c == 0x29:
+            depth -= 1
+            if depth == 0:
+                return bytes(out), pos + 1
+        out.append(c)
+        pos += 1
+    return bytes(out), pos
+
+
+class _FontCodec:
+    """
+    What the character counter needs to know about a font: how many bytes a
+    character code takes, and how many Unicode characters each code maps to
+    """
+    __slots__ = ('code_width', 'char_lengths')
+
+    def __init__(self, code_width: int, char_lengths: Dict[int, int]):
+        self.code_width = code_width
+        self.char_lengths = char_lengths
+
+    def count(self, data: bytes) -> int:
+        if not self.char_lengths:
+            return len(data) // self.code_width
+        lengths = self.char_lengths
+        if self.code_width == 1:
+            return sum(lengths.get(code, 1) for code in data)
+        return sum(lengths.get(int.from_bytes(data[i:i + 2], 'big'), 1) for i in range(0, len(data) - 1, 2))
+
+
+_PLAIN_CODEC = _FontCodec(1, {})
+
+_CMAP_HEX = re.compile(rb'<([0-9A-Fa-f\s]*)>')
+
+
+def _utf16_length(hex_string: bytes) -> int:
+    raw = bytes.fromhex(hex_string.decode('ascii'))
+    try:
+        return len(raw.decode('utf-16-be'))
+    except UnicodeDecodeError:
+        return max(1, len(raw) // 2)
+
+
+def _parse_to_unicode(cmap: bytes) -> Dict[int, int]:
+    """
+    Number of Unicode characters each code of a ToUnicode CMap maps to
+    """
+    lengths: Dict[int, int] = {}
+    for block in re.finditer(rb'beginbfchar(.*?)endbfchar', cmap, re.DOTALL):
+        values = _CMAP_HEX.findall(block.group(1))
+        for src, dst in zip(values[0::2], values[1::2]):
+            lengths[int(src or b'0', 16)] = _utf16_length(dst)
+    for block in re.finditer(rb'beginbfrange(.*?)endbfrange', cmap, re.DOTALL):
+        for line in re.finditer(rb'<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(<[0-9A-Fa-f\s]*>|\[[^\]]*\])', block.group(1)):
+            low, high = int(line.group(1), 16), int(line.group(2), 16)
+            destinations = _CMAP_HEX.findall(line.group(3))
+            if line.group(3).startswith(b'['):
+                for code, dst in zip(range(low, high + 1), destinations):
+                    lengths[code] = _utf16_length(dst)
+            elif destinations:
+                n = _utf16_length(destinations[0])
+                for code in range(low, min(high, low + 0xffff) + 1):
+                    lengths[code] = n
+    return lengths
+
+
+class ContentCharCounter:
+    """
+    Counts the characters a page shows by scanning its content stream for the
+    text-showing operators (Tj, TJ, ' and "), without pypdf's layout and font
+    mapping work. A code counts as many characters as its ToUnicode mapping has,
+    else one. Fonts are decoded once per font object, and the cache is kept
+    across the pages of a document, so use one counter per document.
+
+    Unlike extract_text, the count has none of the spaces and newlines which
+    pypdf infers from glyph positions, and Type0 fonts are assumed to use
+    2-byte codes (true of Identity-H/V). See FAST_CHAR_COUNT_TOLERANCE.
+    """
+
+    def __init__(self):
+        self._codecs: Dict[Tuple[int, int], _FontCodec] = {}
+
+    def _codec(self, font_reference) -> _FontCodec:
+        key = None
+        if isinstance(font_reference, IndirectObject):
+            key = (font_reference.idnum, font_reference.generation)
+            if key in self._codecs:
+                return self._codecs[key]
+        font = font_reference.get_object() if font_reference is not None else None
+        if not isinstance(font, DictionaryObject):
+            return _PLAIN_CODEC
+        code_width = 2 if font.get('/Subtype') == '/Type0' else 1
+        char_lengths: Dict[int, int] = {}
+        to_unicode = font.get('/ToUnicode')
+        if to_unicode is not None:
+            to_unicode = to_unicode.get_object()
+            if isinstance(to_unicode, StreamObject):
+                char_lengths = _parse_to_unicode(to_unicode.get_data())
+        codec = _FontCodec(code_width, char_lengths)
+        if key is not None:
+            self._codecs[key] = codec
+        return codec
+
+    def count_page(self, page: PageObject) -> int:
+        """
+        :param page: pypdf page
+        :return: number of characters the page's text operators show, Form XObjects included
+        """
+        contents = page.get_contents()
+        if contents is None:
+            return 0
+        return self._count_stream(contents.get_data(), page.get('/Resources'), set())
+
+    def _count_stream(self, data: bytes, resources, seen: Set[Tuple[int, int]]) -> int:
+        resources = resources.get_object() if resources is not None else DictionaryObject()
+        fonts = resources.get('/Font')
+        fonts = fonts.get_object() if fonts is not None else DictionaryObject()
+        xobjects = resources.get('/XObject')
+        xobjects = xobjects.get_object() if xobjects is not None else DictionaryObject()
+        codec = _PLAIN_CODEC
+        total = 0
+        operands: list = []
+        # start index in operands of each open array or dictionary
+        open_marks: List[int] = []
+        pos = 0
+        end = len(data)
+        while pos < end:
+            m = _TOKEN.match(data, pos)
+            kind = m.lastgroup
+            pos = m.end()
+            if kind is None or kind == 'other':
+                continue
+            if kind == 'lstr_simple':
+                value = m.group(kind)[1:-1]
+                operands.append(value if b'\\' not in value else _literal_string(value + b')', 0)[0])
+            elif kind == 'lstr':
+                value, pos = _literal_string(data, pos)
+                operands.append(value)
+            elif kind == 'hstr':
+                digits = re.sub(rb'[\x00\t\n\x0c\r ]', b'', m.group(kind)[1:-1])
+                if len(digits) % 2:
+                    digits += b'0'
+                operands.append(bytes.fromhex(digits.decode('ascii')))
+            elif kind == 'name':
+                operands.append(m.group(kind)[1:].decode('latin-1'))
+            elif kind == 'number':
+                operands.append(float(m.group(kind)))
+            elif kind == 'arr_open' or kind == 'dict_open':
+                open_marks.append(len(operands))
+            elif kind == 'arr_close' or kind == 'dict_close':
+                start = open_marks.pop() if open_marks else 0
+                items = operands[start:]
+                del operands[start:]
+                operands.append(items if kind == 'arr_close' else None)
+            else:
+                op = m.group(kind)
+                if op == b'Tj' or op == b"'" or op == b'"':
+                    if operands and isinstance(operands[-1], bytes):
+                        total += codec.count(operands[-1])
+                elif op == b'TJ':
+                    if operands and isinstance(operands[-1], list):
+                        for item in operands[-1]:
+                            if isinstance(item, bytes):
+                                total += codec.count(item)
+                elif op == b'Tf':
+                    if len(operands) >= 2 and isinstance(operands[-2], str):
+                        font_name = '/' + operands[-2]
+                        codec = self._codec(fonts.raw_get(font_name) if font_name in fonts else None)
+                elif op == b'Do':
+                    if operands and isinstance(operands[-1], str):
+                        total += self._count_form(xobjects, '/' + operands[-1], seen)
+                elif op == b'ID':
+                    # skip inline image data
+                    ei = _INLINE_IMAGE_END.search(data, pos)
+                    pos = ei.end() if ei else end
+                operands.clear()
+                open_marks.clear()
+        return total
+
+    def _count_form(self, xobjects: DictionaryObject, name: str, seen: Set[Tuple[int, int]]) -> int:
+        if name not in xobjects:
+            return 0
+        reference = xobjects.raw_get(name)
+        key = None
+        if isinstance(reference, IndirectObject):
+            key = (reference.idnum, reference.generation)
+            if key in seen:
+                return 0
+        form = reference.get_object()
+        if not isinstance(form, StreamObject) or form.get('/Subtype') != '/Form':
+            return 0
+        if key is not None:
+            seen.add(key)
+        count = self._count_stream(form.get_data(), form.get('/Resources'), seen)
+        if key is not None:
+            seen.discard(key)
+        return count
+
+
+class PdfPageCounts(NamedTuple):
+    """
+    Per-page counts of the analysed pages, in page order
+    """
+    char_counts: List[int]
+    image_counts: List[int]
+    # with image_count_mode 'xobject' only, empty with 'pypdf'
+    image_stats: List[PageImageStats]
+
+
+def count_pages(reader: PdfReader, indices: Sequence[int], image_count_mode: str = 'xobject',
+                char_count_mode: str = 'exact') -> PdfPageCounts:
+    """
+    Count characters and images on some pages of a pdf
+    :param reader: open pdf
+    :param indices: indices of the pages to count
+    :param image_count_mode: 'xobject' (page_image_stats) or 'pypdf' (len(page.images))
+    :param char_count_mode: 'exact' (len(page.extract_text())) or 'fast' (ContentCharCounter)
+    """
+    counter = ContentCharCounter() if char_count_mode == 'fast' else None
+    counts = PdfPageCounts([], [], [])
+    pages = reader.pages
+    for i in indices:
+        page = pages[i]
+        counts.char_counts.append(counter.count_page(page) if counter else len(page.extract_text()))
+        if image_count_mode == 'pypdf':
+            counts.image_counts.append(len(page.images))
+        else:
+            stats = page_image_stats(page)
+            counts.image_stats.append(stats)
+            counts.image_counts.append(stats.count)
+    return counts
+
+
+def count_pages_in_file(source: Union[str, Path, bytes], indices: Sequence[int], image_count_mode: str = 'xobject',
+                        char_count_mode: str = 'exact') -> PdfPageCounts:
+    """
+    count_pages on a pdf this function opens itself, so that it can run in another process
+    :param source: path to the pdf, or its content
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return count_pages(PdfReader(source), indices, image_count_mode, char_count_mode)
+
+
+def split_pages(indices: Sequence[int], chunks: int) -> List[List[int]]:
+    """
+    Split pages into at most chunks page ranges of at least MIN_PARALLEL_CHUNK_PAGES pages, to count
+    them with count_pages_in_file in as many processes, and concatenate their counts in order
+    :param indices: indices of the pages to count
+    :param chunks: maximum number of ranges
+    """
+    chunk_size = max(MIN_PARALLEL_CHUNK_PAGES, math.ceil(len(indices) / max(1, chunks)))
+    return [list(indices[i:i + chunk_size]) for i in range(0, len(indices), chunk_size)]
@@ -0,0 +1,72 @@
+"""
+Compact records of extracted values, independent of the ORM: what workers build and send back,
+and what the writers turn into rows
+"""
+from typing import Dict
+
+__all__ = ['Record', 'FileRecord', 'ImageInfoRecord', 'PdfInfoRecord']
+
+
+class Record:
+    """
+    Immutable record of extracted values. Subclasses list their fields in __slots__.
+    Pickled as its class and a tuple of its values
+    """
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        values = dict(zip(self.__slots__, args), **kwargs)
+        for name in self.__slots__:
+            object.__setattr__(self, name, values.pop(name, None))
+        if values:
+            raise TypeError(f"{type(self).__name__} has no field {', '.join(values)}")
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._values() == other._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __reduce__(self):
+        return type(self), self._values()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{n}={getattr(self, n)!r}' for n in self.__slots__)})"
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def to_row(self) -> Dict[str, object]:
+        """
+        {column: value}, for a Core insert or an ORM constructor
+        """
+        return dict(zip(self.__slots__, self._values()))
+
+
+class FileRecord(Record):
+    """
+    A storage.files row, without its id. Fields are its columns
+    """
+    __slots__ = ('digest', 'size', 'pronom_number', 'persistent_id', 'created_at', 'validity', 'earliest_mdate')
+
+
+class ImageInfoRecord(Record):
+    """
+    A content.image_file_infos row, without its ids. Fields are its columns
+    """
+    __slots__ = ('image_type', 'image_mode', 'tiff_compression', 'width', 'height', 'quality', 'bps_x', 'bps_y',
+                 'recorded_date')
+
+
+class PdfInfoRecord(Record):
+    """
+    A content.pdf_file_infos row, without its ids. Fields are its columns
+    """
+    __slots__ = ('number_of_pages', 'median_nb_chr_per_page', 'median_nb_images_per_page', 'median_sample_size',
+                 'recorded_date')
@@ -0,0 +1,163 @@
+"""
+Resolution of storage roots, objects and files to their ids, with local caches, so that writing a batch
+of paths costs a few statements per batch and none per path
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, select, text
+
+from known_files import FileKey, KnownFiles
+from ORMModel import ArchiveObject, ImageFile, Root
+from util.file_walker import StorageObject
+
+__all__ = ['consecutive_insert_ids', 'insert_ids', 'StorageResolver']
+
+
+def consecutive_insert_ids(session) -> bool:
+    """
+    True if the server gives the rows of a multi-row INSERT consecutive AUTO_INCREMENT ids, from the first
+    one it returns: InnoDB does with innodb_autoinc_lock_mode 0 or 1, not with 2 (the MySQL 8 default),
+    and only with an auto_increment_increment of 1, which multi-primary setups (Galera, group replication)
+    usually raise
+    """
+    try:
+        mode, increment = session.execute(
+            text("SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment")).one()
+    except Exception:
+        return False
+    return mode is not None and int(mode) < 2 and increment is not None and int(increment) == 1
+
+
+def insert_ids(session, table, rows: List[dict], consecutive_ids: bool) -> Optional[List[int]]:
+    """
+    Insert rows with INSERT IGNORE, which leaves rows other writers added since alone
+    :param consecutive_ids: see consecutive_insert_ids
+    :return: the ids of the rows, in order, if they were all inserted and their ids are consecutive.
+    None if the caller must look them up
+    """
+    result = session.execute(insert(table).prefix_with('IGNORE').values(rows))
+    if not consecutive_ids or result.rowcount != len(rows) or not result.lastrowid:
+        return None
+    return list(range(result.lastrowid, result.lastrowid + len(rows)))
+
+
+class StorageResolver:
+    """
+    Resolves, and adds when missing:
+
+    - storage roots by name. The roots are few: they are loaded in full, once
+    - storage objects by (bdrc_id, root). Cache misses are looked up with one IN query per call,
+      and the missing objects added with one multi-row insert
+    - storage files by (digest, size), through KnownFiles, the same way
+
+    The ids of added rows are taken from the insert when the server gives consecutive ids, so that
+    a batch of new objects or files costs one SELECT and one INSERT. Otherwise a second SELECT resolves them.
+    """
+
+    def __init__(self, session, known_files: Optional[KnownFiles] = None, object_cache_size: int = 100000,
+                 consecutive_ids: Optional[bool] = None):
+        """
+        :param session: SQLAlchemy session, e.g. DrsDbContextBase.session. Nothing is committed here
+        :param known_files: cache of storage.files ids, shared with whoever else looks files up
+        :param object_cache_size: number of objects to remember
+        :param consecutive_ids: see consecutive_insert_ids. Default: asked to the server on the first insert
+        """
+        self._session = session
+        self.files = known_files if known_files is not None else KnownFiles(session)
+        self.object_cache_size = object_cache_size
+        self._consecutive_ids = consecutive_ids
+        self._roots: Optional[Dict[str, int]] = None
+        # (root id, bdrc_id) -> (id, last_modified_at)
+        self._objects: 'OrderedDict[Tuple[int, str], Tuple[int, Optional[datetime]]]' = OrderedDict()
+
+    @property
+    def consecutive_ids(self) -> bool:
+        if self._consecutive_ids is None:
+            self._consecutive_ids = consecutive_insert_ids(self._session)
+        return self._consecutive_ids
+
+    def root_id(self, name: str, layout: str) -> int:
+        """
+        storage.roots.id of a storage root, added if it is not there
+        """
+        table = Root.__table__
+        if self._roots is None:
+            self._roots = {root_name: root_id for root_id, root_name in
+                           self._session.execute(select(table.c.id, table.c.name)).all()}
+        root_id = self._roots.get(name)
+        if root_id is None:
+            root_id = self._session.execute(insert(table).values(name=name, layout=layout)).inserted_primary_key[0]
+            self._roots[name] = root_id
+        return root_id
+
+    def _cache_object(self, key: Tuple[int, str], value: Tuple[int, Optional[datetime]]):
+        self._objects[key] = value
+        self._objects.move_to_end(key)
+        while len(self._objects) > self.object_cache_size:
+            self._objects.popitem(last=False)
+
+    def _load_objects(self, root_id: int, bdrc_ids: Iterable[str]):
+        table = ArchiveObject.__table__
+        rows = self._session.execute(
+            select(table.c.id, table.c.bdrc_id, table.c.last_modified_at)
+            .where(table.c.root == root_id, table.c.bdrc_id.in_(list(bdrc_ids)))).all()
+        for object_id, bdrc_id, last_modified_at in rows:
+            self._cache_object((root_id, bdrc_id), (object_id, last_modified_at))
+
+    def object_ids(self, root_id: int, objects: Iterable[StorageObject]) -> Dict[str, int]:
+        """
+        storage.objects ids of objects of a root. Missing objects are added; objects modified since
+        they were added get their last_modified_at updated
+        :return: {bdrc_id: id}
+        """
+        table = ArchiveObject.__table__
+        wanted = {obj.bdrc_id: obj for obj in objects}
+        misses = [bdrc_id for bdrc_id in wanted if (root_id, bdrc_id) not in self._objects]
+        if misses:
+            self._load_objects(root_id, misses)
+        new = [wanted[bdrc_id] for bdrc_id in misses if (root_id, bdrc_id) not in self._objects]
+        if new:
+            ids = insert_ids(self._session, table, [{'bdrc_id': obj.bdrc_id, 'root': root_id,
+                                                     'created_at': obj.created_at,
+                                                     'last_modified_at': obj.last_modified_at} for obj in new],
+                             self.consecutive_ids)
+            if ids is None:
+                self._load_objects(root_id, (obj.bdrc_id for obj in new))
+            else:
+                for obj, object_id in zip(new, ids):
+                    self._cache_object((root_id, obj.bdrc_id), (object_id, obj.last_modified_at))
+        resolved: Dict[str, int] = {}
+        for bdrc_id, obj in wanted.items():
+            cached = self._objects.get((root_id, bdrc_id))
+            if cached is None:
+                continue
+            object_id, last_modified_at = cached
+            self._objects.move_to_end((root_id, bdrc_id))
+            if obj.last_modified_at is not None and (last_modified_at is None or obj.last_modified_at > last_modified_at):
+                # a new version: rare, one statement each
+                self._session.execute(table.update().where(table.c.id == object_id)
+                                      .values(last_modified_at=obj.last_modified_at))
+                self._objects[(root_id, bdrc_id)] = (object_id, obj.last_modified_at)
+            resolved[bdrc_id] = object_id
+        return resolved
+
+    def file_ids(self, rows: Dict[FileKey, dict]) -> Dict[FileKey, int]:
+        """
+        storage.files ids of files, adding the missing ones. Existing files are left alone
+        :param rows: {(digest, size): storage.files row}
+        :return: {(digest, size): id}
+        """
+        resolved = self.files.resolve(rows.keys())
+        new = [key for key in rows if key not in resolved]
+        if not new:
+            return resolved
+        ids = insert_ids(self._session, ImageFile.__table__, [rows[key] for key in new], self.consecutive_ids)
+        if ids is None:
+            resolved.update(self.files.resolve(new))
+        else:
+            for key, file_id in zip(new, ids):
+                self.files.add(key, file_id)
+                resolved[key] = file_id
+        return resolved
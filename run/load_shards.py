@@ -0,0 +1,51 @@
+"""
+Load shard files written by read_write.py --export into the database
+"""
+import argparse
+import os
+from pathlib import Path
+from typing import Iterable, List
+
+from BdrcDbLib.DbOrm.DrsContextBase import DrsDbContextBase
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from shard_export import SHARD_FORMATS
+from shard_loader import LOADED_SUFFIX, ShardLoader
+
+
+def shards_of(paths: Iterable[str]) -> List[Path]:
+    """
+    The shard files given, and those in the directories given, in name order.
+    Shards being written (.part), or already loaded, are left out by their suffix
+    """
+    shards = []
+    for path in map(Path, paths):
+        candidates = sorted(path.iterdir()) if path.is_dir() else [path]
+        shards.extend(p for p in candidates if p.is_file() and p.suffix.lstrip('.') in SHARD_FORMATS)
+    return shards
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load read_write.py --export shards")
+    parser.add_argument("-c", "--content-db", required=True, help="content db config entry")
+    parser.add_argument("shards", nargs='+', help="shard files, or directories of shards")
+    parser.add_argument("--keep", action="store_true",
+                        help=f"leave loaded shards as they are. Default: rename them with a {LOADED_SUFFIX} suffix, "
+                             f"so that reruns skip them")
+    args = parser.parse_args()
+
+    with DrsDbContextBase(args.content_db) as content_db:
+        # LOAD DATA LOCAL must be allowed by the client connection
+        engine = create_engine(content_db.session.get_bind().url, connect_args={'local_infile': True})
+        with Session(engine) as session:
+            loader = ShardLoader(session)
+            for shard in shards_of(args.shards):
+                print(f"Loaded {loader.load(shard)} rows from {shard}")
+                if not args.keep:
+                    os.replace(shard, str(shard) + LOADED_SUFFIX)
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
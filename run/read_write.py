@@ -3,32 +3,154 @@ Test stub to do a read write
 """
 import argparse
 import os
+import statistics
+from functools import partial
+from itertools import islice
+from multiprocessing import Pool
+from multiprocessing.pool import AsyncResult
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from BdrcDbLib.DbOrm.DrsContextBase import DrsDbContextBase
-from sqlalchemy.dialects.mysql import insert
 
 import image_info as ii
 import FileInfo as fi
+from batch_writer import BatchWriter
+from checkpoint import ScanCheckpoint
+from format_sniffer import SNIFF_SIZE, read_header, sniff_format
+from known_files import KnownFiles
+from ocfl import ocfl_entries, storage_root_layout
+from pdf_stats import count_pages_in_file
+from records import FileRecord, PdfInfoRecord
+from resolver import StorageResolver
+from scan_manifest import ScanManifest
+from shard_export import SHARD_FORMATS, ShardWriter
+from util import time_proc
+from util.file_walker import ROOT_FOLDERS, WalkEntry, walk_files
+from util.prefetch import DEFAULT_MAX_BYTES, POOL_CHUNK_SIZE, Prefetcher
+
+# Files handed to each worker at a time, except prefetched ones (see util.prefetch.POOL_CHUNK_SIZE)
+WORKER_CHUNK_SIZE: int = 8
+
+# Larger files are read twice (hash, then parse) rather than held in memory
+SINGLE_PASS_MAX_SIZE: int = 512 * 1024 * 1024
 
 
 def must_exist_path(path):
     if not os.path.exists(path):
         raise argparse.ArgumentTypeError(f"Path '{path}' does not exist.")
     return path
+
+
+def positive_int(value):
+    ivalue = int(value)
+    if ivalue < 1:
+        raise argparse.ArgumentTypeError(f"'{value}' must be a positive integer.")
+    return ivalue
+
+
 class RwArgParser():
     """
     inherit db connection methods
     """
     _parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Read images, put into db")
     def __init__(self):
-        self._parser.add_argument("-s", "--storage-db", required=True, help="storage db config entry")
-        self._parser.add_argument("-c", "--content-db", required=True, help="content db config entry")
+        self._parser.add_argument("-s", "--storage-db", help="storage db config entry. Required unless --export")
+        self._parser.add_argument("-c", "--content-db", help="content db config entry. Required unless --export")
         self._parser.add_argument("-p", "--path", required=True, help="path to read (file or dir)",type=must_exist_path)
+        self._parser.add_argument("-w", "--workers", type=positive_int, default=1,
+                                  help="number of processes extracting and hashing files. The database is always "
+                                       "written by this process")
+        self._parser.add_argument("-r", "--recursive", action="store_true",
+                                  help="walk the whole tree under path. Default is only the files directly in it")
+        self._parser.add_argument("-i", "--include", action="append", default=[],
+                                  help="only read files matching this glob (repeatable)")
+        self._parser.add_argument("-x", "--exclude", action="append", default=[],
+                                  help="skip files and directories matching this glob (repeatable)")
+        self._parser.add_argument("--root-folder", action="append", choices=ROOT_FOLDERS,
+                                  help="only read files under this root folder (repeatable)")
+        self._parser.add_argument("--single-pass", action="store_true",
+                                  help="read each file once into memory, then hash and parse those bytes "
+                                       f"(files over {SINGLE_PASS_MAX_SIZE} bytes are still read twice)")
+        self._parser.add_argument("--prefetch", type=int, default=0, metavar="N",
+                                  help="keep N file reads in flight ahead of the extractors, and hash and parse "
+                                       "the bytes read. For network mounts. 0 (default) reads files as needed")
+        self._parser.add_argument("--prefetch-mb", type=positive_int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                                  help="with --prefetch, cap on the MiB read ahead and not yet processed")
+        self._parser.add_argument("-m", "--manifest",
+                                  help="SQLite manifest of previous scans (created if needed). Files whose size, "
+                                       "mtime and inode have not changed since are skipped without being opened")
+        self._parser.add_argument("--batch-size", type=positive_int, default=500,
+                                  help="files written per multi-row insert")
+        self._parser.add_argument("--commit-interval", type=positive_int, default=5000,
+                                  help="files written between commits (rounded up to whole batches)")
+        self._parser.add_argument("-k", "--skip-known", action="store_true",
+                                  help="hash files first, and only record the path of files whose (digest, size) "
+                                       "storage.files already has, without extracting their metadata")
+        self._parser.add_argument("--known-cache-size", type=positive_int, default=100000,
+                                  help="number of files whose storage.files id is remembered locally")
+        self._parser.add_argument("--pdf-sample-pages", type=positive_int,
+                                  help="compute pdf medians on at most this many pages, evenly spread")
+        self._parser.add_argument("--pdf-sample-seed", type=int,
+                                  help="with --pdf-sample-pages, draw the pages at random from this seed")
+        self._parser.add_argument("--pdf-image-count", choices=['xobject', 'pypdf'], default='xobject',
+                                  help="count pdf images from the page resources without decoding (xobject), "
+                                       "or with pypdf page.images, which also counts inline images")
+        self._parser.add_argument("--pdf-char-count", choices=['exact', 'fast'], default='exact',
+                                  help="count pdf characters with pypdf extract_text (exact), or from the content "
+                                       "stream text operators (fast, a few percent lower)")
+        self._parser.add_argument("--pdf-parallel-threshold", type=positive_int, default=500,
+                                  help="with several --workers, split the pages of pdfs with more analysed pages "
+                                       "than this into ranges, which all the workers count")
+        self._parser.add_argument("--pdf-parallel-workers", type=positive_int,
+                                  help="page ranges per large pdf (default: --workers)")
+        self._parser.add_argument("--export", metavar="DIR",
+                                  help="write the records to shard files in DIR instead of the database, for "
+                                       "run/load_shards.py to load. Needs no database access")
+        self._parser.add_argument("--export-format", choices=SHARD_FORMATS, default='jsonl',
+                                  help="with --export, format of the shards (parquet needs pyarrow)")
+        self._parser.add_argument("--shard-rows", type=positive_int, default=100000,
+                                  help="with --export, files per shard")
+        self._parser.add_argument("--checkpoint", metavar="FILE",
+                                  help="SQLite journal of the files and directories done, committed with the "
+                                       "database, and of the files which failed. Cleared unless --resume")
+        self._parser.add_argument("--resume", action="store_true",
+                                  help="continue the scan of --checkpoint: done directories are not walked "
+                                       "again, done files are not read again")
+        self._parser.add_argument("--retry-failed", action="store_true",
+                                  help="only read the files which failed in the scans of --checkpoint")
+        self._parser.add_argument("--ocfl", action="store_true",
+                                  help="path is an OCFL storage root: read the content files of its objects' "
+                                       "inventories, reuse their sha256 digests, and record the objects. "
+                                       "-r, -i, -x and --root-folder do not apply")
+        self._parser.add_argument("--root-name",
+                                  help="with --ocfl, name of the storage root in storage.roots. Default: the "
+                                       "name of path")
+        self._parser.add_argument("--timings", action="store_true",
+                                  help="time the stat, read, hash, sniff, parse and database stages by file format, "
+                                       "and print a summary at the end")
+        self._parser.add_argument("--timings-json",
+                                  help="write the stage timings to this JSON file, every --timings-interval seconds "
+                                       "and at the end")
+        self._parser.add_argument("--timings-interval", type=positive_int, default=60,
+                                  help="seconds between writes of --timings-json")
 
 
     def parse_args(self):
-        return self._parser.parse_args()
+        args = self._parser.parse_args()
+        if args.export is None and (args.storage_db is None or args.content_db is None):
+            self._parser.error("-s/--storage-db and -c/--content-db are required, unless --export")
+        if args.export is not None and args.skip_known:
+            self._parser.error("--skip-known looks files up in the database, it cannot be used with --export")
+        if (args.resume or args.retry_failed) and not args.checkpoint:
+            self._parser.error("--resume and --retry-failed need a --checkpoint")
+        if args.ocfl and args.export is not None:
+            self._parser.error("--ocfl records objects in the database, it cannot be used with --export")
+        if args.ocfl and args.retry_failed:
+            self._parser.error("--retry-failed does not know the objects of the files, it cannot be used with --ocfl")
+        if args.ocfl and not os.path.isdir(args.path):
+            self._parser.error("--ocfl needs the path of a storage root")
+        return args
 
 
 def main():
@@ -37,65 +159,540 @@ def main():
     :return:
     """
     args = RwArgParser().parse_args()
-    src: Path = Path(args.path)
-    with DrsDbContextBase(args.content_db) as content_db:
-        # recurse one directory down. No further
-        if src.is_dir():
-            nlim: int = 0
-            print(f"Reading directory {src}")
-            for p in src.iterdir():
-                print(f"Reading {str(p)}")
-                _orm_image = read_one(p)
-                if process(p,_orm_image, content_db):
-                    nlim += 1
+    # absolute, so that manifest keys do not depend on the working directory
+    src: Path = Path(os.path.abspath(args.path))
+    manifest: Optional[ScanManifest] = ScanManifest(args.manifest) if args.manifest else None
+    time_proc.enable(args.timings or bool(args.timings_json))
+    checkpoint: Optional[ScanCheckpoint] = \
+        ScanCheckpoint(args.checkpoint, str(src), args.resume or args.retry_failed) if args.checkpoint else None
+    if args.retry_failed:
+        entries = checkpoint.failed_entries()
+    elif args.ocfl:
+        print(f"Reading OCFL storage root {src}")
+        entries = ocfl_entries(str(src))
+    elif src.is_dir():
+        print(f"Reading directory {src}")
+        entries = walk_files(str(src), include=args.include, exclude=args.exclude,
+                             root_folders=args.root_folder, max_depth=None if args.recursive else 1,
+                             prune=checkpoint.is_done if checkpoint else None,
+                             on_directory_listed=checkpoint.on_directory_listed if checkpoint else None)
+    else:
+        entries = [WalkEntry(str(src), src.stat(), None, src.name)]
+    if manifest:
+        entries = skip_unchanged(entries, manifest)
+    if checkpoint and not args.retry_failed:
+        # last, so that every file it counts is scanned
+        entries = checkpoint.track(entries)
+    pdf_settings = {'sample_pages': args.pdf_sample_pages, 'sample_seed': args.pdf_sample_seed,
+                    'image_count_mode': args.pdf_image_count, 'char_count_mode': args.pdf_char_count,
+                    'parallel_page_threshold': args.pdf_parallel_threshold,
+                    'parallel_workers': args.pdf_parallel_workers}
+    prefetcher = Prefetcher(args.prefetch, args.prefetch_mb * 1024 * 1024, SINGLE_PASS_MAX_SIZE) \
+        if args.prefetch > 0 else None
+
+    def _timed(records):
+        if args.timings_json:
+            return time_proc.dump_periodically(records, Path(args.timings_json), args.timings_interval)
+        return records
+
+    try:
+        if args.export:
+            records = scan(entries, args.workers, args.single_pass, None, args.batch_size, pdf_settings, prefetcher)
+            shards = export_records(_timed(records), Path(args.export), args.export_format, args.shard_rows,
+                                    manifest, checkpoint)
+            print(f"Wrote {len(shards)} shards to {args.export}")
+        else:
+            with DrsDbContextBase(args.content_db) as content_db:
+                resolver = StorageResolver(content_db.session, KnownFiles(content_db.session, args.known_cache_size))
+                # here, not in the entries generator, which runs in the pool's feeder thread
+                root_id = resolver.root_id(args.root_name or src.name, storage_root_layout(str(src))) \
+                    if args.ocfl else None
+                records = scan(entries, args.workers, args.single_pass, resolver.files if args.skip_known else None,
+                               args.batch_size, pdf_settings, prefetcher)
+                write_records(content_db, _timed(records), args.batch_size, args.commit_interval, manifest,
+                              resolver, checkpoint, root_id)
+    finally:
+        if prefetcher:
+            prefetcher.close()
+    if manifest:
+        manifest.close()
+    if checkpoint:
+        failures = checkpoint.failures()
+        if failures:
+            print(f"{len(failures)} files could not be read, see --retry-failed")
+        checkpoint.close()
+    if args.timings_json:
+        # again, with the last commit
+        time_proc.dump_json(Path(args.timings_json))
+    if args.timings:
+        print(time_proc.summary())
+
+
+def skip_unchanged(entries: Iterable[WalkEntry], manifest: ScanManifest) -> Iterator[WalkEntry]:
+    """
+    Drop the files which the manifest says are unchanged since they were last scanned
+    """
+    for entry in entries:
+        if manifest.is_unchanged(entry.path, entry.stat):
+            continue
+        yield entry
+
+
+def scan(entries: Iterable[WalkEntry], workers: int = 1, single_pass: bool = False,
+         known_files: Optional[KnownFiles] = None, precheck_size: int = 500,
+         pdf_settings: Optional[dict] = None, prefetcher: Optional[Prefetcher] = None) -> Iterator[Optional[dict]]:
+    """
+    Extract and hash files, in a pool of worker processes when workers > 1.
+    Records come back in completion order, not in the order of entries.
+    :param entries: files to read, as yielded by walk_files
+    :param workers: number of processes
+    :param single_pass: see extract_one
+    :param known_files: if given, files are hashed first, in batches of precheck_size, and those
+    already in storage.files are not extracted (see known_record). Unknown files are then read again,
+    except, with a prefetcher, those whose bytes could be kept from the hashing (see _hash_all).
+    Files whose entry has a digest are not hashed
+    :param precheck_size: files per lookup of known_files
+    :param pdf_settings: keyword arguments of image_info.configure_pdf_analysis, applied in every worker.
+    With several workers, the pages of pdfs over parallel_page_threshold are counted by all of them,
+    in parallel_workers (default: workers) page ranges, see _count_split_pdfs
+    :param prefetcher: if given, files are read ahead by it, and hashed and parsed from the bytes it read
+    :return: records, see extract_one
+    """
+    pdf_settings = dict(pdf_settings or {})
+    if workers == 1:
+        # no other worker to count page ranges
+        pdf_settings['parallel_page_threshold'] = None
+    elif pdf_settings.get('parallel_workers') is None:
+        pdf_settings['parallel_workers'] = workers
+    init_args = (pdf_settings, time_proc.enabled())
+    with (Pool(workers, _init_worker, init_args) if workers > 1 else _NoPool(_init_worker, init_args)) as pool:
+        if known_files is None:
+            yield from _merge_timings(_count_split_pdfs(pool, _extract_all(pool, entries, {}, single_pass,
+                                                                           prefetcher)))
+            return
+        entries = iter(entries)
+        while True:
+            batch = list(islice(entries, precheck_size))
+            if not batch:
+                break
+            hashed = [(entry, entry.digest) for entry in batch if entry.digest is not None]
+            retained: Dict[str, bytes] = {}
+            hashed.extend(_hash_all(pool, [entry for entry in batch if entry.digest is None], prefetcher, retained))
+            known = known_files.resolve((digest, entry.stat.st_size) for entry, digest in hashed if digest)
+            unknown: Dict[str, Optional[bytes]] = {}
+            for entry, digest in hashed:
+                file_id = known.get((digest, entry.stat.st_size))
+                if file_id is None:
+                    unknown[entry.path] = digest
                 else:
-                    print(f"Skipping file {str(p)}")
-                if nlim > 10:
-                    content_db.session.commit()
-                    nlim = 0
+                    if entry.path in retained:
+                        prefetcher.release(len(retained.pop(entry.path)))
+                    yield known_record(entry, digest, file_id)
+            yield from _merge_timings(_count_split_pdfs(
+                pool, _extract_all(pool, (entry for entry, _ in hashed if entry.path in unknown), unknown,
+                                   single_pass, prefetcher, retained)))
 
-        if src.is_file():
-            _orm_image = read_one(src)
-            if not process(src,_orm_image, content_db):
-                print(f"Skipping file {str(src)}")
-                # commit happens on exit
 
+def _hash_all(pool, batch: List[WalkEntry], prefetcher: Optional[Prefetcher],
+              retained: Optional[Dict[str, bytes]] = None) -> List[Tuple[WalkEntry, Optional[bytes]]]:
+    """
+    Hash a batch of files in the pool, taking the stage timings the workers send along with the digests
+    :param retained: with a prefetcher, gets the bytes of the files which are kept for their extraction,
+    by path. They stay reserved in the prefetcher, up to the cap minus the largest file of the batch,
+    so that the prefetcher always has room for the next file. The caller releases them
+    """
+    if not batch:
+        return []
+    if prefetcher is None:
+        results = pool.map(hash_one, batch, WORKER_CHUNK_SIZE)
+    else:
+        results = []
+        # read by the pool's feeder thread, taken by this one once the file is hashed
+        read: Dict[str, bytes] = {}
+        prefetched_sizes = [entry.stat.st_size for entry in batch
+                            if prefetcher.max_file_size is None or entry.stat.st_size <= prefetcher.max_file_size]
+        budget = prefetcher.max_bytes - max(prefetched_sizes) if retained is not None and prefetched_sizes else 0
+        kept = 0
+        # imap_unordered, not map, which would pull every prefetched file before handing any to a worker
+        for nbytes, result in pool.imap_unordered(_hash_prefetched, _remember(prefetcher.prefetch(batch), read),
+                                                  POOL_CHUNK_SIZE):
+            data = read.pop(result[0].path, None)
+            if data is not None and result[1] is not None and kept + nbytes <= budget:
+                retained[result[0].path] = data
+                kept += nbytes
+            else:
+                prefetcher.release(nbytes)
+            results.append(result)
+    hashed = []
+    for entry, digest, timings in results:
+        if timings:
+            time_proc.merge(timings)
+        hashed.append((entry, digest))
+    return hashed
 
-def process(p,_orm_image, content_db):
-    image_to_file(p, _orm_image)
-    image_to_db(content_db, _orm_image)
 
-def image_to_file(p, orm_image):
-    _orm_file = fi.f_to_files(p)
-    orm_image.file = _orm_file
+def _remember(prefetched: Iterable[Tuple[WalkEntry, Optional[bytes]]], read: Dict[str, bytes]) \
+        -> Iterator[Tuple[WalkEntry, Optional[bytes]]]:
+    for entry, data in prefetched:
+        if data is not None:
+            read[entry.path] = data
+        yield entry, data
 
 
-def image_to_db(content_db, orm_image):
-    # Inspect the table dynamically
-    stmt = insert(orm_image.__table__).values(
-        **orm_image.__dict__
-    ).on_duplicate_key_update(
-        **{col.name: getattr(orm_image, col.name) for col in orm_image.__table__.columns}
-    )
-    content_db.session.execute(stmt)
-    content_db.session.add(orm_image)
+def _extract_all(pool, entries: Iterable[WalkEntry], digests: Dict[str, Optional[bytes]], single_pass: bool,
+                 prefetcher: Optional[Prefetcher], retained: Optional[Dict[str, bytes]] = None) \
+        -> Iterator[Optional[dict]]:
+    if prefetcher is None:
+        yield from pool.imap_unordered(partial(_extract_hashed, single_pass=single_pass),
+                                       ((entry, digests.get(entry.path)) for entry in entries), WORKER_CHUNK_SIZE)
+        return
+    prefetched = ((entry, data, digests.get(entry.path))
+                  for entry, data in _prefetch_unretained(prefetcher, entries, retained or {}))
+    for nbytes, record in pool.imap_unordered(_extract_prefetched, prefetched, POOL_CHUNK_SIZE):
+        prefetcher.release(nbytes)
+        yield record
 
 
-def read_one(p: Path)-> object:
+def _prefetch_unretained(prefetcher: Prefetcher, entries: Iterable[WalkEntry], retained: Dict[str, bytes]) \
+        -> Iterator[Tuple[WalkEntry, Optional[bytes]]]:
     """
-    Returns a BaseImage ORMModel client to its caller, if it can
-    :param p: Path to image
+    The retained files with their bytes, then the others as the prefetcher reads them
+    """
+    if not retained:
+        yield from prefetcher.prefetch(entries)
+        return
+    others = []
+    for entry in entries:
+        data = retained.pop(entry.path, None)
+        if data is None:
+            others.append(entry)
+        else:
+            yield entry, data
+    yield from prefetcher.prefetch(others)
+
+
+def _count_split_pdfs(pool, records: Iterable[Optional[dict]]) -> Iterator[Optional[dict]]:
+    """
+    Complete the records of pdfs whose pages were split into ranges (see read_info): the pool counts
+    the ranges as tasks of their own, alongside the other files, and the records come out once all
+    their ranges are counted. The other records go through as they come
+    """
+    pending: List[Tuple[dict, List[AsyncResult]]] = []
+    for record in records:
+        if record is not None and record.get('page_chunks'):
+            pending.append((record, [pool.apply_async(count_page_chunk, ((record['path'], chunk),))
+                                     for chunk in record.pop('page_chunks')]))
+        else:
+            yield record
+        done = [item for item in pending if all(result.ready() for result in item[1])]
+        for item in done:
+            pending.remove(item)
+            yield _complete_split_pdf(*item)
+    for item in pending:
+        yield _complete_split_pdf(*item)
+
+
+def _complete_split_pdf(record: dict, results: List[AsyncResult]) -> dict:
+    char_counts: List[int] = []
+    image_counts: List[int] = []
+    try:
+        for result in results:
+            chunk_chars, chunk_images, timings = result.get()
+            char_counts.extend(chunk_chars)
+            image_counts.extend(chunk_images)
+            if timings:
+                time_proc.merge(timings)
+    except Exception as e:
+        print(f"Skipping file {record['path']}. Error {e}")
+        return dict(record, info_type=None, info=None, file=None, error=str(e))
+    record['info'] = PdfInfoRecord(**dict(record['info'].to_row(),
+                                          median_nb_chr_per_page=statistics.median(char_counts),
+                                          median_nb_images_per_page=statistics.median(image_counts)))
+    return record
+
+
+def _merge_timings(records: Iterable[Optional[dict]]) -> Iterator[Optional[dict]]:
+    """
+    Take the stage timings workers send along with their records, see extract_one
+    """
+    for record in records:
+        if record is not None and 'timings' in record:
+            time_proc.merge(record.pop('timings'))
+        yield record
+
+
+def _init_worker(pdf_settings: dict, timings: bool = False):
+    ii.configure_pdf_analysis(**pdf_settings)
+    time_proc.enable(timings)
+
+
+class _NoPool:
+    """
+    In-process stand-in for multiprocessing.Pool
+    """
+
+    def __init__(self, initializer=None, initargs=()):
+        if initializer:
+            initializer(*initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def map(self, func, iterable, chunksize=None):
+        return list(map(func, iterable))
+
+    def imap_unordered(self, func, iterable, chunksize=None):
+        return map(func, iterable)
+
+
+def count_page_chunk(task: Tuple[str, List[int]]) -> Tuple[List[int], List[int], Optional[time_proc.Snapshot]]:
     """
-    _orm_image = None
+    Worker side of the page counts of a split pdf, see _count_split_pdfs. The pdf is opened from its path
+    :param task: the pdf's path, and the indices of a range of its pages
+    :return: the character and image counts of the pages, and when timing is enabled, the timings
+    drained from this process
+    """
+    path, indices = task
+    with time_proc.stage('parse', 'pdf'):
+        counts = count_pages_in_file(path, indices, ii.PdfImage.image_count_mode, ii.PdfImage.char_count_mode)
+    return counts.char_counts, counts.image_counts, time_proc.drain() if time_proc.enabled() else None
+
+
+def hash_one(entry: WalkEntry, data: Optional[bytes] = None) \
+        -> Tuple[WalkEntry, Optional[bytes], Optional[time_proc.Snapshot]]:
+    """
+    Worker side of the known files precheck
+    :param data: the file's content, if it was already read (see util.prefetch)
+    :return: the entry, its digest (None if the file could not be read), and when timing is enabled,
+    the timings drained from this process, labelled with the file's format
+    """
+    try:
+        _note_format(entry.path, data)
+        if data is None:
+            digest = fi.f_digests(Path(entry.path))[fi.DIGEST_ALGORITHM]
+        else:
+            digest = fi.f_digests_bytes(data)[fi.DIGEST_ALGORITHM]
+    except OSError as e:
+        print(f"Could not hash {entry.path}. Error {e}")
+        digest = None
+    time_proc.file_done()
+    return entry, digest, time_proc.drain() if time_proc.enabled() else None
+
+
+def _note_format(path: str, data: Optional[bytes] = None):
+    # Only when timing: on disk, this reads the file's header, which hashing does not otherwise need
+    if not time_proc.enabled():
+        return
+    with time_proc.stage('sniff'):
+        header = read_header(path) if data is None else data[:SNIFF_SIZE]
+    time_proc.note_format(sniff_format(header, Path(path).suffix))
+
+
+def known_record(entry: WalkEntry, digest: bytes, file_id: int) -> dict:
+    """
+    Record of a file storage.files already has: only its path is written
+    """
+    return {
+        'path': entry.path,
+        'rel_path': entry.rel_path,
+        'stat': entry.stat,
+        'root_folder': entry.root_folder,
+        'info_type': None,
+        'info': None,
+        'file': FileRecord(digest=digest, size=entry.stat.st_size),
+        'storage_object': entry.storage_object,
+        'image_group': entry.image_group,
+        'file_id': file_id
+    }
+
+
+def write_records(content_db, records: Iterable[Optional[dict]], batch_size: int = 500, commit_interval: int = 5000,
+                  manifest: Optional[ScanManifest] = None, resolver: Optional[StorageResolver] = None,
+                  checkpoint: Optional[ScanCheckpoint] = None, root_id: Optional[int] = None):
+    """
+    Single writer: owns the database session and writes records in batches
+    :param content_db: open DrsDbContextBase
+    :param records: output of scan
+    :param batch_size: records per multi-row insert
+    :param commit_interval: records between commits
+    :param manifest: if given, written files are recorded in it, committed right after the database
+    :param resolver: resolves and adds the files and objects written, see BatchWriter. Its files cache is
+    the known_files of scan, so that later copies of the files written are found without a query
+    :param checkpoint: if given, written and failed files are journaled in it, committed right after the database
+    :param root_id: storage.roots.id of the OCFL storage root scanned, see BatchWriter
+    """
+    def _record_committed(committed: List[dict]):
+        if manifest:
+            for record in committed:
+                manifest.record(record['path'], record['stat'], record['file'].digest, record['file_id'],
+                                record['info_id'], record['info_type'])
+            manifest.commit()
+        if checkpoint:
+            checkpoint.committed(committed)
+            checkpoint.commit()
+
+    with BatchWriter(content_db.session, batch_size, commit_interval,
+                     on_commit=_record_committed if manifest or checkpoint else None,
+                     resolver=resolver, root_id=root_id) as writer:
+        for record in records:
+            if record is None:
+                continue
+            if record.get('error') is not None:
+                if checkpoint:
+                    checkpoint.failed(record)
+                continue
+            writer.add(record)
+    if checkpoint:
+        # failures since the last commit
+        checkpoint.commit()
+
+
+def export_records(records: Iterable[Optional[dict]], out_dir: Path, shard_format: str = 'jsonl',
+                   shard_rows: int = 100000, manifest: Optional[ScanManifest] = None,
+                   checkpoint: Optional[ScanCheckpoint] = None) -> List[Path]:
+    """
+    Write records to shard files instead of the database, see shard_export
+    :param records: output of scan
+    :param out_dir: directory of the shards
+    :param shard_format: one of shard_export.SHARD_FORMATS
+    :param shard_rows: records per shard
+    :param manifest: if given, the files of each complete shard are recorded in it, without database ids
+    :param checkpoint: if given, the files of each complete shard, and failed files, are journaled in it
+    :return: the shards written
+    """
+    def _record_shard(path: Path, shard_records: List[dict]):
+        if manifest:
+            for record in shard_records:
+                manifest.record(record['path'], record['stat'], record['file'].digest, None, None,
+                                record['info_type'])
+            manifest.commit()
+        if checkpoint:
+            checkpoint.committed(shard_records)
+            checkpoint.commit()
+
+    with ShardWriter(out_dir, shard_format, shard_rows,
+                     on_close=_record_shard if manifest or checkpoint else None) as writer:
+        for record in records:
+            if record is None:
+                continue
+            if record.get('error') is not None:
+                if checkpoint:
+                    checkpoint.failed(record)
+                continue
+            writer.add(record)
+    if checkpoint:
+        checkpoint.commit()
+    return writer.shards
+
+
+def _extract_hashed(hashed: Tuple[WalkEntry, Optional[bytes]], single_pass: bool = False) -> Optional[dict]:
+    return extract_one(hashed[0], single_pass, hashed[1])
+
+
+def _hash_prefetched(prefetched: Tuple[WalkEntry, Optional[bytes]]) \
+        -> Tuple[int, Tuple[WalkEntry, Optional[bytes], Optional[time_proc.Snapshot]]]:
+    """
+    :return: the number of prefetched bytes to release, and hash_one's result
+    """
+    entry, data = prefetched
+    return len(data) if data is not None else 0, hash_one(entry, data)
+
+
+def _extract_prefetched(prefetched: Tuple[WalkEntry, Optional[bytes], Optional[bytes]]) -> Tuple[int, Optional[dict]]:
+    """
+    :return: the number of prefetched bytes to release, and the record
+    """
+    entry, data, digest = prefetched
+    return len(data) if data is not None else 0, extract_one(entry, digest=digest, data=data)
+
+
+def extract_one(entry: WalkEntry, single_pass: bool = False, digest: Optional[bytes] = None,
+                data: Optional[bytes] = None) -> Optional[dict]:
+    """
+    Worker side of the scan: read the image info and hash the file.
+    Returns a picklable record of plain values (see records), so that nothing bound
+    to SQLAlchemy is built per file, or crosses the process boundary.
+    :param entry: the file, with the stat result taken by the walker
+    :param single_pass: read the file once and feed the same bytes to the digest and the parser
+    :param digest: the file's digest, if it was already computed. Default: the entry's
+    :param data: the file's content, if it was already read (see util.prefetch). The file is not opened.
+    :return: {'path', 'rel_path', 'stat', 'root_folder', 'info_type': 'image'|'pdf',
+             'info': ImageInfoRecord|PdfInfoRecord, 'file': FileRecord, 'storage_object', 'image_group'}, or a failed_record if the file could not be read.
+             The record of a pdf whose pages were split has their ranges in 'page_chunks', and no medians yet, see read_info.
+             When timing is enabled, the record also carries the timings drained from this process, in 'timings'
+    """
+    p = Path(entry.path)
+    print(f"Reading {str(p)}")
     try:
-        _image: ii.BaseImage = ii.image_info_factory(p)
-        if isinstance(_image, ii.PilImage) or isinstance(_image, ii.RawImage):
-            _orm_image = ii.base_image_to_image_file_infos(_image)
-        if isinstance(_image, ii.PdfImage):
-            _orm_image = ii.base_image_to_pdf_file_infos(_image)
+        if data is None and single_pass and entry.stat.st_size <= SINGLE_PASS_MAX_SIZE:
+            data = fi.f_read(p)
+        info, page_chunks = read_info(p, entry.stat, data)
+        record = {
+            'path': entry.path,
+            'rel_path': entry.rel_path,
+            'stat': entry.stat,
+            'root_folder': entry.root_folder,
+            'info_type': 'pdf' if isinstance(info, PdfInfoRecord) else 'image',
+            'info': info,
+            'file': fi.f_to_file_record(p, entry.stat, data, digest or entry.digest),
+            'storage_object': entry.storage_object,
+            'image_group': entry.image_group
+        }
+        if page_chunks:
+            record['page_chunks'] = page_chunks
     except Exception as e:
-        print(f"Could not image process {str(p)}. Error {e}")
-    return _orm_image
+        print(f"Skipping file {str(p)}. Error {e}")
+        record = failed_record(entry, str(e))
+    time_proc.file_done()
+    if time_proc.enabled():
+        record['timings'] = time_proc.drain()
+    return record
+
+
+def failed_record(entry: WalkEntry, error: str) -> dict:
+    """
+    Record of a file which could not be read: nothing is written for it
+    """
+    return {
+        'path': entry.path,
+        'rel_path': entry.rel_path,
+        'stat': entry.stat,
+        'root_folder': entry.root_folder,
+        'info_type': None,
+        'info': None,
+        'file': None,
+        'storage_object': entry.storage_object,
+        'image_group': entry.image_group,
+        'error': error
+    }
+
+
+def read_info(p: Path, st: Optional[os.stat_result] = None, data: Optional[bytes] = None) \
+        -> Tuple[object, Optional[List[List[int]]]]:
+    """
+    Record of a file's image or pdf info row
+    :param p: Path to image
+    :param st: the file's stat result, if the caller already has it
+    :param data: the file's content, if the caller already read it
+    :return: the record, and the page ranges of a pdf split by PdfImage.page_chunks, whose medians
+    are then left to the caller to count and fill in (None otherwise)
+    :raise: what prevents reading the file
+    """
+    # extract() closes the file: nothing stays open in the worker once the snapshot is taken
+    _image = ii.image_info_factory(p, st, data)
+    page_chunks = None
+    if isinstance(_image, ii.PdfImage):
+        _image.split_page_counts = True
+        page_chunks = _image.page_chunks
+    with time_proc.stage('parse'):
+        _metadata = _image.extract()
+    if not isinstance(_metadata, (ii.ImageMetadata, ii.PdfMetadata)):
+        raise ValueError(f"No image or pdf metadata in {str(p)}")
+    return ii.info_record(_metadata), page_chunks
+
 
 if __name__ == '__main__':
     main()
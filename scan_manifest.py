@@ -0,0 +1,107 @@
+"""
+Local SQLite record of what the last scans read, so that rescans skip unchanged files
+"""
+import os
+import sqlite3
+import threading
+from typing import NamedTuple, Optional
+
+__all__ = ['ManifestEntry', 'ScanManifest']
+
+
+class ManifestEntry(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    inode: int
+    digest: Optional[bytes]
+    file_id: Optional[int]
+    info_id: Optional[int]
+    info_type: Optional[str]
+
+
+class ScanManifest:
+    """
+    Manifest of scanned files, keyed on path. A file is unchanged when its size,
+    mtime_ns and inode are the ones recorded by the last scan: it does not need
+    to be opened, let alone hashed or parsed.
+
+    Writes are only made durable by commit(), which callers should do right after
+    committing the same files to the database.
+
+    is_unchanged() may run in a pool's feeder thread, see run/read_write.skip_unchanged:
+    the connection is shared between threads, one call at a time.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        :param db_path: SQLite file, created if needed
+        """
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS manifest (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            digest BLOB,
+            file_id INTEGER,
+            info_id INTEGER,
+            info_type TEXT)""")
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
+        self.close()
+
+    def get(self, path: str) -> Optional[ManifestEntry]:
+        with self._lock:
+            row = self._conn.execute("SELECT path, size, mtime_ns, inode, digest, file_id, info_id, info_type "
+                                     "FROM manifest WHERE path = ?", (path,)).fetchone()
+        return ManifestEntry(*row) if row else None
+
+    def is_unchanged(self, path: str, st: os.stat_result) -> bool:
+        """
+        True if the file was scanned before and has not changed since
+        :param path: the file's path, as it was recorded
+        :param st: the file's current stat result
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, inode FROM manifest WHERE path = ?",
+                                     (path,)).fetchone()
+        return row is not None and row == (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def record(self, path: str, st: os.stat_result, digest: Optional[bytes] = None, file_id: Optional[int] = None,
+               info_id: Optional[int] = None, info_type: Optional[str] = None):
+        """
+        Record a scanned file. Not durable until commit()
+        :param path: the file's path
+        :param st: the stat result the scan read the file with
+        :param digest: storage.files.digest
+        :param file_id: storage.files.id, when known
+        :param info_id: content.image_file_infos.id or content.pdf_file_infos.id, when known
+        :param info_type: 'image' or 'pdf', which table info_id is in
+        """
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO manifest "
+                               "(path, size, mtime_ns, inode, digest, file_id, info_id, info_type) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (path, st.st_size, st.st_mtime_ns, st.st_ino, digest, file_id, info_id, info_type))
+
+    def forget(self, path: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM manifest WHERE path = ?", (path,))
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
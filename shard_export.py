@@ -0,0 +1,229 @@
+"""
+Rotating shard files of scan records, for extraction on hosts without database access.
+See shard_loader for loading them
+"""
+import csv
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from batch_writer import FILE_COLUMNS, IMAGE_INFO_COLUMNS, PDF_INFO_COLUMNS
+from util.file_walker import image_group_of
+
+__all__ = ['SHARD_FORMATS', 'PATH_COLUMNS', 'INFO_COLUMNS', 'SHARD_COLUMNS', 'BINARY_COLUMNS', 'record_to_row',
+           'PART_SUFFIX', 'ShardWriter', 'read_shard', 'shard_format_of', 'shard_to_csv']
+
+SHARD_FORMATS = ('jsonl', 'csv', 'parquet')
+
+PATH_COLUMNS = ('path', 'rel_path', 'root_folder', 'image_group', 'info_type')
+# Columns of both info tables, less the key the loader fills in
+INFO_COLUMNS = tuple(dict.fromkeys(c for c in IMAGE_INFO_COLUMNS + PDF_INFO_COLUMNS if c != 'storage_file_id'))
+# One flat row per file: info_type says which info columns apply
+SHARD_COLUMNS = PATH_COLUMNS + FILE_COLUMNS + INFO_COLUMNS
+# Written as hex
+BINARY_COLUMNS = frozenset(['digest', 'persistent_id'])
+
+# Suffix of a shard being written: loaders ignore these
+PART_SUFFIX = '.part'
+
+
+def _text(value):
+    """
+    Shard representation of a column value: bytes in hex, datetimes as MySQL takes them
+    """
+    if isinstance(value, bytes):
+        return value.hex()
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def record_to_row(record: dict) -> Dict[str, object]:
+    """
+    Shard row of a scan record (see run/read_write.extract_one)
+    :return: {column: value} for every SHARD_COLUMNS
+    """
+    rel_path = record.get('rel_path') or record['path']
+    row = {
+        'path': record['path'],
+        'rel_path': rel_path,
+        'root_folder': record.get('root_folder') or 'other',
+        'image_group': record.get('image_group') or image_group_of(rel_path),
+        'info_type': record['info_type'],
+    }
+    file = record['file']
+    info = record['info']
+    for column in FILE_COLUMNS:
+        row[column] = _text(getattr(file, column))
+    for column in INFO_COLUMNS:
+        # the columns of the other info table are NULL
+        row[column] = _text(getattr(info, column, None))
+    return row
+
+
+class _JsonlShard:
+    def __init__(self, path: Path):
+        self._fh = open(path, 'w', encoding='utf-8')
+
+    def write(self, row: Dict[str, object]):
+        self._fh.write(json.dumps(row, ensure_ascii=False))
+        self._fh.write('\n')
+
+    def close(self):
+        self._fh.close()
+
+
+class _CsvShard:
+    """
+    Header line, then one line per row. NULL is the empty field
+    """
+
+    def __init__(self, path: Path):
+        self._fh = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._fh, lineterminator='\n')
+        self._writer.writerow(SHARD_COLUMNS)
+
+    def write(self, row: Dict[str, object]):
+        self._writer.writerow(['' if row[c] is None else row[c] for c in SHARD_COLUMNS])
+
+    def close(self):
+        self._fh.close()
+
+
+class _ParquetShard:
+    """
+    Parquet needs pyarrow, which is only imported when this format is asked for.
+    A shard's rows are buffered and written as one row group when it is closed
+    """
+
+    def __init__(self, path: Path):
+        import pyarrow.parquet
+        self._parquet = pyarrow.parquet
+        self._table = pyarrow.Table.from_pylist
+        self._path = path
+        self._rows: List[Dict[str, object]] = []
+
+    def write(self, row: Dict[str, object]):
+        self._rows.append(row)
+
+    def close(self):
+        self._parquet.write_table(self._table(self._rows), self._path)
+        self._rows = []
+
+
+_SHARD_TYPES = {'jsonl': _JsonlShard, 'csv': _CsvShard, 'parquet': _ParquetShard}
+
+
+class ShardWriter:
+    """
+    Writes scan records to numbered shard files of at most shard_rows rows:
+    {prefix}-00000.{format}, {prefix}-00001.{format}...
+
+    A shard is written under a .part name and renamed when it is full, so a loader
+    watching the directory only ever sees complete shards.
+    """
+
+    def __init__(self, out_dir: Path, shard_format: str = 'jsonl', shard_rows: int = 100000,
+                 prefix: Optional[str] = None, on_close: Optional[Callable[[Path, List[dict]], None]] = None):
+        """
+        :param out_dir: created if needed
+        :param shard_format: one of SHARD_FORMATS
+        :param shard_rows: rows per shard
+        :param prefix: shard name prefix. Default: the start time and process id, so that runs do not collide
+        :param on_close: called with the path and the records of each shard, once it is complete
+        """
+        if shard_format not in _SHARD_TYPES:
+            raise ValueError(f"Unknown shard format {shard_format}, not one of {SHARD_FORMATS}")
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_format = shard_format
+        self.shard_rows = shard_rows
+        self.prefix = prefix or f"shard-{datetime.now():%Y%m%d%H%M%S}-{os.getpid()}"
+        self._on_close = on_close
+        self.shards: List[Path] = []
+        self._shard = None
+        self._rows = 0
+        self._records: List[dict] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+
+    def _path(self) -> Path:
+        return self.out_dir / f"{self.prefix}-{len(self.shards):05}.{self.shard_format}"
+
+    def add(self, record: dict):
+        if self._shard is None:
+            self._shard = _SHARD_TYPES[self.shard_format](Path(str(self._path()) + PART_SUFFIX))
+        self._shard.write(record_to_row(record))
+        self._rows += 1
+        if self._on_close:
+            self._records.append(record)
+        if self._rows >= self.shard_rows:
+            self.rotate()
+
+    def rotate(self):
+        """
+        Complete the current shard, if it has rows
+        """
+        if self._shard is None:
+            return
+        self._shard.close()
+        path = self._path()
+        os.replace(str(path) + PART_SUFFIX, path)
+        self.shards.append(path)
+        self._shard, self._rows = None, 0
+        records, self._records = self._records, []
+        if self._on_close:
+            self._on_close(path, records)
+
+    def close(self):
+        self.rotate()
+
+
+def shard_format_of(path: Path) -> str:
+    shard_format = Path(path).suffix.lstrip('.')
+    if shard_format not in SHARD_FORMATS:
+        raise ValueError(f"{path} is not a shard: suffix not one of {SHARD_FORMATS}")
+    return shard_format
+
+
+def read_shard(path: Path) -> Iterator[Dict[str, object]]:
+    """
+    Rows of a shard, with None for NULL
+    """
+    path = Path(path)
+    shard_format = shard_format_of(path)
+    if shard_format == 'jsonl':
+        with open(path, encoding='utf-8') as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+    elif shard_format == 'csv':
+        with open(path, encoding='utf-8', newline='') as fh:
+            for row in csv.DictReader(fh):
+                yield {column: value if value != '' else None for column, value in row.items()}
+    else:
+        import pyarrow.parquet
+        yield from pyarrow.parquet.read_table(path).to_pylist()
+
+
+def shard_to_csv(path: Path, out: Path) -> int:
+    """
+    Rewrite a shard of any format as a CSV shard, which is what LOAD DATA reads
+    :return: the number of rows
+    """
+    csv_shard = _CsvShard(out)
+    rows = 0
+    try:
+        for row in read_shard(path):
+            csv_shard.write({column: row.get(column) for column in SHARD_COLUMNS})
+            rows += 1
+    finally:
+        csv_shard.close()
+    return rows
@@ -0,0 +1,128 @@
+"""
+Bulk load of shard files (see shard_export) into storage.files, storage.paths and the content info tables:
+LOAD DATA LOCAL INFILE into a staging table, then one set-based merge statement per table
+"""
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from batch_writer import FILE_COLUMNS, IMAGE_INFO_COLUMNS, PDF_INFO_COLUMNS
+from ORMModel import ImageFile, ImageFileInfo, ImagePath, PdfFileInfo
+from shard_export import BINARY_COLUMNS, SHARD_COLUMNS, shard_format_of, shard_to_csv
+
+__all__ = ['STAGING_TABLE', 'LOADED_SUFFIX', 'staging_ddl', 'load_data_sql', 'merge_sql', 'ShardLoader']
+
+STAGING_TABLE = 'shard_staging'
+
+# Appended to the name of a loaded shard by the loader script, so that reruns skip it
+LOADED_SUFFIX = '.loaded'
+
+_STAGING_TYPES: Dict[str, str] = {
+    'path': 'VARCHAR(4096)', 'rel_path': 'VARCHAR(1024)', 'root_folder': 'VARCHAR(16)', 'image_group': 'VARCHAR(32)',
+    'info_type': 'VARCHAR(8)',
+    'digest': 'BINARY(32)', 'size': 'BIGINT', 'pronom_number': 'SMALLINT', 'persistent_id': 'BINARY(32)',
+    'created_at': 'TIMESTAMP NULL', 'validity': 'VARCHAR(32)', 'earliest_mdate': 'TIMESTAMP NULL',
+    'image_type': 'VARCHAR(32)', 'image_mode': 'VARCHAR(8)', 'tiff_compression': 'VARCHAR(32)', 'width': 'INT',
+    'height': 'INT', 'quality': 'SMALLINT', 'bps_x': 'SMALLINT', 'bps_y': 'SMALLINT', 'recorded_date': 'TIMESTAMP NULL',
+    'number_of_pages': 'INT', 'median_nb_chr_per_page': 'INT', 'median_nb_images_per_page': 'INT',
+    'median_sample_size': 'INT',
+}
+
+
+def staging_ddl() -> str:
+    columns = ',\n  '.join(f"{column} {_STAGING_TYPES[column]}" for column in SHARD_COLUMNS)
+    return (f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} (\n  {columns},\n  file_id INT,\n"
+            f"  KEY (digest, size)\n)")
+
+
+def load_data_sql() -> str:
+    """
+    LOAD DATA of a CSV shard into the staging table, with :path the shard's path.
+    Fields go through user variables: empty is NULL, binary columns are unhexed
+    """
+    variables = ', '.join(f"@{column}" for column in SHARD_COLUMNS)
+    assignments = ',\n  '.join(
+        f"{column} = UNHEX(NULLIF(@{column}, ''))" if column in BINARY_COLUMNS else f"{column} = NULLIF(@{column}, '')"
+        for column in SHARD_COLUMNS)
+    return (f"LOAD DATA LOCAL INFILE :path INTO TABLE {STAGING_TABLE} CHARACTER SET utf8mb4\n"
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY ''\n"
+            "LINES TERMINATED BY '\\n' IGNORE 1 LINES\n"
+            f"({variables})\nSET {assignments}")
+
+
+def _info_merge(table, columns, info_type: str) -> str:
+    values = [c for c in columns if c != 'storage_file_id']
+    return (f"INSERT INTO {table.fullname} (storage_file_id, {', '.join(values)})\n"
+            f"SELECT file_id, {', '.join(values)} FROM {STAGING_TABLE}\n"
+            f"WHERE info_type = '{info_type}' AND file_id IS NOT NULL\n"
+            f"ON DUPLICATE KEY UPDATE {', '.join(f'{c} = VALUES({c})' for c in values)}")
+
+
+def merge_sql() -> List[str]:
+    """
+    The statements merging the staging table, in order. They are idempotent, like BatchWriter's:
+    existing files are left alone, infos are updated, paths already there are not added again
+    """
+    files = ImageFile.__table__.fullname
+    paths = ImagePath.__table__.fullname
+    file_values = [c for c in FILE_COLUMNS if c not in ('digest', 'size')]
+    return [
+        # a file may be in a shard more than once, under several paths
+        f"INSERT INTO {files} ({', '.join(FILE_COLUMNS)})\n"
+        f"SELECT digest, size, {', '.join(f'MIN({c})' for c in file_values)} FROM {STAGING_TABLE}\n"
+        f"GROUP BY digest, size\n"
+        f"ON DUPLICATE KEY UPDATE id = id",
+        f"UPDATE {STAGING_TABLE} s JOIN {files} f ON f.digest = s.digest AND f.size = s.size SET s.file_id = f.id",
+        _info_merge(ImageFileInfo.__table__, IMAGE_INFO_COLUMNS, 'image'),
+        _info_merge(PdfFileInfo.__table__, PDF_INFO_COLUMNS, 'pdf'),
+        # storage.paths has no unique key
+        f"INSERT INTO {paths} (file, storage_object, path, image_group, root_folder)\n"
+        f"SELECT DISTINCT s.file_id, NULL, s.rel_path, s.image_group, s.root_folder FROM {STAGING_TABLE} s\n"
+        f"WHERE s.file_id IS NOT NULL\n"
+        f"AND NOT EXISTS (SELECT 1 FROM {paths} p WHERE p.file = s.file_id AND p.path = s.rel_path)",
+    ]
+
+
+class ShardLoader:
+    """
+    Loads shards one transaction each. The connection must allow LOAD DATA LOCAL
+    (local_infile=True for pymysql and mysqlclient), and the server local_infile=ON
+    """
+
+    def __init__(self, session):
+        """
+        :param session: SQLAlchemy session or connection
+        """
+        self._session = session
+        self._staging_ready = False
+
+    def load(self, shard: Path) -> int:
+        """
+        Load and merge one shard, and commit
+        :return: the number of rows loaded
+        """
+        if not self._staging_ready:
+            self._session.execute(text(staging_ddl()))
+            self._staging_ready = True
+        self._session.execute(text(f"TRUNCATE TABLE {STAGING_TABLE}"))
+        if shard_format_of(shard) == 'csv':
+            rows = self._load_csv(Path(shard))
+        else:
+            fd, scratch = tempfile.mkstemp(suffix='.csv')
+            os.close(fd)
+            try:
+                shard_to_csv(shard, Path(scratch))
+                rows = self._load_csv(Path(scratch))
+            finally:
+                os.unlink(scratch)
+        for statement in merge_sql():
+            self._session.execute(text(statement))
+        self._session.commit()
+        return rows
+
+    def _load_csv(self, path: Path) -> int:
+        result = self._session.execute(text(load_data_sql()), {'path': str(path.resolve())})
+        return result.rowcount
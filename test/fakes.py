@@ -0,0 +1,113 @@
+"""
+Fakes shared by the tests of the database writers: a SQLAlchemy session which records what it is given,
+and scan records (see run/read_write.extract_one)
+"""
+import os
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.dialects import mysql
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import TextClause
+
+from records import FileRecord, ImageInfoRecord, PdfInfoRecord
+
+
+class FakeResult:
+    def __init__(self, rows, rowcount=0, lastrowid=None):
+        self._rows = rows
+        self.rowcount = rowcount
+        self.lastrowid = lastrowid
+
+    def all(self):
+        return self._rows
+
+    def scalar(self):
+        return self._rows[0][0] if self._rows else None
+
+    def one(self):
+        assert len(self._rows) == 1
+        return self._rows[0]
+
+
+class FakeSession:
+    """
+    Records the statements, their parameters and the commits. Keeps the files and objects inserted,
+    gives them ids in insertion order, and answers the selects of files and objects from them.
+    Text statements, except the query of the server's AUTO_INCREMENT settings, affect text_rowcount rows
+    """
+
+    def __init__(self, autoinc_lock_mode: int = 1, auto_increment_increment: int = 1,
+                 files: Optional[Dict[Tuple[bytes, int], int]] = None, text_rowcount: int = 7):
+        """
+        :param files: storage.files ids by (digest, size), there before the test
+        """
+        self.statements = []
+        self.params = []
+        self.commits = 0
+        self.autoinc_lock_mode = autoinc_lock_mode
+        self.auto_increment_increment = auto_increment_increment
+        self.text_rowcount = text_rowcount
+        self.files = dict(files or {})
+        self.objects = {}
+        self.next_id = max(self.files.values(), default=0) + 1
+
+    def _insert(self, rows: dict, values: List[dict], key: Callable[[dict], tuple]) -> FakeResult:
+        inserted, first_id = 0, None
+        for row in values:
+            if key(row) not in rows:
+                rows[key(row)] = self.next_id
+                first_id = first_id or self.next_id
+                self.next_id += 1
+                inserted += 1
+        return FakeResult([], inserted, first_id)
+
+    def execute(self, stmt, params=None):
+        if isinstance(stmt, TextClause):
+            if stmt.text.startswith('SELECT @@'):
+                return FakeResult([(self.autoinc_lock_mode, self.auto_increment_increment)])
+            self.statements.append(stmt.text)
+            self.params.append(params)
+            return FakeResult([], self.text_rowcount)
+        compiled = stmt.compile(dialect=mysql.dialect())
+        sql = str(compiled)
+        self.statements.append(sql)
+        self.params.append(compiled.params)
+        if sql.startswith('INSERT'):
+            # multi-row values are compiled as {column}_m{row}
+            values = {}
+            for name, value in compiled.params.items():
+                column, _, row = name.rpartition('_m')
+                values.setdefault(int(row), {})[column] = value
+            values = [values[row] for row in sorted(values)]
+            if 'storage.files' in sql:
+                return self._insert(self.files, values, lambda row: (row['digest'], row['size']))
+            if 'storage.objects' in sql:
+                return self._insert(self.objects, values, lambda row: (row['root'], row['bdrc_id']))
+            return FakeResult([])
+        if not isinstance(stmt, Select):
+            return FakeResult([])
+        # IN lists are single expanding parameters
+        values = [v for v in compiled.params.values() if isinstance(v, list)][0]
+        if 'storage.paths' in sql:
+            return FakeResult([])
+        if 'storage.objects' in sql:
+            root_id = next(v for v in compiled.params.values() if not isinstance(v, list))
+            return FakeResult([(object_id, bdrc_id, None) for (root, bdrc_id), object_id in self.objects.items()
+                               if root == root_id and bdrc_id in values])
+        if 'storage_file_id' in sql:
+            return FakeResult([(file_id, 100 + file_id) for file_id in values])
+        return FakeResult([(file_id, digest, size) for (digest, size), file_id in self.files.items()
+                           if digest in values])
+
+    def commit(self):
+        self.commits += 1
+
+
+def make_record(n: int, info_type: str = 'image') -> dict:
+    digest = bytes([n]) * 32
+    info = ImageInfoRecord(image_type='TIFF', width=n, recorded_date=datetime(2024, 1, n)) if info_type == 'image' \
+        else PdfInfoRecord(number_of_pages=n)
+    return {'path': f'/archive/W1/images/W1-I1/{n}.tif', 'rel_path': f'W1/images/W1-I1/{n}.tif',
+            'root_folder': 'images', 'stat': os.stat_result((0,) * 10), 'info_type': info_type, 'info': info,
+            'file': FileRecord(digest=digest, size=n, persistent_id=digest, validity='not_set')}
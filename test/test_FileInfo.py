@@ -0,0 +1,55 @@
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+
+import FileInfo as fi
+import image_info as ii
+
+test_source_dir: Path = Path(os.path.dirname(os.path.abspath(__file__)), 'sources/')
+
+
+@pytest.mark.parametrize("source", [
+    test_source_dir / 'I2PD181500001.tif',
+    test_source_dir / 'I2PD181500004.jpg',
+    test_source_dir / 'MultiPageImage1.pdf'
+])
+def test_single_pass_matches_two_pass(source):
+    data = fi.f_read(source)
+    assert len(data) == source.stat().st_size
+    assert fi.f_to_files(source, data=data) == fi.f_to_files(source)
+    assert fi.f_digests_bytes(data) == fi.f_digests(source)
+    from_memory = ii.image_info_factory(source, data=data)
+    from_disk = ii.image_info_factory(source)
+    assert type(from_memory) is type(from_disk)
+    if isinstance(from_disk, ii.PdfImage):
+        assert ii.base_image_to_pdf_file_infos(from_memory) == ii.base_image_to_pdf_file_infos(from_disk)
+    else:
+        assert ii.base_image_to_image_file_infos(from_memory) == ii.base_image_to_image_file_infos(from_disk)
+
+
+@pytest.mark.parametrize("buffer_size", [4096, 1000, 1024 * 1024])
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_digests(buffer_size, use_mmap):
+    source = test_source_dir / 'MultiPageImage1.pdf'
+    data = source.read_bytes()
+    digests = fi.f_digests(source, ('sha256', 'md5', 'sha512'), buffer_size=buffer_size, use_mmap=use_mmap)
+    assert digests == {'sha256': hashlib.sha256(data).digest(),
+                       'md5': hashlib.md5(data).digest(),
+                       'sha512': hashlib.sha512(data).digest()}
+    assert digests == fi.f_digests_bytes(data, ('sha256', 'md5', 'sha512'))
+    assert digests['md5'] == fi.f_md5(source)
+
+
+def test_digests_empty_file(tmp_path):
+    empty = tmp_path / 'empty'
+    empty.write_bytes(b'')
+    assert fi.f_digests(empty, use_mmap=True) == {'sha256': hashlib.sha256(b'').digest()}
+
+
+def test_files_digest_is_sha256():
+    source = test_source_dir / 'I2PD181500001.tif'
+    orm_file = fi.f_to_files(source)
+    assert orm_file.digest == orm_file.persistent_id == fi.f_sha256(source)
+    assert len(orm_file.digest) == 32
@@ -1,8 +1,10 @@
 import os
+import pickle
 from datetime import datetime
 from pathlib import Path
 
 import pytest
+from PIL import Image
 
 from  image_info import *
 
@@ -11,23 +13,23 @@ test_source_dir: Path = Path(os.path.dirname(os.path.abspath(__file__)), 'source
 
 @pytest.mark.parametrize("source, expected", [
     (test_source_dir / 'I1FEMC010315_0011.tif', {
-        "image_type": 'TIFF',
+        "image_type": 'single_image_tiff',
         "image_mode": 'I;16',
         "width": 6200,
         "height": 653,
         "compression": 'tiff_lzw',
-        "quality": 'tiff_lzw',
+        "quality": None,
         "resolution": (600.0, 600.0),
         "recorded_date": None,
         "modified_date": datetime(2024, 9, 30, 0, 0)
     }),
     (test_source_dir / 'I2PD181500001.tif', {
-        "image_type": 'TIFF',
+        "image_type": 'single_image_tiff',
         "image_mode": '1',
         "width": 2550,
         "height": 3300,
         "compression": 'group4',
-        "quality": 'group4',
+        "quality": None,
         "resolution": (300.0, 300.0),
         "recorded_date": None,
         "modified_date": datetime(2017, 11, 28, 0, 0)
@@ -38,7 +40,7 @@ test_source_dir: Path = Path(os.path.dirname(os.path.abspath(__file__)), 'source
         "width": 2187,
         "height": 3033,
         "compression": 'unknown',
-        "quality": 'unknown',
+        "quality": 99,
         "resolution": (300, 300),
         "recorded_date": None,
         "modified_date": datetime(2017, 11, 28, 0, 0)
@@ -49,7 +51,7 @@ test_source_dir: Path = Path(os.path.dirname(os.path.abspath(__file__)), 'source
         "width": 7968,
         "height": 5320,
         "compression": 'raw',
-        "quality": 'raw',
+        "quality": None,
         "resolution": (7968, 5320),
         "recorded_date": None,
         "modified_date": datetime(2024, 9, 30, 0, 0)
@@ -81,4 +83,36 @@ def test_image_metadata(source, expected):
     # pp(f"{metadata.recorded_date=}")
     # pp(f"{metadata.modified_date=}")
 
-#
\ No newline at end of file
+#
+
+def test_image_extract_snapshot():
+    image: BaseImage = image_info_factory(test_source_dir / 'I2PD181500004.jpg')
+    snapshot = image.extract()
+    assert isinstance(snapshot, ImageMetadata)
+    assert image.image_reader_object is None
+    assert (snapshot.width, snapshot.height, snapshot.resolution) == (2187, 3033, (300, 300))
+    assert image.width == 2187
+    assert pickle.loads(pickle.dumps(snapshot)) == snapshot
+    with pytest.raises(AttributeError):
+        snapshot.width = 1
+
+
+@pytest.mark.parametrize("quality", [5, 30, 50, 75, 92, 100])
+def test_jpeg_quality_estimate(quality, tmp_path):
+    jpeg = tmp_path / 'q.jpg'
+    Image.new('RGB', (32, 32), (120, 30, 200)).save(jpeg, 'JPEG', quality=quality)
+    assert image_info_factory(jpeg).quality == quality
+
+
+def test_no_quality_without_a_quality_setting(tmp_path):
+    png = tmp_path / 'image.png'
+    Image.new('L', (32, 32)).save(png)
+    assert image_info_factory(png).quality is None
+
+
+@pytest.mark.parametrize("image_format", ['GIF', 'BMP', 'WEBP'])
+def test_other_pil_formats(image_format, tmp_path):
+    path = tmp_path / f'image.{image_format.lower()}'
+    Image.new('RGB', (16, 8)).save(path, image_format)
+    image = image_info_factory(path)
+    assert (image.image_type, image.width, image.height) == (image_format, 16, 8)
@@ -7,6 +7,8 @@ import os
 from datetime import datetime
 
 from image_info import *
+import pdf_stats
+from pdf_stats import FAST_CHAR_COUNT_TOLERANCE
 test_source_dir: Path = Path(os.path.dirname(os.path.abspath(__file__)), 'sources/')
 
 
@@ -43,3 +45,112 @@ def test_pdf_metadata(source, expected):
     assert metadata.modification_date == expected['modification_date']
     assert metadata.median_nb_chr_per_page == expected['median_nb_chr_per_page']
     assert metadata.median_nb_images_per_page == expected['median_nb_images_per_page']
+
+
+@pytest.mark.parametrize("sample_pages, sample_seed, expected_indices", [
+    (None, None, list(range(13))),
+    (20, None, list(range(13))),
+    (4, None, [0, 4, 8, 12]),
+    (1, None, [6]),
+    (5, 1234, None)
+])
+def test_pdf_page_sampling(sample_pages, sample_seed, expected_indices):
+    metadata: PdfImage = image_info_factory(test_source_dir / 'MultiPageImage1.pdf')
+    metadata.sample_pages = sample_pages
+    metadata.sample_seed = sample_seed
+    indices = metadata.sampled_page_indices
+    if expected_indices is not None:
+        assert indices == expected_indices
+    else:
+        assert len(indices) == sample_pages
+        assert indices == metadata.sampled_page_indices
+    assert metadata.medians_sample_size == (None if len(indices) == 13 else len(indices))
+    assert metadata.median_nb_images_per_page == 1
+    assert metadata.median_nb_chr_per_page == 0
+
+
+def test_configure_pdf_analysis():
+    try:
+        configure_pdf_analysis(sample_pages=2)
+        metadata: PdfImage = image_info_factory(test_source_dir / 'MultiPageCharMultiImage.pdf')
+        assert metadata.sampled_page_indices == [0, 15]
+        assert base_image_to_pdf_file_infos(metadata).median_sample_size == 2
+    finally:
+        configure_pdf_analysis()
+
+
+@pytest.mark.parametrize("source", [
+    test_source_dir / 'MultiPageCharTibetanMultiImage.pdf',
+    test_source_dir / 'MultiPageImage1.pdf',
+    test_source_dir / 'MultiPageCharMultiImage.pdf',
+    test_source_dir / 'Typical_BdrcPdf.pdf'
+])
+def test_pdf_image_count_modes(source):
+    fast: PdfImage = image_info_factory(source)
+    exact: PdfImage = image_info_factory(source)
+    exact.image_count_mode = 'pypdf'
+    assert [stats.count for stats in fast.page_image_stats] == [len(page.images) for page in exact._reader.pages]
+    assert fast.median_nb_images_per_page == exact.median_nb_images_per_page
+    assert all(stats.nbytes > 0 for stats in fast.page_image_stats if stats.count)
+    # pypdf counts leave the xobject stats out, page_image_stats still has them
+    assert exact.page_counts.image_stats == []
+    assert exact.page_image_stats == fast.page_image_stats
+
+
+@pytest.mark.parametrize("source", [
+    test_source_dir / 'MultiPageCharTibetanMultiImage.pdf',
+    test_source_dir / 'MultiPageImage1.pdf',
+    test_source_dir / 'MultiPageCharMultiImage.pdf',
+    test_source_dir / 'Typical_BdrcPdf.pdf'
+])
+def test_pdf_fast_char_count(source):
+    exact: PdfImage = image_info_factory(source)
+    fast: PdfImage = image_info_factory(source)
+    fast.char_count_mode = 'fast'
+    assert abs(fast.median_nb_chr_per_page - exact.median_nb_chr_per_page) <= \
+           FAST_CHAR_COUNT_TOLERANCE * exact.median_nb_chr_per_page
+
+
+@pytest.mark.parametrize("source", [
+    test_source_dir / 'MultiPageCharTibetanMultiImage.pdf',
+    test_source_dir / 'MultiPageCharMultiImage.pdf'
+])
+def test_pdf_parallel_page_counts(source, monkeypatch):
+    monkeypatch.setattr(pdf_stats, 'MIN_PARALLEL_CHUNK_PAGES', 1)
+    serial: PdfImage = image_info_factory(source)
+    assert serial.page_chunks is None
+    split: PdfImage = image_info_factory(source)
+    split.parallel_page_threshold = 1
+    split.parallel_workers = 3
+    chunks = split.page_chunks
+    assert len(chunks) == 3
+    # the ranges, counted from the file's path and merged, give the serial counts
+    char_counts, image_counts = [], []
+    for chunk in chunks:
+        counts = pdf_stats.count_pages_in_file(str(source), chunk, split.image_count_mode, split.char_count_mode)
+        char_counts.extend(counts.char_counts)
+        image_counts.extend(counts.image_counts)
+    assert (char_counts, image_counts) == (serial.page_counts.char_counts, serial.page_counts.image_counts)
+    # without split_page_counts, the pdf counts its own pages
+    assert split.median_nb_chr_per_page == serial.median_nb_chr_per_page
+    split.split_page_counts = True
+    snapshot = split.extract()
+    assert (snapshot.median_nb_chr_per_page, snapshot.median_nb_images_per_page) == (None, None)
+    assert snapshot.num_pages == serial.num_pages
+
+
+def test_pdf_extract_snapshot(monkeypatch):
+    metadata: PdfImage = image_info_factory(test_source_dir / 'MultiPageImage1.pdf')
+    calls = []
+    calc = PdfImage.calc_median_nb_chars_per_page
+    monkeypatch.setattr(PdfImage, 'calc_median_nb_chars_per_page', lambda self: calls.append(1) or calc(self))
+    snapshot = metadata.extract()
+    # a median of 0 is computed once, not on every access
+    assert snapshot.median_nb_chr_per_page == 0
+    assert metadata.median_nb_chr_per_page == 0
+    assert len(calls) == 1
+    assert metadata.image_reader_object is None
+    assert snapshot.num_pages == 13
+    assert base_image_to_pdf_file_infos(snapshot).number_of_pages == 13
+    with pytest.raises(AttributeError):
+        snapshot.num_pages = 1
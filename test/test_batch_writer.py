@@ -0,0 +1,78 @@
+from batch_writer import *
+from test.fakes import FakeSession, make_record
+from util.file_walker import StorageObject
+
+
+def test_batch_writer_batches():
+    session = FakeSession()
+    committed = []
+    with BatchWriter(session, batch_size=3, commit_interval=6, on_commit=committed.extend) as writer:
+        for n in range(1, 8):
+            writer.add(make_record(n, 'pdf' if n == 2 else 'image'))
+    file_inserts = [s for s in session.statements if s.startswith('INSERT IGNORE INTO storage.files')]
+    info_inserts = [s for s in session.statements if s.startswith('INSERT INTO content.')]
+    # 3 batches: files and image infos each time, pdf infos only in the first
+    assert len(file_inserts) == 3
+    assert file_inserts[0].count('(%s, %s, %s, %s, %s, %s, %s)') == 3
+    assert len(info_inserts) == 4
+    assert all('ON DUPLICATE KEY UPDATE' in s for s in info_inserts)
+    assert len([s for s in session.statements if s.startswith('INSERT INTO storage.paths')]) == 3
+    assert session.commits == 2
+    assert len(committed) == 7
+    assert all(r['file_id'] is not None and r['info_id'] == 100 + r['file_id'] for r in committed)
+
+
+def test_batch_writer_dedups_files():
+    session = FakeSession()
+    with BatchWriter(session, batch_size=10) as writer:
+        writer.add(make_record(4))
+        writer.add(make_record(4))
+    file_insert = next(s for s in session.statements if s.startswith('INSERT IGNORE INTO storage.files'))
+    assert file_insert.count('(%s, %s, %s, %s, %s, %s, %s)') == 1
+
+
+def test_batch_writer_known_files_only_get_paths():
+    session = FakeSession()
+    known = make_record(5)
+    known['file_id'] = 42
+    known['rel_path'] = 'W1/images/W1-I1/I10001.tif'
+    with BatchWriter(session) as writer:
+        writer.add(known)
+    assert not any('storage.files' in s or 'content.' in s for s in session.statements)
+    assert any(s.startswith('INSERT INTO storage.paths') for s in session.statements)
+
+
+def test_batch_writer_objects():
+    session = FakeSession()
+    records = []
+    for n, bdrc_id in ((1, 'W1'), (2, 'W1'), (3, 'W2')):
+        record = make_record(n)
+        record['rel_path'] = f'{bdrc_id}/v1/content/images/{bdrc_id}-I1/{n}.tif'
+        record['storage_object'] = StorageObject(bdrc_id, bdrc_id)
+        records.append(record)
+    with BatchWriter(session, root_id=7) as writer:
+        for record in records:
+            writer.add(record)
+    object_inserts = [s for s in session.statements if s.startswith('INSERT IGNORE INTO storage.objects')]
+    # one row per object, not per file
+    assert len(object_inserts) == 1 and object_inserts[0].count('(%s, %s, %s, %s)') == 2
+    assert [r['object_id'] for r in records] == [session.objects[(7, 'W1')]] * 2 + [session.objects[(7, 'W2')]]
+    path_params = session.params[[i for i, s in enumerate(session.statements)
+                                  if s.startswith('INSERT INTO storage.paths')][0]]
+    paths = sorted(v for k, v in path_params.items() if k.startswith('path'))
+    assert paths == ['v1/content/images/W1-I1/1.tif', 'v1/content/images/W1-I1/2.tif',
+                     'v1/content/images/W2-I1/3.tif']
+
+
+def test_batch_writer_image_group_of_logical_path():
+    # an OCFL file whose content path is not its logical path: the image group comes from the logical path
+    session = FakeSession()
+    record = make_record(1)
+    record['rel_path'] = 'W1/v1/content/images/W1-I1/1.tif'
+    record['root_folder'] = 'images'
+    record['image_group'] = 'I2'
+    with BatchWriter(session) as writer:
+        writer.add(record)
+    path_params = session.params[[i for i, s in enumerate(session.statements)
+                                  if s.startswith('INSERT INTO storage.paths')][0]]
+    assert [v for k, v in path_params.items() if k.startswith('image_group')] == ['I2']
@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from checkpoint import *
+from util.file_walker import walk_files
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    root = tmp_path / 'root'
+    for rel in ['W1/images/W1-I1/1.tif', 'W1/images/W1-I1/2.tif', 'W1/sources/W1-I1/a.pdf',
+                'W2/images/W2-I1/1.tif', 'W2/images/W2-I1/2.tif', 'top.tif']:
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel).write_bytes(b'x')
+    (root / 'empty').mkdir()
+    return root
+
+
+def walk(root: Path, checkpoint: ScanCheckpoint):
+    return checkpoint.track(walk_files(str(root), prune=checkpoint.is_done,
+                                       on_directory_listed=checkpoint.on_directory_listed))
+
+
+def record(entry) -> dict:
+    return {'path': entry.path, 'rel_path': entry.rel_path}
+
+
+def test_directory_of():
+    assert directory_of('top.tif') == ''
+    assert directory_of('W1/images/1.tif') == 'W1/images/'
+
+
+def test_resume_skips_committed(tree, tmp_path):
+    journal = str(tmp_path / 'checkpoint.db')
+    with ScanCheckpoint(journal, str(tree)) as checkpoint:
+        entries = walk(tree, checkpoint)
+        w1 = [next(entries) for _ in range(3)]
+        # the walk goes depth first: whatever it started with, commit only some of it
+        committed, lost = w1[:2], w1[2:]
+        checkpoint.committed(record(e) for e in committed)
+        checkpoint.commit()
+        # the crash: files read but never committed
+        list(entries)
+    with ScanCheckpoint(journal, str(tree), resume=True) as checkpoint:
+        resumed = {e.rel_path for e in walk(tree, checkpoint)}
+    all_files = {e.rel_path for e in walk_files(str(tree))}
+    assert resumed == all_files - {e.rel_path for e in committed}
+    assert {e.rel_path for e in lost} <= resumed
+
+
+def test_done_directories_are_pruned(tree, tmp_path):
+    journal = str(tmp_path / 'checkpoint.db')
+    with ScanCheckpoint(journal, str(tree)) as checkpoint:
+        entries = list(walk(tree, checkpoint))
+        checkpoint.committed(record(e) for e in entries if e.rel_path.startswith('W1/'))
+    listed = []
+    with ScanCheckpoint(journal, str(tree), resume=True) as checkpoint:
+        resumed = {e.rel_path for e in checkpoint.track(walk_files(
+            str(tree), prune=checkpoint.is_done,
+            on_directory_listed=lambda rel_dir, subdirs: listed.append(rel_dir)))}
+    assert resumed == {'W2/images/W2-I1/1.tif', 'W2/images/W2-I1/2.tif', 'top.tif'}
+    # W1 is journaled as a whole, and not even listed
+    assert not [d for d in listed if d.startswith('W1/')]
+    assert 'empty/' not in listed
+
+
+def test_finished_scan(tree, tmp_path):
+    journal = str(tmp_path / 'checkpoint.db')
+    with ScanCheckpoint(journal, str(tree)) as checkpoint:
+        checkpoint.committed(record(e) for e in list(walk(tree, checkpoint)))
+    with ScanCheckpoint(journal, str(tree), resume=True) as checkpoint:
+        assert list(walk(tree, checkpoint)) == []
+    # without resume, the journal starts over
+    with ScanCheckpoint(journal, str(tree)) as checkpoint:
+        assert len(list(walk(tree, checkpoint))) == 6
+
+
+def test_failed_files(tree, tmp_path):
+    journal = str(tmp_path / 'checkpoint.db')
+    with ScanCheckpoint(journal, str(tree)) as checkpoint:
+        for entry in walk(tree, checkpoint):
+            if entry.rel_path == 'top.tif':
+                checkpoint.failed(dict(record(entry), error='unrecognized format'))
+            else:
+                checkpoint.committed([record(entry)])
+    with ScanCheckpoint(journal, str(tree), resume=True) as checkpoint:
+        # failed files are done for the walk, and kept to retry
+        assert list(walk(tree, checkpoint)) == []
+        assert checkpoint.failures() == [('top.tif', str(tree / 'top.tif'), 'unrecognized format')]
+        # iterated in another thread, as a pool's feeder thread does
+        entries = checkpoint.failed_entries()
+        with ThreadPoolExecutor(1) as executor:
+            retried = executor.submit(list, entries).result()
+        assert [e.rel_path for e in retried] == ['top.tif']
+        checkpoint.committed([record(retried[0])])
+    with ScanCheckpoint(journal, str(tree), resume=True) as checkpoint:
+        assert checkpoint.failures() == []
+
+
+def test_resume_other_root(tree, tmp_path):
+    journal = str(tmp_path / 'checkpoint.db')
+    ScanCheckpoint(journal, str(tree)).close()
+    with pytest.raises(ValueError):
+        ScanCheckpoint(journal, str(tmp_path), resume=True)
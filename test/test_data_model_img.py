@@ -22,24 +22,24 @@ test_source_dir: Path = Path(os.path.dirname(os.path.abspath(__file__)), 'source
 
 @pytest.mark.parametrize("source, expected", [
     (test_source_dir / 'I1FEMC010315_0011.tif', ImageFileInfo(
-        image_type='TIFF',
+        image_type='single_image_tiff',
         image_mode='I;16',
         width=6200,
         height=653,
         tiff_compression='tiff_lzw',
-        quality='tiff_lzw',
-        bps_x=600,
-        bps_y=600,
+        quality=None,
+        bps_x=16,
+        bps_y=16,
         recorded_date=None)),
     (test_source_dir / 'I2PD181500001.tif', ImageFileInfo(
-        image_type='TIFF',
+        image_type='single_image_tiff',
         image_mode='1',
         width=2550,
         height=3300,
         tiff_compression='group4',
-        quality='group4',
-        bps_x=300,
-        bps_y=300,
+        quality=None,
+        bps_x=1,
+        bps_y=1,
         recorded_date=None)),
     (test_source_dir / 'I2PD181500004.jpg', ImageFileInfo(
         image_type='JPEG',
@@ -47,9 +47,9 @@ test_source_dir: Path = Path(os.path.dirname(os.path.abspath(__file__)), 'source
         width=2187,
         height=3033,
         tiff_compression='unknown',
-        quality='unknown',
-        bps_x=300,
-        bps_y=300,
+        quality=99,
+        bps_x=8,
+        bps_y=8,
         recorded_date=None)
      ),
     (test_source_dir / 'I1EAP71250007.ARW', ImageFileInfo(
@@ -58,9 +58,9 @@ test_source_dir: Path = Path(os.path.dirname(os.path.abspath(__file__)), 'source
         width=7968,
         height=5320,
         tiff_compression='raw',
-        quality='raw',
-        bps_x=7968,
-        bps_y=5320,
+        quality=None,
+        bps_x=14,
+        bps_y=14,
         recorded_date=None)
      )
 ])
@@ -0,0 +1,99 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from util.file_walker import *
+
+
+@pytest.fixture
+def ocfl_tree(tmp_path: Path) -> Path:
+    for rel in ['W1/v1/content/images/W1-I1/I10001.tif',
+                'W1/v1/content/images/W1-I1/I10002.jpg',
+                'W1/v1/content/sources/W1-I1/scan.pdf',
+                'W1/v1/content/archive/W1-I1/I10001.tif',
+                'W1/inventory.json',
+                'top.tif']:
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_bytes(b'x' * len(rel))
+    return tmp_path
+
+
+def rel_paths(root: Path, entries) -> set:
+    return {Path(e.path).relative_to(root).as_posix() for e in entries}
+
+
+def test_walk_recursive(ocfl_tree):
+    entries = list(walk_files(str(ocfl_tree)))
+    assert len(entries) == 6
+    for e in entries:
+        assert e.rel_path == Path(e.path).relative_to(ocfl_tree).as_posix()
+        assert e.stat.st_size == len(e.rel_path)
+    assert {e.root_folder for e in entries} == {None, 'images', 'sources', 'archive'}
+
+
+def test_walk_max_depth(ocfl_tree):
+    assert rel_paths(ocfl_tree, walk_files(str(ocfl_tree), max_depth=1)) == {'top.tif'}
+
+
+def test_walk_globs(ocfl_tree):
+    assert rel_paths(ocfl_tree, walk_files(str(ocfl_tree), include=['*.tif'], exclude=['archive'])) == \
+           {'top.tif', 'W1/v1/content/images/W1-I1/I10001.tif'}
+
+
+def test_walk_root_folders(ocfl_tree):
+    assert rel_paths(ocfl_tree, walk_files(str(ocfl_tree), root_folders=['sources', 'archive'])) == \
+           {'W1/v1/content/sources/W1-I1/scan.pdf', 'W1/v1/content/archive/W1-I1/I10001.tif'}
+
+
+def test_walk_is_lazy(ocfl_tree):
+    it = walk_files(str(ocfl_tree))
+    assert next(it).path
+
+
+def test_walk_skips_vanished_files(tmp_path):
+    for name in 'abcde':
+        (tmp_path / name).write_bytes(b'x')
+    it = walk_files(str(tmp_path))
+    first = next(it)
+    for path in tmp_path.iterdir():
+        if path.name != Path(first.path).name:
+            path.unlink()
+    assert list(it) == []
+
+
+def test_walk_skips_unreadable_directories(ocfl_tree, monkeypatch):
+    scandir = os.scandir
+
+    def failing_scandir(path):
+        if path.endswith('images'):
+            raise PermissionError(13, 'Permission denied', path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', failing_scandir)
+    listed = []
+    entries = walk_files(str(ocfl_tree), on_directory_listed=lambda rel_dir, subdirs: listed.append(rel_dir))
+    assert rel_paths(ocfl_tree, entries) == {'top.tif', 'W1/inventory.json',
+                                             'W1/v1/content/sources/W1-I1/scan.pdf',
+                                             'W1/v1/content/archive/W1-I1/I10001.tif'}
+    assert 'W1/v1/content/images/' not in listed
+
+
+@pytest.mark.parametrize("relative_path, expected", [
+    ('W1ER169/sources/W1ER169-I1ER1069/a.pdf', 'sources'),
+    ('W1/v1/content/images/W1-I1/I10001.tif', 'images'),
+    ('W1/inventory.json', None),
+    ('images', None)
+])
+def test_root_folder_of(relative_path, expected):
+    assert root_folder_of(relative_path) == expected
+
+
+@pytest.mark.parametrize("relative_path, expected", [
+    ('W1ER169/sources/W1ER169-I1ER1069/a.pdf', 'I1ER1069'),
+    ('W1/v1/content/images/W1-I1/I10001.tif', 'I1'),
+    ('W1/v1/content/images/I10001.tif', None),
+    ('W1/v1/content/images/W1/I10001.tif', None)
+])
+def test_image_group_of(relative_path, expected):
+    assert image_group_of(relative_path) == expected
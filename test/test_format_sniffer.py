@@ -0,0 +1,44 @@
+import os
+from pathlib import Path
+
+import pytest
+
+import format_sniffer
+from format_sniffer import *
+
+test_source_dir: Path = Path(os.path.dirname(os.path.abspath(__file__)), 'sources/')
+
+
+@pytest.mark.parametrize("source, expected", [
+    (test_source_dir / 'I1CZ9700039.tif', 'tiff'),
+    (test_source_dir / 'I2PD181500001.tif', 'tiff'),
+    (test_source_dir / 'I2PD181500004.jpg', 'jpeg'),
+    (test_source_dir / 'BDRC_Archives.drawio.png', 'png'),
+    (test_source_dir / 'MultiPageImage1.pdf', 'pdf'),
+    (test_source_dir / 'Typical_BdrcPdf.pdf', 'pdf')
+])
+def test_sniff_file(source, expected):
+    assert sniff_file(source) == expected
+
+
+@pytest.mark.parametrize("header, suffix, expected", [
+    (b'II*\x00\x08\x00\x00\x00', '.ARW', 'raw'),
+    (b'MM\x00*\x00\x00\x00\x08', '.nef', 'raw'),
+    (b'II*\x00\x10\x00\x00\x00CR\x02\x00', '.tif', 'raw'),
+    (b'II+\x00\x08\x00\x00\x00', '.tif', 'tiff'),
+    (b'\x00\x00\x00\x0cjP  \r\n\x87\n', '.jp2', 'jp2'),
+    (b'\n\n%PDF-1.7', '', 'pdf'),
+    (b'GIF89a', '.gif', 'gif'),
+    (b'BM' + bytes(12), '.bmp', 'bmp'),
+    (b'RIFF\x24\x00\x00\x00WEBPVP8 ', '.webp', 'webp'),
+    (b'RIFF\x24\x00\x00\x00WAVEfmt ', '.wav', None)
+])
+def test_sniff_format(header, suffix, expected):
+    assert sniff_format(header, suffix) == expected
+
+
+def test_register_signature(monkeypatch):
+    monkeypatch.setattr(format_sniffer, '_signatures', list(format_sniffer._signatures))
+    register_signature('animated_gif', lambda header, suffix: header[:6] == b'GIF89a')
+    assert sniff_format(b'GIF89a') == 'animated_gif'
+    assert sniff_format(b'GIF87a') == 'gif'
@@ -0,0 +1,36 @@
+import io
+import os
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from jpeg_header import *
+
+test_source_dir: Path = Path(os.path.dirname(os.path.abspath(__file__)), 'sources/')
+
+
+def test_read_quantization_tables():
+    source = test_source_dir / 'I2PD181500004.jpg'
+    with Image.open(source) as im:
+        expected = {table_id: list(table) for table_id, table in im.quantization.items()}
+    assert read_quantization_tables(source) == expected
+
+
+@pytest.mark.parametrize("mode, quality", [('L', 42), ('RGB', 1), ('RGB', 85)])
+def test_read_jpeg_quality(mode, quality):
+    data = io.BytesIO()
+    Image.new(mode, (16, 16)).save(data, 'JPEG', quality=quality)
+    data.seek(0)
+    assert read_jpeg_quality(data) == quality
+
+
+def test_estimate_quality_non_ijg_tables():
+    # a flat table is not one libjpeg makes: the nearest quality is used
+    assert estimate_quality({0: [2] * 64}) == 99
+    assert estimate_quality({}) is None
+
+
+def test_not_a_jpeg():
+    with pytest.raises(ValueError):
+        read_quantization_tables(io.BytesIO(b'\x89PNG\r\n\x1a\n'))
@@ -0,0 +1,22 @@
+from known_files import *
+from test.fakes import FakeSession
+
+
+def test_resolve_batches_and_caches():
+    session = FakeSession(files={(b'a' * 32, 10): 1, (b'b' * 32, 20): 2, (b'c' * 32, 99): 3})
+    known_files = KnownFiles(session)
+    keys = [(b'a' * 32, 10), (b'b' * 32, 20), (b'c' * 32, 30), (b'd' * 32, 40)]
+    assert known_files.resolve(keys) == {(b'a' * 32, 10): 1, (b'b' * 32, 20): 2}
+    assert len(session.statements) == 1
+    assert known_files.resolve(keys[:2]) == {(b'a' * 32, 10): 1, (b'b' * 32, 20): 2}
+    assert len(session.statements) == 1
+
+
+def test_lru_eviction():
+    known_files = KnownFiles(FakeSession(), cache_size=2)
+    known_files.add((b'a', 1), 1)
+    known_files.add((b'b', 1), 2)
+    assert known_files.get((b'a', 1)) == 1
+    known_files.add((b'c', 1), 3)
+    assert known_files.get((b'b', 1)) is None
+    assert known_files.get((b'a', 1)) == 1
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from ocfl import *
+
+
+def add_object(root: Path, rel_path: str, ocfl_id: str, files: dict, fixity: bool = True) -> Path:
+    """
+    Object with a single version v1, digestAlgorithm sha512
+    :param files: logical path -> content
+    """
+    object_dir = root / rel_path
+    object_dir.mkdir(parents=True)
+    (object_dir / f'{OBJECT_NAMASTE_PREFIX}1.1').write_text('ocfl_object_1.1\n')
+    manifest, state, sha256 = {}, {}, {}
+    for logical_path, content in files.items():
+        content_path = f'v1/content/{logical_path}'
+        (object_dir / content_path).parent.mkdir(parents=True, exist_ok=True)
+        (object_dir / content_path).write_bytes(content)
+        digest = hashlib.sha512(content).hexdigest()
+        manifest.setdefault(digest, []).append(content_path)
+        state.setdefault(digest, []).append(logical_path)
+        sha256.setdefault(hashlib.sha256(content).hexdigest(), []).append(content_path)
+    inventory = {'id': ocfl_id, 'type': 'https://ocfl.io/1.1/spec/#inventory', 'digestAlgorithm': 'sha512',
+                 'head': 'v1', 'manifest': manifest,
+                 'versions': {'v1': {'created': '2020-01-02T03:04:05Z', 'state': state}}}
+    if fixity:
+        inventory['fixity'] = {'sha256': sha256}
+    (object_dir / INVENTORY).write_text(json.dumps(inventory))
+    return object_dir
+
+
+@pytest.fixture
+def storage_root(tmp_path: Path) -> Path:
+    root = tmp_path / 'Archive0'
+    root.mkdir()
+    (root / 'ocfl_layout.json').write_text(json.dumps({'extension': '0004-hashed-n-tuple-storage-layout'}))
+    add_object(root, 'ab/W1', 'http://purl.bdrc.io/resource/W1',
+               {'images/W1-I1/1.tif': b'one', 'images/W1-I1/2.tif': b'two', 'sources/W1-I1/a.pdf': b'pdf'})
+    add_object(root, 'cd/W2', 'bdr:W2', {'images/W2-I1/1.tif': b'three'}, fixity=False)
+    return root
+
+
+def test_bdrc_id_of():
+    assert bdrc_id_of('http://purl.bdrc.io/resource/W22084') == 'W22084'
+    assert bdrc_id_of('bdr:W22084') == 'W22084'
+    assert bdrc_id_of('W22084') == 'W22084'
+
+
+def test_read_inventory(storage_root):
+    inventory = read_inventory(str(storage_root / 'ab' / 'W1'))
+    assert (inventory.bdrc_id, inventory.head) == ('W1', 'v1')
+    assert inventory.created_at == inventory.last_modified_at == datetime(2020, 1, 2, 3, 4, 5)
+    by_logical_path = {f.logical_path: f for f in inventory.files}
+    assert by_logical_path['images/W1-I1/1.tif'].content_path == 'v1/content/images/W1-I1/1.tif'
+    # the sha256 of the fixity block, not the sha512 of the manifest
+    assert by_logical_path['images/W1-I1/1.tif'].digest == hashlib.sha256(b'one').digest()
+
+
+def test_ocfl_entries(storage_root):
+    assert storage_root_layout(str(storage_root)) == '0004-hashed-n-tuple-storage-layout'
+    entries = {e.rel_path: e for e in ocfl_entries(str(storage_root))}
+    assert sorted(entries) == ['ab/W1/v1/content/images/W1-I1/1.tif', 'ab/W1/v1/content/images/W1-I1/2.tif',
+                               'ab/W1/v1/content/sources/W1-I1/a.pdf', 'cd/W2/v1/content/images/W2-I1/1.tif']
+    entry = entries['ab/W1/v1/content/sources/W1-I1/a.pdf']
+    assert entry.root_folder == 'sources'
+    assert entry.stat.st_size == 3
+    assert entry.storage_object.bdrc_id == 'W1'
+    assert entry.storage_object.content_path(entry.rel_path) == 'v1/content/sources/W1-I1/a.pdf'
+    assert entry.image_group == 'I1'
+    # no sha256 in this inventory: the file is hashed
+    assert entries['cd/W2/v1/content/images/W2-I1/1.tif'].digest is None
+
+
+def test_objects_are_not_descended(storage_root):
+    # a directory inside an object which looks like an object
+    add_object(storage_root / 'ab' / 'W1', 'extensions/W3', 'W3', {'x.tif': b'x'})
+    assert sorted(Path(p).name for p in find_objects(str(storage_root))) == ['W1', 'W2']
+
+
+def test_missing_content_is_skipped(storage_root):
+    (storage_root / 'ab' / 'W1' / 'v1' / 'content' / 'images' / 'W1-I1' / '2.tif').unlink()
+    assert len(list(ocfl_entries(str(storage_root)))) == 3
+
+
+@pytest.mark.parametrize("change", [
+    {'versions': {}},
+    {'manifest': ['v1/content/images/W1-I1/1.tif']},
+    {'versions': {'v1': {'state': ['images/W1-I1/1.tif']}}},
+    {'fixity': {'sha256': 'abc'}},
+])
+def test_malformed_inventory(storage_root, change):
+    inventory_path = storage_root / 'ab' / 'W1' / INVENTORY
+    inventory_path.write_text(json.dumps(dict(json.loads(inventory_path.read_text()), **change)))
+    with pytest.raises(ValueError):
+        read_inventory(str(storage_root / 'ab' / 'W1'))
+    # the object is skipped, not the scan
+    assert [e.storage_object.bdrc_id for e in ocfl_entries(str(storage_root))] == ['W2']
+
+
+def test_unreadable_directory_is_skipped(storage_root, monkeypatch):
+    scandir = os.scandir
+
+    def failing_scandir(path):
+        if path.endswith('ab'):
+            raise PermissionError(13, 'Permission denied', path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', failing_scandir)
+    assert [Path(p).name for p in find_objects(str(storage_root))] == ['W2']
@@ -0,0 +1,16 @@
+import pytest
+
+from pdf_stats import *
+
+
+@pytest.mark.parametrize("content, expected", [
+    (b'BT /F1 12 Tf (Hello) Tj ET', 5),
+    (b'BT [(Hel) -250 (lo)] TJ ET', 5),
+    (b"BT (a\\(b\\)c) ' (x (nested) y) Tj ET", 5 + 12),
+    (b'BT (\\101\\102\\n) Tj <414243> Tj <4 1 4> Tj ET', 3 + 3 + 2),
+    (b'BT 1 2 (ab) " ET % (comment) Tj\n', 2),
+    (b'q BI /W 2 /H 1 /BPC 8 /CS /G ID \x00(Tj)\xff EI Q BT (ok) Tj ET', 2),
+    (b'/P <</MCID 0>> BDC BT [(x)] TJ ET EMC', 1)
+])
+def test_content_char_counter(content, expected):
+    assert ContentCharCounter()._count_stream(content, None, set()) == expected
@@ -0,0 +1,89 @@
+import queue
+import threading
+import time
+from multiprocessing import Pool
+
+import pytest
+
+from util.file_walker import walk_files
+from util.prefetch import POOL_CHUNK_SIZE, Prefetcher
+
+
+@pytest.fixture
+def files(tmp_path):
+    for i in range(20):
+        (tmp_path / f'{i:02}.bin').write_bytes(bytes([i]) * (100 * (i + 1)))
+    return sorted(walk_files(str(tmp_path)), key=lambda entry: entry.path)
+
+
+def test_prefetch_reads_every_file(files):
+    with Prefetcher(max_in_flight=4) as prefetcher:
+        seen = {}
+        for entry, data in prefetcher.prefetch(files):
+            seen[entry.path] = data
+            prefetcher.release(len(data))
+        assert prefetcher.reserved == 0
+    assert seen == {entry.path: open(entry.path, 'rb').read() for entry in files}
+
+
+def test_prefetch_byte_cap(files):
+    # like a multiprocessing pool: a feeder thread drains prefetch as fast as it can,
+    # and the bytes are released as the files are processed
+    with Prefetcher(max_in_flight=8, max_bytes=3000) as prefetcher:
+        fed = queue.Queue()
+        peak = 0
+
+        def feed():
+            for item in prefetcher.prefetch(files):
+                fed.put(item)
+            fed.put(None)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        count = 0
+        while True:
+            item = fed.get(timeout=10)
+            if item is None:
+                break
+            peak = max(peak, prefetcher.reserved)
+            time.sleep(0.002)
+            prefetcher.release(len(item[1]))
+            count += 1
+        feeder.join()
+        assert count == len(files)
+        assert prefetcher.reserved == 0
+    # a single file may exceed the cap on its own, never several
+    assert peak <= 3000 + max(entry.stat.st_size for entry in files)
+
+
+def test_prefetch_skips_large_and_unreadable(files, tmp_path):
+    (tmp_path / '00.bin').unlink()
+    with Prefetcher(max_in_flight=2, max_file_size=1500) as prefetcher:
+        results = {}
+        for entry, data in prefetcher.prefetch(files):
+            results[entry.path] = data
+            prefetcher.release(len(data) if data is not None else 0)
+        assert prefetcher.reserved == 0
+    assert results[files[0].path] is None
+    assert all(results[entry.path] is None for entry in files if entry.stat.st_size > 1500)
+    assert all(results[entry.path] is not None for entry in files[1:] if entry.stat.st_size <= 1500)
+
+
+def _size(prefetched):
+    entry, data = prefetched
+    return len(data)
+
+
+def test_prefetch_through_pool(tmp_path):
+    # a cap of 3 files: with a chunk size over 3, the pool never gets a chunk to send
+    for i in range(20):
+        (tmp_path / f'{i:02}.bin').write_bytes(b'x' * 1000)
+    with Prefetcher(max_in_flight=4, max_bytes=3000) as prefetcher, Pool(2) as pool:
+        results = pool.imap_unordered(_size, prefetcher.prefetch(walk_files(str(tmp_path))), POOL_CHUNK_SIZE)
+        sizes = []
+        for _ in range(20):
+            # next() with a timeout, which a deadlock would run out
+            sizes.append(results.next(timeout=30))
+            prefetcher.release(sizes[-1])
+        assert sizes == [1000] * 20
+        assert prefetcher.reserved == 0
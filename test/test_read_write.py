@@ -0,0 +1,215 @@
+import argparse
+import contextlib
+import hashlib
+import shutil
+import sqlite3
+import sys
+import types
+from pathlib import Path
+
+import pytest
+from pypdf import PdfReader
+
+import pdf_stats
+
+try:
+    import BdrcDbLib.DbOrm.DrsContextBase
+except ImportError:
+    # only main() opens a database context, and the tests give it a fake one: stand in for the package
+    for name in ('BdrcDbLib', 'BdrcDbLib.DbOrm', 'BdrcDbLib.DbOrm.DrsContextBase'):
+        sys.modules[name] = types.ModuleType(name)
+    sys.modules['BdrcDbLib.DbOrm.DrsContextBase'].DrsDbContextBase = object
+
+from known_files import KnownFiles
+from run import read_write
+from scan_manifest import ScanManifest
+from test.fakes import FakeSession
+from util.file_walker import walk_files
+from util.prefetch import Prefetcher
+
+test_source_dir: Path = Path(__file__).parent / 'sources'
+
+CORPUS = {
+    'W1/images/W1-I1/I2PD181500001.tif': 'I2PD181500001.tif',
+    'W1/images/W1-I1/BDRC_Archives.drawio.png': 'BDRC_Archives.drawio.png',
+    'W1/sources/W1-I1/MultiPageCharMultiImage.pdf': 'MultiPageCharMultiImage.pdf',
+}
+
+
+@pytest.fixture
+def corpus(tmp_path: Path) -> Path:
+    root = tmp_path / 'root'
+    for rel_path, source in CORPUS.items():
+        (root / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(test_source_dir / source, root / rel_path)
+    return root
+
+
+def by_rel_path(records) -> dict:
+    return {record['rel_path']: record for record in records if record is not None}
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_skip_unchanged(corpus, tmp_path, workers):
+    db = str(tmp_path / 'manifest.sqlite')
+    with ScanManifest(db) as manifest:
+        records = by_rel_path(read_write.scan(read_write.skip_unchanged(walk_files(str(corpus)), manifest), workers))
+        assert sorted(records) == sorted(CORPUS)
+        for record in records.values():
+            manifest.record(record['path'], record['stat'], record['file'].digest)
+    changed = corpus / 'W1/images/W1-I1/I2PD181500001.tif'
+    changed.write_bytes(changed.read_bytes() + b'\0')
+    # the manifest is read by the pool's feeder thread
+    with ScanManifest(db) as manifest:
+        records = by_rel_path(read_write.scan(read_write.skip_unchanged(walk_files(str(corpus)), manifest), workers))
+    assert sorted(records) == ['W1/images/W1-I1/I2PD181500001.tif']
+
+
+def expected_records(corpus: Path) -> dict:
+    """
+    Records of a plain, single process scan of the corpus
+    """
+    records = by_rel_path(read_write.extract_one(entry) for entry in walk_files(str(corpus)))
+    for rel_path, record in records.items():
+        assert record['file'].digest == hashlib.sha256((corpus / rel_path).read_bytes()).digest()
+        assert record['info_type'] == ('pdf' if rel_path.endswith('.pdf') else 'image')
+    assert records['W1/sources/W1-I1/MultiPageCharMultiImage.pdf']['info'].number_of_pages == \
+           len(PdfReader(str(corpus / 'W1/sources/W1-I1/MultiPageCharMultiImage.pdf')).pages)
+    return records
+
+
+def assert_same_records(records: dict, expected: dict):
+    assert sorted(records) == sorted(expected)
+    for rel_path, record in records.items():
+        assert 'error' not in record
+        assert (record['file'], record['info'], record['root_folder']) == \
+               (expected[rel_path]['file'], expected[rel_path]['info'], expected[rel_path]['root_folder'])
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('single_pass, prefetch', [(False, False), (True, False), (False, True)])
+def test_scan(corpus, workers, single_pass, prefetch):
+    expected = expected_records(corpus)
+    with Prefetcher(4, 1024 * 1024) if prefetch else contextlib.nullcontext() as prefetcher:
+        records = by_rel_path(read_write.scan(walk_files(str(corpus)), workers, single_pass, prefetcher=prefetcher))
+        if prefetch:
+            assert prefetcher.reserved == 0
+    assert_same_records(records, expected)
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+def test_scan_split_pdf(corpus, monkeypatch, prefetch):
+    expected = expected_records(corpus)
+    # inherited by the forked workers
+    monkeypatch.setattr(pdf_stats, 'MIN_PARALLEL_CHUNK_PAGES', 1)
+    with Prefetcher(4, 1024 * 1024) if prefetch else contextlib.nullcontext() as prefetcher:
+        records = by_rel_path(read_write.scan(walk_files(str(corpus)), 2, prefetcher=prefetcher,
+                                              pdf_settings={'parallel_page_threshold': 1, 'parallel_workers': 3}))
+    assert all('page_chunks' not in record for record in records.values())
+    assert_same_records(records, expected)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('prefetch_bytes', [None, 1024 * 1024, 400000])
+def test_scan_skip_known(corpus, workers, prefetch_bytes):
+    expected = expected_records(corpus)
+    known_path = 'W1/images/W1-I1/I2PD181500001.tif'
+    known = expected.pop(known_path)['file']
+    known_files = KnownFiles(FakeSession(files={(known.digest, known.size): 42}))
+    reads = []
+
+    def read(path: str) -> bytes:
+        reads.append(path)
+        return Path(path).read_bytes()
+
+    with Prefetcher(4, prefetch_bytes, read=read) if prefetch_bytes else contextlib.nullcontext() as prefetcher:
+        records = by_rel_path(read_write.scan(walk_files(str(corpus)), workers, known_files=known_files,
+                                              precheck_size=3, prefetcher=prefetcher))
+        if prefetch_bytes:
+            assert prefetcher.reserved == 0
+    # the known file only gets its path written
+    known_record = records.pop(known_path)
+    assert (known_record['file_id'], known_record['file'].digest, known_record['info']) == (42, known.digest, None)
+    assert_same_records(records, expected)
+    if prefetch_bytes == 1024 * 1024:
+        # room for the bytes of the unknown files: their extraction does not read them again
+        assert sorted(reads) == sorted(str(corpus / rel_path) for rel_path in CORPUS)
+    elif prefetch_bytes:
+        # no room: some are read twice
+        assert len(reads) > len(CORPUS)
+
+
+class FakeDbContext:
+    """
+    DrsDbContextBase of main(), with a FakeSession
+    """
+    sessions = []
+
+    def __init__(self, config):
+        self.session = FakeSession()
+        FakeDbContext.sessions.append(self.session)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+def written_paths(session: FakeSession) -> list:
+    return sorted(value for sql, params in zip(session.statements, session.params)
+                  if sql.startswith('INSERT INTO storage.paths')
+                  for name, value in params.items() if name.startswith('path_m'))
+
+
+def run_main(monkeypatch, *args: str) -> FakeSession:
+    # the parser is a class attribute, which every RwArgParser adds its arguments to
+    monkeypatch.setattr(read_write.RwArgParser, '_parser', argparse.ArgumentParser())
+    monkeypatch.setattr(read_write, 'DrsDbContextBase', FakeDbContext)
+    monkeypatch.setattr(sys, 'argv', ['read_write.py', '-s', 'storage', '-c', 'content', *args])
+    FakeDbContext.sessions.clear()
+    read_write.main()
+    return FakeDbContext.sessions[0]
+
+
+@pytest.mark.parametrize('workers', ['1', '2'])
+def test_main_resume(corpus, tmp_path, monkeypatch, workers):
+    checkpoint = str(tmp_path / 'checkpoint.sqlite')
+    args = ['-p', str(corpus), '-r', '-w', workers, '--prefetch', '2', '--single-pass', '--checkpoint', checkpoint]
+    session = run_main(monkeypatch, *args)
+    assert written_paths(session) == sorted(CORPUS)
+    assert session.commits >= 1
+    # everything is done: a resumed scan reads nothing
+    assert written_paths(run_main(monkeypatch, *args, '--resume')) == []
+    # a scan interrupted after committing the images
+    with sqlite3.connect(checkpoint) as conn:
+        conn.execute("DELETE FROM done_dirs")
+        conn.executemany("INSERT INTO done_files (path) VALUES (?)",
+                         [(rel_path,) for rel_path in CORPUS if '/images/' in rel_path])
+    assert written_paths(run_main(monkeypatch, *args, '--resume')) == ['W1/sources/W1-I1/MultiPageCharMultiImage.pdf']
+    # without --resume, the journal is cleared
+    assert written_paths(run_main(monkeypatch, *args)) == sorted(CORPUS)
+
+
+@pytest.mark.parametrize('workers', ['1', '2'])
+def test_main_retry_failed(corpus, tmp_path, monkeypatch, workers):
+    checkpoint = str(tmp_path / 'checkpoint.sqlite')
+    broken = corpus / 'W1/images/W1-I1/broken.tif'
+    broken.write_bytes(b'II*\x00' + bytes(100))
+    args = ['-p', str(corpus), '-r', '-w', workers, '--checkpoint', checkpoint]
+    assert written_paths(run_main(monkeypatch, *args)) == sorted(CORPUS)
+    shutil.copy(test_source_dir / 'I2PD181500001.tif', broken)
+    assert written_paths(run_main(monkeypatch, *args, '--retry-failed')) == ['W1/images/W1-I1/broken.tif']
+
+
+@pytest.mark.parametrize('workers', ['1', '2'])
+def test_main_skip_known_and_manifest(corpus, tmp_path, monkeypatch, workers):
+    manifest = str(tmp_path / 'manifest.sqlite')
+    args = ['-p', str(corpus), '-r', '-w', workers, '--prefetch', '2', '--skip-known', '-m', manifest]
+    session = run_main(monkeypatch, *args)
+    assert written_paths(session) == sorted(CORPUS)
+    assert sum(sql.startswith('INSERT IGNORE INTO storage.files') for sql in session.statements) == 1
+    with ScanManifest(manifest) as scanned:
+        assert all(scanned.get(str(corpus / rel_path)).file_id for rel_path in CORPUS)
+    # nothing changed since
+    assert written_paths(run_main(monkeypatch, *args)) == []
@@ -0,0 +1,39 @@
+import os
+import pickle
+from pathlib import Path
+
+import pytest
+
+import FileInfo as fi
+import image_info as ii
+from records import *
+
+test_source_dir: Path = Path(os.path.dirname(os.path.abspath(__file__)), 'sources/')
+
+
+def test_record_fields():
+    record = PdfInfoRecord(12, median_sample_size=4)
+    assert record.to_row() == {'number_of_pages': 12, 'median_nb_chr_per_page': None,
+                               'median_nb_images_per_page': None, 'median_sample_size': 4, 'recorded_date': None}
+    with pytest.raises(AttributeError):
+        record.number_of_pages = 13
+    with pytest.raises(TypeError):
+        PdfInfoRecord(width=1)
+    assert not hasattr(record, '__dict__')
+
+
+@pytest.mark.parametrize("source", [
+    test_source_dir / 'I2PD181500004.jpg',
+    test_source_dir / 'MultiPageImage1.pdf'
+])
+def test_records_match_orm(source):
+    file_record = fi.f_to_file_record(source)
+    assert fi.f_to_files(source) == fi.f_to_files(source, digest=file_record.digest)
+    assert file_record.to_row()['digest'] == fi.f_to_files(source).digest
+    info = ii.info_record(ii.image_info_factory(source).extract())
+    orm_info = ii.base_image_to_pdf_file_infos(ii.image_info_factory(source)) if isinstance(info, PdfInfoRecord) \
+        else ii.base_image_to_image_file_infos(ii.image_info_factory(source))
+    assert info.to_row() == {column: getattr(orm_info, column) for column in type(info).__slots__}
+    # what the workers send back
+    assert pickle.loads(pickle.dumps(info)) == info
+    assert len(pickle.dumps(file_record)) < len(pickle.dumps(fi.f_to_files(source))) / 2
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+
+from resolver import *
+from test.fakes import FakeSession
+from util.file_walker import StorageObject
+
+
+def file_row(n: int) -> dict:
+    digest = bytes([n]) * 32
+    return {'digest': digest, 'size': n, 'persistent_id': digest, 'validity': 'not_set'}
+
+
+def file_rows(*ns: int) -> dict:
+    return {(bytes([n]) * 32, n): file_row(n) for n in ns}
+
+
+def test_new_files_ids_from_the_insert():
+    session = FakeSession(autoinc_lock_mode=1)
+    resolver = StorageResolver(session)
+    ids = resolver.file_ids(file_rows(1, 2, 3))
+    assert ids == {key: session.files[key] for key in file_rows(1, 2, 3)}
+    # one lookup of the misses, one insert: no second lookup
+    assert [s.split()[0] for s in session.statements] == ['SELECT', 'INSERT']
+    # cached: no statement at all
+    assert resolver.file_ids(file_rows(2, 3)) == {key: ids[key] for key in file_rows(2, 3)}
+    assert len(session.statements) == 2
+
+
+@pytest.mark.parametrize("lock_mode, increment", [(2, 1), (1, 2)])
+def test_new_files_looked_up_without_consecutive_ids(lock_mode, increment):
+    session = FakeSession(autoinc_lock_mode=lock_mode, auto_increment_increment=increment)
+    resolver = StorageResolver(session)
+    ids = resolver.file_ids(file_rows(1, 2))
+    assert ids == {key: session.files[key] for key in file_rows(1, 2)}
+    assert [s.split()[0] for s in session.statements] == ['SELECT', 'INSERT', 'SELECT']
+
+
+def test_objects():
+    session = FakeSession()
+    resolver = StorageResolver(session, consecutive_ids=True)
+    w1 = StorageObject('W1', 'ab/W1', datetime(2020, 1, 1), datetime(2020, 1, 1))
+    ids = resolver.object_ids(7, [w1, StorageObject('W2', 'cd/W2'), w1])
+    assert ids == {'W1': session.objects[(7, 'W1')], 'W2': session.objects[(7, 'W2')]}
+    assert len(session.statements) == 2
+    assert resolver.object_ids(7, [w1]) == {'W1': ids['W1']}
+    assert len(session.statements) == 2
+    # a new version of W1
+    assert resolver.object_ids(7, [w1._replace(last_modified_at=datetime(2021, 1, 1))]) == {'W1': ids['W1']}
+    assert session.statements[-1].startswith('UPDATE storage.objects')
+    # the same bdrc_id in another root is another object
+    assert resolver.object_ids(8, [w1]) == {'W1': session.objects[(8, 'W1')]}
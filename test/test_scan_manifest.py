@@ -0,0 +1,43 @@
+import os
+from pathlib import Path
+
+from scan_manifest import *
+
+
+def test_manifest_roundtrip(tmp_path: Path):
+    scanned = tmp_path / 'I10001.tif'
+    scanned.write_bytes(b'1234')
+    st = scanned.stat()
+    db = str(tmp_path / 'manifest.sqlite')
+    with ScanManifest(db) as manifest:
+        assert not manifest.is_unchanged(str(scanned), st)
+        manifest.record(str(scanned), st, b'\x01' * 32, file_id=7, info_type='image')
+    with ScanManifest(db) as manifest:
+        assert manifest.is_unchanged(str(scanned), st)
+        entry = manifest.get(str(scanned))
+        assert entry.digest == b'\x01' * 32
+        assert entry.file_id == 7
+        assert entry.info_id is None
+
+
+def test_manifest_detects_change(tmp_path: Path):
+    scanned = tmp_path / 'I10001.tif'
+    scanned.write_bytes(b'1234')
+    with ScanManifest(str(tmp_path / 'manifest.sqlite')) as manifest:
+        manifest.record(str(scanned), scanned.stat())
+        scanned.write_bytes(b'12345')
+        assert not manifest.is_unchanged(str(scanned), scanned.stat())
+        scanned.write_bytes(b'1234')
+        os.utime(scanned, ns=(0, 0))
+        assert not manifest.is_unchanged(str(scanned), scanned.stat())
+
+
+def test_manifest_uncommitted_is_lost(tmp_path: Path):
+    scanned = tmp_path / 'I10001.tif'
+    scanned.write_bytes(b'1234')
+    db = str(tmp_path / 'manifest.sqlite')
+    manifest = ScanManifest(db)
+    manifest.record(str(scanned), scanned.stat())
+    manifest.close()
+    with ScanManifest(db) as manifest:
+        assert manifest.get(str(scanned)) is None
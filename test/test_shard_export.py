@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from shard_export import *
+from shard_loader import STAGING_TABLE, ShardLoader, load_data_sql, merge_sql, staging_ddl
+from test.fakes import FakeSession, make_record
+
+
+def test_record_to_row():
+    row = record_to_row(make_record(3))
+    assert tuple(row) == SHARD_COLUMNS
+    assert row['digest'] == '03' * 32
+    assert row['recorded_date'] == '2024-01-03 00:00:00'
+    assert (row['image_group'], row['root_folder'], row['number_of_pages']) == ('I1', 'images', None)
+    # the image group of an OCFL logical path, rather than of the content path
+    assert record_to_row(dict(make_record(3), image_group='I2'))['image_group'] == 'I2'
+
+
+@pytest.mark.parametrize('shard_format', ['jsonl', 'csv'])
+def test_shard_rotation(tmp_path, shard_format):
+    closed = []
+    with ShardWriter(tmp_path, shard_format, shard_rows=3, prefix='t',
+                     on_close=lambda path, records: closed.append((path.name, len(records)))) as writer:
+        for n in range(1, 8):
+            writer.add(make_record(n, 'pdf' if n == 2 else 'image'))
+        # the shard being written is not visible under its final name
+        assert sorted(p.name for p in tmp_path.iterdir()) == \
+               [f't-00000.{shard_format}', f't-00001.{shard_format}', f't-00002.{shard_format}{PART_SUFFIX}']
+    assert closed == [(f't-0000{i}.{shard_format}', n) for i, n in enumerate((3, 3, 1))]
+    rows = [row for shard in writer.shards for row in read_shard(shard)]
+    assert [row['size'] for row in rows] == [str(n) if shard_format == 'csv' else n for n in range(1, 8)]
+    assert rows[1]['info_type'] == 'pdf' and rows[1]['width'] is None
+    assert rows[0]['persistent_id'] == '01' * 32
+
+
+def test_shard_to_csv(tmp_path):
+    with ShardWriter(tmp_path, 'jsonl', prefix='t') as writer:
+        writer.add(make_record(1))
+        writer.add(make_record(2, 'pdf'))
+    out = tmp_path / 'out.csv'
+    assert shard_to_csv(writer.shards[0], out) == 2
+    lines = out.read_text().splitlines()
+    assert lines[0] == ','.join(SHARD_COLUMNS)
+    assert [row['number_of_pages'] for row in read_shard(out)] == [None, '2']
+
+
+def test_loader_statements(tmp_path):
+    with ShardWriter(tmp_path, 'jsonl', prefix='t') as writer:
+        writer.add(make_record(1))
+    session = FakeSession()
+    loader = ShardLoader(session)
+    assert loader.load(writer.shards[0]) == 7
+    assert loader.load(writer.shards[0]) == 7
+    # staging created once, truncated, loaded and merged for each shard, one commit each
+    assert session.statements[0] == staging_ddl()
+    assert session.statements[1:].count(f"TRUNCATE TABLE {STAGING_TABLE}") == 2
+    assert session.statements.count(load_data_sql()) == 2
+    assert session.statements[-len(merge_sql()):] == merge_sql()
+    assert session.commits == 2
+    # non-CSV shards are converted to a temporary CSV first, which is gone afterwards
+    loaded = session.params[2]['path']
+    assert loaded.endswith('.csv') and not os.path.exists(loaded)
+
+
+def test_load_data_sql_columns():
+    sql = load_data_sql()
+    assert "digest = UNHEX(NULLIF(@digest, ''))" in sql
+    assert "width = NULLIF(@width, '')" in sql
+    assert sql.count("@") == 2 * len(SHARD_COLUMNS)
@@ -0,0 +1,181 @@
+import io
+import os
+import struct
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from PIL import Image
+
+from image_info import ImageMetadataException, RawHeaderImage, TiffImage, image_info_factory, image_info_record
+from jpeg_header import read_jpeg_exif_dates
+from tiff_ifd import *
+
+test_source_dir: Path = Path(os.path.dirname(os.path.abspath(__file__)), 'sources/')
+
+
+def build_tiff(ifds, byte_order='<', chain=False):
+    """
+    Minimal classic TIFF whose IFDs hold only SHORT, LONG and ASCII tags.
+    :param ifds: list of {tag: value}, value an int, a tuple of ints, a str,
+    or ('ifd', index) pointing to another IFD of the list
+    :param chain: link the IFDs into the main chain (pages), instead of only the first one
+    """
+    def entry_size(ifd):
+        return 2 + 12 * len(ifd) + 4
+
+    # lay out the IFDs, each followed by its out of line values
+    offsets, position = [], 8
+    for ifd in ifds:
+        offsets.append(position)
+        position += entry_size(ifd) + sum(len(v) + 1 for v in ifd.values() if isinstance(v, str) and len(v) >= 4)
+    out = bytearray(b'II*\x00' if byte_order == '<' else b'MM\x00*')
+    out += struct.pack(byte_order + 'I', offsets[0])
+    for i, ifd in enumerate(ifds):
+        extra = bytearray()
+        extra_offset = len(out) + entry_size(ifd)
+        out += struct.pack(byte_order + 'H', len(ifd))
+        for tag in sorted(ifd):
+            value = ifd[tag]
+            if isinstance(value, str):
+                data = value.encode() + b'\x00'
+                if len(data) > 4:
+                    field = struct.pack(byte_order + 'I', extra_offset + len(extra))
+                    extra += data
+                else:
+                    field = data.ljust(4, b'\x00')
+                out += struct.pack(byte_order + 'HHI', tag, 2, len(data)) + field
+                continue
+            if isinstance(value, tuple):
+                out += struct.pack(byte_order + 'HHII', tag, 4, 1, offsets[value[1]])
+            else:
+                out += struct.pack(byte_order + 'HHIHH', tag, 3, 1, value, 0)
+        out += struct.pack(byte_order + 'I', offsets[i + 1] if chain and i + 1 < len(ifds) else 0)
+        out += extra
+    return bytes(out)
+
+
+@pytest.mark.parametrize("byte_order", ['<', '>'])
+def test_read_raw_header(byte_order):
+    # NEF-like: IFD0 is the thumbnail, the sensor data is in a SubIFD
+    data = build_tiff([
+        {0xFE: 1, 0x100: 160, 0x101: 120, 0x106: 2, 0x14A: ('ifd', 1), 0x8769: ('ifd', 2)},
+        {0xFE: 0, 0x100: 6048, 0x101: 4024, 0x106: 32803},
+        {0x9003: '2019:05:04 10:11:12'},
+    ], byte_order)
+    assert read_raw_header(io.BytesIO(data)) == RawHeader(6048, 4024, ExifDates(datetime(2019, 5, 4, 10, 11, 12)))
+
+
+def test_read_raw_header_no_sensor_ifd():
+    assert read_raw_header(test_source_dir / 'I2PD181500001.tif') is None
+    assert read_raw_header(io.BytesIO(b'GIF89a' + bytes(20))) is None
+
+
+@pytest.mark.parametrize("value, offset, subsec, expected", [
+    ('2019:05:04 10:11:12', None, None, datetime(2019, 5, 4, 10, 11, 12)),
+    ('2019:05:04 10:11:12', '-05:30', '25', datetime(2019, 5, 4, 10, 11, 12, 250000,
+                                                     timezone(-timedelta(hours=5, minutes=30)))),
+    ('2019:05:04 10:11:12', '   :  ', '', datetime(2019, 5, 4, 10, 11, 12)),
+    ('0000:00:00 00:00:00', None, None, None),
+    ('', None, None, None),
+    (None, None, None, None)
+])
+def test_parse_exif_datetime(value, offset, subsec, expected):
+    assert parse_exif_datetime(value, offset, subsec) == expected
+
+
+def test_raw_image_from_header(tmp_path):
+    raw = tmp_path / 'shot.nef'
+    raw.write_bytes(build_tiff([
+        {0xFE: 1, 0x100: 160, 0x101: 120, 0x106: 2, 0x14A: ('ifd', 1)},
+        {0xFE: 0, 0x100: 6048, 0x101: 4024, 0x106: 32803},
+    ]))
+    image = image_info_factory(raw)
+    assert isinstance(image, RawHeaderImage)
+    assert (image.width, image.height, image.resolution, image.recorded_date) == (6048, 4024, (6048, 4024), None)
+
+
+@pytest.mark.parametrize("source", [
+    test_source_dir / 'I1CZ9700039.tif',
+    test_source_dir / 'I2PD181500001.tif'
+])
+def test_read_tiff_info_matches_pil(source):
+    info = read_tiff_info(source)
+    with Image.open(source) as im:
+        assert (info.width, info.height) == im.size
+        assert info.mode == im.mode
+        assert info.compression == im.info['compression']
+        assert info.resolution == im.info['dpi']
+        assert info.page_count == im.n_frames
+    assert read_tiff_info(source, use_mmap=True) == info
+    image = image_info_factory(source)
+    assert isinstance(image, TiffImage)
+    assert (image.compression, image.resolution) == (info.compression, info.resolution)
+
+
+def test_read_tiff_info_pages():
+    data = build_tiff([
+        {0x100: 100, 0x101: 50, 0x102: 8, 0x103: 5, 0x106: 1, 0x132: '2020:01:02 03:04:05'},
+        {0xFE: 1, 0x100: 10, 0x101: 5, 0x102: 8, 0x103: 1, 0x106: 1},
+        {0x100: 100, 0x101: 50, 0x102: 8, 0x103: 5, 0x106: 1},
+    ], '>', chain=True)
+    info = read_tiff_info(io.BytesIO(data))
+    assert info.page_count == 2
+    assert (info.width, info.height, info.compression, info.mode) == (100, 50, 'tiff_lzw', 'L')
+    assert info.resolution is None
+    assert info.dates == ExifDates(date_time=datetime(2020, 1, 2, 3, 4, 5))
+
+
+def test_tiff_image_records(tmp_path):
+    # no dpi
+    single = tmp_path / 'single.tif'
+    Image.new('L', (10, 20)).save(single)
+    record = image_info_record(image_info_factory(single))
+    assert (record.image_type, record.width, record.height, record.bps_x, record.bps_y) == \
+           ('single_image_tiff', 10, 20, 8, 8)
+    # TIFFs have no quality setting, whatever their compression
+    assert record.quality is None
+    multi = tmp_path / 'multi.tif'
+    Image.new('1', (10, 20)).save(multi, save_all=True, append_images=[Image.new('1', (10, 20))])
+    with pytest.raises(ImageMetadataException):
+        image_info_factory(multi).extract()
+
+
+
+def test_read_bigtiff_info():
+    entries = [(0x100, 3, 1, 640), (0x101, 3, 1, 480), (0x102, 3, 1, 8), (0x103, 3, 1, 8), (0x106, 3, 1, 1)]
+    data = b'II+\x00\x08\x00\x00\x00' + struct.pack('<Q', 16) + struct.pack('<Q', len(entries))
+    for tag, field_type, count, value in entries:
+        data += struct.pack('<HHQQ', tag, field_type, count, value)
+    data += struct.pack('<Q', 0)
+    info = read_tiff_info(io.BytesIO(data))
+    assert (info.page_count, info.width, info.height, info.compression, info.mode) == \
+           (1, 640, 480, 'tiff_adobe_deflate', 'L')
+
+
+def test_read_tiff_infos(tmp_path):
+    not_tiff = tmp_path / 'a.tif'
+    not_tiff.write_bytes(b'GIF89a' + bytes(20))
+    empty = tmp_path / 'b.tif'
+    empty.write_bytes(b'')
+    paths = [test_source_dir / 'I2PD181500001.tif', not_tiff, empty]
+    infos = list(read_tiff_infos(paths))
+    assert [path for path, _ in infos] == paths
+    assert infos[0][1] == read_tiff_info(paths[0])
+    assert infos[1][1] is None and infos[2][1] is None
+
+
+def test_exif_dates(tmp_path):
+    exif = Image.Exif()
+    exif[0x0132] = '2021:03:04 05:06:07'
+    exif.get_ifd(0x8769).update({0x9003: '2020:01:02 03:04:05', 0x9011: '+02:00', 0x9291: '5',
+                                 0x9004: '2020:01:03 00:00:00'})
+    jpeg = tmp_path / 'exif.jpg'
+    Image.new('RGB', (8, 8)).save(jpeg, 'JPEG', exif=exif)
+    expected = ExifDates(datetime(2020, 1, 2, 3, 4, 5, 500000, timezone(timedelta(hours=2))),
+                         datetime(2020, 1, 3), datetime(2021, 3, 4, 5, 6, 7))
+    assert read_jpeg_exif_dates(jpeg) == expected
+    assert exif_dates_from_bytes(exif.tobytes()) == expected
+    assert image_info_factory(jpeg).recorded_date == expected.date_time_original
+    assert exif_dates_from_bytes(b'Exif\x00\x00garbage') == ExifDates()
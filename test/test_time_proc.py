@@ -0,0 +1,114 @@
+import json
+import os
+import pickle
+from pathlib import Path
+
+import pytest
+
+import image_info as ii
+from util import time_proc
+from util.time_proc import ANY_FORMAT, UNKNOWN_FORMAT, Histogram, StageTimings
+
+test_source_dir: Path = Path(os.path.dirname(os.path.abspath(__file__)), 'sources/')
+
+
+@pytest.fixture
+def timings():
+    return StageTimings(enabled=True)
+
+
+def test_disabled_records_nothing():
+    timings = StageTimings()
+    with timings.stage('hash'):
+        pass
+    with timings.stage('stat', ANY_FORMAT):
+        pass
+    timings.file_done('tiff')
+    assert timings.drain() == {}
+
+
+def test_stage_with_format(timings):
+    with timings.stage('stat', ANY_FORMAT):
+        pass
+    snapshot = timings.drain()
+    assert list(snapshot) == [('stat', ANY_FORMAT)]
+    assert snapshot[('stat', ANY_FORMAT)][0] == 1
+
+
+def test_file_stages_labelled_when_done(timings):
+    # two parse blocks of one file make one sample
+    with timings.stage('read'):
+        pass
+    with timings.stage('parse'):
+        pass
+    with timings.stage('parse'):
+        pass
+    assert timings.drain() == {}
+    timings.note_format('jpeg')
+    timings.file_done()
+    with timings.stage('hash'):
+        pass
+    timings.file_done()
+    counts = {key: value[0] for key, value in timings.drain().items()}
+    assert counts == {('read', 'jpeg'): 1, ('parse', 'jpeg'): 1, ('hash', UNKNOWN_FORMAT): 1}
+
+
+def test_timed_decorator(timings):
+    @timings.timed('db_write', ANY_FORMAT)
+    def write(x):
+        return x * 2
+
+    assert write(2) == 4
+    assert timings.drain()[('db_write', ANY_FORMAT)][0] == 1
+
+
+def test_drain_merge_round_trip(timings):
+    for seconds in (0.001, 0.002, 0.5):
+        timings.add('parse', 'pdf', seconds)
+    # snapshots cross process boundaries in scan records
+    snapshot = pickle.loads(pickle.dumps(timings.drain()))
+    main = StageTimings()
+    main.merge(snapshot)
+    main.merge(snapshot)
+    parse = main.to_dict()['stages'][0]
+    assert (parse['stage'], parse['format'], parse['count']) == ('parse', 'pdf', 6)
+    assert parse['max_ms'] == pytest.approx(500)
+    assert parse['total_s'] == pytest.approx(1.006)
+
+
+def test_histogram_quantiles():
+    histogram = Histogram()
+    for _ in range(99):
+        histogram.add(0.001)
+    histogram.add(2.0)
+    # bucket upper bounds: within a factor 2 of the sample
+    assert 0.001 <= histogram.quantile(0.5) < 0.002
+    assert 0.001 <= histogram.quantile(0.99) < 0.002
+    assert histogram.quantile(1.0) == 2.0
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_summary_and_json(timings, tmp_path):
+    timings.add('db_commit', ANY_FORMAT, 0.3)
+    timings.add('hash', 'tiff', 0.1)
+    lines = timings.summary().splitlines()
+    # in pipeline order, with their share of the total
+    assert lines[1].split()[:2] == ['hash', 'tiff'] and '25.0%' in lines[1]
+    assert lines[2].split()[:2] == ['db_commit', ANY_FORMAT] and '75.0%' in lines[2]
+    out = tmp_path / 'timings.json'
+    assert list(timings.dump_periodically(range(3), out, interval=3600)) == [0, 1, 2]
+    dumped = json.loads(out.read_text())
+    assert [s['stage'] for s in dumped['stages']] == ['hash', 'db_commit']
+    assert len(dumped['stages'][0]['buckets']) == len(dumped['bucket_bounds_ms']) + 1
+
+
+def test_image_info_stages():
+    time_proc.drain()
+    time_proc.enable()
+    try:
+        ii.image_info_factory(test_source_dir / 'I2PD181500004.jpg').extract()
+        time_proc.file_done()
+        stages = {key for key in time_proc.drain()}
+    finally:
+        time_proc.enable(False)
+    assert stages == {('sniff', 'jpeg'), ('parse', 'jpeg')}
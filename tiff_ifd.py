@@ -0,0 +1,421 @@
+"""
+Header-only TIFF reader: walks the IFDs of TIFF-based files (TIFF, BigTIFF and
+the raw formats built on TIFF) with a few small seeks, never reading image data
+"""
+import io
+import mmap
+import struct
+from datetime import datetime, timedelta, timezone
+from os import PathLike
+from pathlib import Path
+from typing import IO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+__all__ = ['MAX_IFD_VALUES', 'MAX_ASCII_LENGTH', 'COMPRESSION_NAMES', 'Ifd', 'IfdReader', 'ExifDates', 'RawHeader',
+           'TiffInfo', 'parse_exif_datetime', 'read_exif_dates', 'exif_dates_from_bytes', 'read_raw_header',
+           'read_tiff_info', 'read_tiff_infos']
+
+# Tags with more values than this (strip and tile offsets, curves) are not loaded
+MAX_IFD_VALUES: int = 64
+MAX_ASCII_LENGTH: int = 1024
+
+# Baseline and extension tags this module uses
+TAG_NEW_SUBFILE_TYPE = 0x00FE
+TAG_IMAGE_WIDTH = 0x0100
+TAG_IMAGE_LENGTH = 0x0101
+TAG_BITS_PER_SAMPLE = 0x0102
+TAG_COMPRESSION = 0x0103
+TAG_PHOTOMETRIC = 0x0106
+TAG_SAMPLES_PER_PIXEL = 0x0115
+TAG_X_RESOLUTION = 0x011A
+TAG_Y_RESOLUTION = 0x011B
+TAG_RESOLUTION_UNIT = 0x0128
+TAG_DATE_TIME = 0x0132
+TAG_SUB_IFDS = 0x014A
+TAG_EXTRA_SAMPLES = 0x0152
+TAG_EXIF_IFD = 0x8769
+TAG_DATE_TIME_ORIGINAL = 0x9003
+TAG_DATE_TIME_DIGITIZED = 0x9004
+TAG_OFFSET_TIME = 0x9010
+TAG_OFFSET_TIME_ORIGINAL = 0x9011
+TAG_OFFSET_TIME_DIGITIZED = 0x9012
+TAG_SUBSEC_TIME = 0x9290
+TAG_SUBSEC_TIME_ORIGINAL = 0x9291
+TAG_SUBSEC_TIME_DIGITIZED = 0x9292
+
+# The only tags read_exif_dates decodes, in IFD0 and in the Exif IFD
+_IFD0_DATE_TAGS = frozenset([TAG_DATE_TIME, TAG_EXIF_IFD])
+_EXIF_DATE_TAGS = frozenset([TAG_DATE_TIME_ORIGINAL, TAG_DATE_TIME_DIGITIZED, TAG_OFFSET_TIME,
+                             TAG_OFFSET_TIME_ORIGINAL, TAG_OFFSET_TIME_DIGITIZED, TAG_SUBSEC_TIME,
+                             TAG_SUBSEC_TIME_ORIGINAL, TAG_SUBSEC_TIME_DIGITIZED])
+
+# Compression tag -> image_file_infos.tiff_compression, with PIL's names. Others are 'other'
+COMPRESSION_NAMES: Dict[int, str] = {
+    1: 'raw',
+    2: 'tiff_ccitt',
+    3: 'group3',
+    4: 'group4',
+    5: 'tiff_lzw',
+    6: 'tiff_jpeg',
+    7: 'jpeg',
+    8: 'tiff_adobe_deflate',
+    # PIL's tiff_deflate, the same codec under its pre-standard code
+    32946: 'tiff_adobe_deflate',
+    34925: 'lzma',
+}
+
+# (PhotometricInterpretation, BitsPerSample) -> the mode PIL opens the image with
+_MODES: Dict[Tuple[int, tuple], str] = {
+    (0, (1,)): '1',
+    (1, (1,)): '1',
+    (0, (8,)): 'L',
+    (1, (8,)): 'L',
+    (1, (16,)): 'I;16',
+    (2, (8, 8, 8)): 'RGB',
+    (3, (1,)): 'P',
+    (3, (2,)): 'P',
+    (3, (4,)): 'P',
+    (3, (8,)): 'P',
+    (5, (8, 8, 8, 8)): 'CMYK',
+    (6, (8, 8, 8)): 'RGB',
+}
+
+# PhotometricInterpretation of sensor data: CFA (ARW, NEF, DNG) and LinearRaw (DNG)
+RAW_PHOTOMETRICS = frozenset([32803, 34892])
+
+# TIFF field type: (struct format, size in bytes)
+_FIELD_TYPES: Dict[int, Tuple[str, int]] = {
+    1: ('B', 1),  # BYTE
+    2: ('s', 1),  # ASCII
+    3: ('H', 2),  # SHORT
+    4: ('I', 4),  # LONG
+    5: ('II', 8),  # RATIONAL
+    6: ('b', 1),  # SBYTE
+    7: ('B', 1),  # UNDEFINED
+    8: ('h', 2),  # SSHORT
+    9: ('i', 4),  # SLONG
+    10: ('ii', 8),  # SRATIONAL
+    11: ('f', 4),  # FLOAT
+    12: ('d', 8),  # DOUBLE
+    13: ('I', 4),  # IFD
+    16: ('Q', 8),  # LONG8
+    17: ('q', 8),  # SLONG8
+    18: ('Q', 8),  # IFD8
+}
+
+# Classic TIFF, then the private magics of Olympus ORF and Panasonic RW2
+_CLASSIC_MAGICS = (42, 0x4F52, 0x5352, 0x55)
+_BIGTIFF_MAGIC = 43
+
+# tag -> values. ASCII values are a str, the others a tuple
+Ifd = Dict[int, Union[str, tuple]]
+
+
+class IfdReader:
+    """
+    Reads IFDs from a binary file object positioned anywhere. Only the header,
+    the IFD entries and the values of tags with at most MAX_IFD_VALUES values
+    are read.
+    """
+
+    def __init__(self, f: IO[bytes]):
+        """
+        :param f: seekable binary file object of a TIFF-based file
+        :raise ValueError: if f is not a TIFF
+        """
+        self._f = f
+        header = self._read(0, 16)
+        if header[:2] == b'II':
+            self.byte_order = '<'
+        elif header[:2] == b'MM':
+            self.byte_order = '>'
+        else:
+            raise ValueError("Not a TIFF file")
+        magic = struct.unpack(self.byte_order + 'H', header[2:4])[0]
+        if magic == _BIGTIFF_MAGIC:
+            self.bigtiff = True
+            self.first_ifd = struct.unpack(self.byte_order + 'Q', header[8:16])[0]
+        elif magic in _CLASSIC_MAGICS:
+            self.bigtiff = False
+            self.first_ifd = struct.unpack(self.byte_order + 'I', header[4:8])[0]
+        else:
+            raise ValueError(f"Not a TIFF file, magic {magic}")
+
+    def _read(self, offset: int, size: int) -> bytes:
+        self._f.seek(offset)
+        data = self._f.read(size)
+        if len(data) < size:
+            raise ValueError(f"Truncated TIFF: {size} bytes wanted at {offset}")
+        return data
+
+    def read_ifd(self, offset: int, tags: Optional[frozenset] = None) -> Tuple[Ifd, int]:
+        """
+        :param offset: file offset of the IFD
+        :param tags: if given, only these tags are decoded
+        :return: the IFD's loaded tags, and the offset of the next IFD (0 if none)
+        """
+        if self.bigtiff:
+            count_format, entry_format, entry_size, inline_size = 'Q', 'HHQ8s', 20, 8
+        else:
+            count_format, entry_format, entry_size, inline_size = 'H', 'HHI4s', 12, 4
+        count_size = struct.calcsize(count_format)
+        entry_count = struct.unpack(self.byte_order + count_format, self._read(offset, count_size))[0]
+        next_size = 8 if self.bigtiff else 4
+        raw = self._read(offset + count_size, entry_count * entry_size + next_size)
+        ifd: Ifd = {}
+        for i in range(entry_count):
+            tag, field_type, count, value = struct.unpack_from(self.byte_order + entry_format, raw, i * entry_size)
+            if tags is not None and tag not in tags:
+                continue
+            if field_type not in _FIELD_TYPES or count > (MAX_ASCII_LENGTH if field_type == 2 else MAX_IFD_VALUES):
+                continue
+            value_format, value_size = _FIELD_TYPES[field_type]
+            size = value_size * count
+            if size > inline_size:
+                value_offset = struct.unpack(self.byte_order + ('Q' if self.bigtiff else 'I'), value)[0]
+                value = self._read(value_offset, size)
+            ifd[tag] = self._decode(field_type, value_format, count, value[:size])
+        next_offset = struct.unpack_from(self.byte_order + ('Q' if self.bigtiff else 'I'), raw,
+                                         entry_count * entry_size)[0]
+        return ifd, next_offset
+
+    def _decode(self, field_type: int, value_format: str, count: int, data: bytes) -> Union[str, tuple]:
+        if field_type == 2:
+            return data.split(b'\x00', 1)[0].decode('latin-1').strip()
+        return struct.unpack(f"{self.byte_order}{value_format * count}", data)
+
+    def ifds(self) -> Iterator[Ifd]:
+        """
+        The IFDs of the main chain (the pages of a TIFF), in order
+        """
+        seen = set()
+        offset = self.first_ifd
+        while offset and offset not in seen:
+            seen.add(offset)
+            ifd, offset = self.read_ifd(offset)
+            yield ifd
+
+    def sub_ifds(self, ifd: Ifd) -> List[Ifd]:
+        """
+        The IFDs an IFD's SubIFDs tag points to
+        """
+        return [self.read_ifd(offset)[0] for offset in ifd.get(TAG_SUB_IFDS, ())]
+
+
+def parse_exif_datetime(value: Optional[str], offset: Optional[str] = None,
+                        subsec: Optional[str] = None) -> Optional[datetime]:
+    """
+    :param value: EXIF date 'YYYY:MM:DD HH:MM:SS'
+    :param offset: its EXIF time zone offset '+HH:MM', if any
+    :param subsec: its EXIF fraction of second digits, if any
+    :return: the date, aware if offset is given, or None if value is missing, blank or zeroed out
+    """
+    try:
+        date = datetime.strptime(value[:19], '%Y:%m:%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return None
+    if subsec and subsec.isdigit():
+        date = date.replace(microsecond=int(subsec[:6].ljust(6, '0')))
+    if offset and len(offset) == 6 and offset[0] in '+-' and offset[3] == ':' and \
+            offset[1:3].isdigit() and offset[4:].isdigit():
+        delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[4:]))
+        date = date.replace(tzinfo=timezone(-delta if offset[0] == '-' else delta))
+    return date
+
+
+class ExifDates(NamedTuple):
+    """
+    The EXIF dates of an image, with their time zone offset and fraction of second when present
+    """
+    # when the picture was taken
+    date_time_original: Optional[datetime] = None
+    # when it was digitized (scanned), the same as date_time_original for digital cameras
+    date_time_digitized: Optional[datetime] = None
+    # when the file was last changed
+    date_time: Optional[datetime] = None
+
+
+def read_exif_dates(reader: IfdReader, ifd0: Optional[Ifd] = None) -> ExifDates:
+    """
+    The dates of IFD0 and of its Exif IFD (0x8769), decoding only the date,
+    offset and subsec tags.
+    :param reader: reader of a TIFF, a TIFF-based raw or an EXIF block
+    :param ifd0: IFD0, if the caller already read it with TAG_DATE_TIME and TAG_EXIF_IFD
+    """
+    if ifd0 is None:
+        ifd0 = reader.read_ifd(reader.first_ifd, _IFD0_DATE_TAGS)[0]
+    exif_offset = ifd0.get(TAG_EXIF_IFD)
+    exif = reader.read_ifd(exif_offset[0], _EXIF_DATE_TAGS)[0] if exif_offset else {}
+    return ExifDates(
+        parse_exif_datetime(exif.get(TAG_DATE_TIME_ORIGINAL), exif.get(TAG_OFFSET_TIME_ORIGINAL),
+                            exif.get(TAG_SUBSEC_TIME_ORIGINAL)),
+        parse_exif_datetime(exif.get(TAG_DATE_TIME_DIGITIZED), exif.get(TAG_OFFSET_TIME_DIGITIZED),
+                            exif.get(TAG_SUBSEC_TIME_DIGITIZED)),
+        parse_exif_datetime(ifd0.get(TAG_DATE_TIME), exif.get(TAG_OFFSET_TIME), exif.get(TAG_SUBSEC_TIME)))
+
+
+def exif_dates_from_bytes(data: Optional[bytes]) -> ExifDates:
+    """
+    read_exif_dates of an EXIF block, as JPEG APP1 segments and PIL's info['exif'] hold it
+    :param data: the block, with or without its 'Exif\\0\\0' prefix
+    :return: the dates, all None if data is missing or malformed
+    """
+    if not data:
+        return ExifDates()
+    if data.startswith(b'Exif\x00\x00'):
+        data = data[6:]
+    try:
+        return read_exif_dates(IfdReader(io.BytesIO(data)))
+    except (ValueError, struct.error):
+        return ExifDates()
+
+
+class RawHeader(NamedTuple):
+    # dimensions of the sensor data IFD
+    width: int
+    height: int
+    dates: ExifDates
+    # of the first sample, None without BitsPerSample
+    bits_per_sample: Optional[int] = None
+
+
+def _raw_ifd(reader: IfdReader, ifd0: Ifd) -> Optional[Ifd]:
+    """
+    The full resolution sensor data IFD: among IFD0, its SubIFDs and the following
+    IFDs, the largest CFA or LinearRaw one
+    """
+    candidates = [ifd0] + reader.sub_ifds(ifd0)
+    for ifd in list(reader.ifds())[1:]:
+        candidates.append(ifd)
+        candidates.extend(reader.sub_ifds(ifd))
+    best = None
+    for ifd in candidates:
+        if ifd.get(TAG_PHOTOMETRIC, (None,))[0] not in RAW_PHOTOMETRICS:
+            continue
+        if ifd.get(TAG_NEW_SUBFILE_TYPE, (0,))[0] & 1 or TAG_IMAGE_WIDTH not in ifd or TAG_IMAGE_LENGTH not in ifd:
+            continue
+        if best is None or ifd[TAG_IMAGE_WIDTH][0] * ifd[TAG_IMAGE_LENGTH][0] > \
+                best[TAG_IMAGE_WIDTH][0] * best[TAG_IMAGE_LENGTH][0]:
+            best = ifd
+    return best
+
+
+def read_raw_header(source: Union[Path, IO[bytes]]) -> Optional[RawHeader]:
+    """
+    Dimensions and EXIF dates of a TIFF-based raw file (ARW, NEF, DNG...),
+    from its IFDs alone.
+    :param source: path or seekable binary file object
+    :return: the header, or None if it has no sensor data IFD with dimensions
+    (CR2 for instance, whose raw IFD has no ImageWidth), or is not a TIFF
+    """
+    if isinstance(source, Path):
+        with open(source, 'rb') as f:
+            return read_raw_header(f)
+    try:
+        reader = IfdReader(source)
+        ifd0 = reader.read_ifd(reader.first_ifd)[0]
+        raw_ifd = _raw_ifd(reader, ifd0)
+        if raw_ifd is None:
+            return None
+        dates = read_exif_dates(reader, ifd0)
+    except (ValueError, struct.error):
+        return None
+    return RawHeader(raw_ifd[TAG_IMAGE_WIDTH][0], raw_ifd[TAG_IMAGE_LENGTH][0], dates,
+                     raw_ifd.get(TAG_BITS_PER_SAMPLE, (None,))[0])
+
+
+class TiffInfo(NamedTuple):
+    """
+    What a TIFF's IFDs say about it. All but page_count describe the first page
+    """
+    page_count: int
+    width: int
+    height: int
+    # COMPRESSION_NAMES value
+    compression: str
+    bits_per_sample: tuple
+    # PIL mode, None when the IFD does not map to one of the common ones
+    mode: Optional[str]
+    # dots per inch (x, y), None without XResolution / YResolution
+    resolution: Optional[Tuple[float, float]]
+    # dates of the first page
+    dates: ExifDates
+
+
+def _rational(value: Optional[tuple]) -> Optional[float]:
+    if not value or not value[1]:
+        return None
+    return value[0] / value[1]
+
+
+def _mode(ifd: Ifd, byte_order: str) -> Optional[str]:
+    photometric = ifd.get(TAG_PHOTOMETRIC, (None,))[0]
+    bits_per_sample = ifd.get(TAG_BITS_PER_SAMPLE, (1,))
+    if photometric == 2 and bits_per_sample == (8, 8, 8, 8):
+        # RGB with an associated or unassociated alpha
+        return 'RGBA' if ifd.get(TAG_EXTRA_SAMPLES, (0,))[0] in (1, 2) else None
+    mode = _MODES.get((photometric, bits_per_sample))
+    if mode == 'I;16' and byte_order == '>':
+        return 'I;16B'
+    return mode
+
+
+def _tiff_info(reader: IfdReader) -> TiffInfo:
+    page_count = 0
+    first: Optional[Ifd] = None
+    for ifd in reader.ifds():
+        if first is None:
+            first = ifd
+        # reduced resolution images (thumbnails) are not pages
+        if not ifd.get(TAG_NEW_SUBFILE_TYPE, (0,))[0] & 1:
+            page_count += 1
+    if first is None or TAG_IMAGE_WIDTH not in first or TAG_IMAGE_LENGTH not in first:
+        raise ValueError("TIFF without image dimensions")
+    x, y = _rational(first.get(TAG_X_RESOLUTION)), _rational(first.get(TAG_Y_RESOLUTION))
+    resolution = None
+    if x is not None and y is not None:
+        # ResolutionUnit 2 (inch) is the default, 3 is centimeter, 1 is a bare aspect ratio
+        unit = first.get(TAG_RESOLUTION_UNIT, (2,))[0]
+        resolution = (x * 2.54, y * 2.54) if unit == 3 else (x, y)
+    return TiffInfo(
+        page_count=page_count,
+        width=first[TAG_IMAGE_WIDTH][0],
+        height=first[TAG_IMAGE_LENGTH][0],
+        compression=COMPRESSION_NAMES.get(first.get(TAG_COMPRESSION, (1,))[0], 'other'),
+        bits_per_sample=first.get(TAG_BITS_PER_SAMPLE, (1,)),
+        mode=_mode(first, reader.byte_order),
+        resolution=resolution,
+        dates=read_exif_dates(reader, first))
+
+
+def read_tiff_info(source: Union[PathLike, IO[bytes]], use_mmap: bool = False) -> TiffInfo:
+    """
+    Page count, compression, bits per sample, resolution and EXIF dates of a TIFF or
+    BigTIFF, from its IFDs alone: no strip or tile is ever read.
+    :param source: path or seekable binary file object
+    :param use_mmap: map the file instead of reading it, when source is a path
+    :raise ValueError: if source is not a readable TIFF
+    """
+    if not isinstance(source, (str, PathLike)):
+        try:
+            return _tiff_info(IfdReader(source))
+        except struct.error as e:
+            raise ValueError(f"Malformed TIFF: {e}")
+    with open(source, 'rb') as f:
+        if not use_mmap:
+            return read_tiff_info(f)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return read_tiff_info(mapped)
+
+
+def read_tiff_infos(paths: Iterable[Union[str, PathLike]], use_mmap: bool = True) \
+        -> Iterator[Tuple[Union[str, PathLike], Optional[TiffInfo]]]:
+    """
+    read_tiff_info over many files, memory-mapped by default: an IFD walk then
+    costs page faults on the few pages it touches instead of read calls
+    :return: (path, TiffInfo or None if the file is not a readable TIFF), in the order of paths
+    """
+    for path in paths:
+        try:
+            yield path, read_tiff_info(path, use_mmap)
+        except (OSError, ValueError):
+            yield path, None
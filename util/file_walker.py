@@ -0,0 +1,171 @@
+"""
+Streaming directory walker over archive roots and OCFL object trees
+"""
+import os
+from datetime import datetime
+from fnmatch import fnmatch
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from util import time_proc
+
+__all__ = ['ROOT_FOLDERS', 'StorageObject', 'WalkEntry', 'root_folder_of', 'image_group_of', 'walk_files']
+
+# storage.paths.root_folder enum, except 'other' which is whatever is not one of these
+ROOT_FOLDERS = ('images', 'archive', 'sources', 'backup', 'eBooks', 'web')
+
+
+class StorageObject(NamedTuple):
+    """
+    The storage.objects row of the OCFL object a file is in
+    """
+    bdrc_id: str
+    # path of the object root relative to the walked root, with '/' separators
+    rel_path: str
+    created_at: Optional[datetime] = None
+    last_modified_at: Optional[datetime] = None
+
+    def content_path(self, rel_path: str) -> str:
+        """
+        Path of a file of the object relative to the object root, which is what storage.paths.path holds
+        :param rel_path: the file's path relative to the walked root
+        """
+        return rel_path[len(self.rel_path):].lstrip('/') if self.rel_path else rel_path
+
+
+class WalkEntry(NamedTuple):
+    """
+    A file found by walk_files. Picklable, unlike os.DirEntry, so it can be sent to workers.
+    """
+    path: str
+    stat: os.stat_result
+    root_folder: Optional[str]
+    # path relative to the walked root, with '/' separators
+    rel_path: str = ''
+    # the file's digest (FileInfo.DIGEST_ALGORITHM), when known without reading it, e.g. from an OCFL inventory
+    digest: Optional[bytes] = None
+    # the OCFL object the file is in, if known
+    storage_object: Optional[StorageObject] = None
+    # the image group RID, when it is not image_group_of(rel_path), e.g. from an OCFL logical path
+    image_group: Optional[str] = None
+
+
+def root_folder_of(relative_path: str) -> Optional[str]:
+    """
+    The first component of a path which names a storage root folder
+    (W1ER169/sources/W1ER169-I1ER1069/a.pdf -> 'sources')
+    :param relative_path: path relative to the walked root
+    :return: one of ROOT_FOLDERS or None
+    """
+    for part in relative_path.replace(os.sep, '/').split('/')[:-1]:
+        if part in ROOT_FOLDERS:
+            return part
+    return None
+
+
+def image_group_of(relative_path: str) -> Optional[str]:
+    """
+    The image group RID of a path, from the folder under its root folder
+    (W1ER169/sources/W1ER169-I1ER1069/a.pdf -> 'I1ER1069')
+    :param relative_path: path relative to the walked root
+    :return: the image group RID, or None if the path has no image group folder
+    """
+    parts = relative_path.replace(os.sep, '/').split('/')[:-1]
+    for i, part in enumerate(parts[:-1]):
+        if part in ROOT_FOLDERS:
+            work_and_group = parts[i + 1].split('-', 1)
+            return work_and_group[1] if len(work_and_group) == 2 and work_and_group[1] else None
+    return None
+
+
+def _matches(name: str, relative_path: str, patterns: Iterable[str]) -> bool:
+    return any(fnmatch(name, pattern) or fnmatch(relative_path, pattern) for pattern in patterns)
+
+
+def walk_files(root: str, include: Iterable[str] = (), exclude: Iterable[str] = (),
+               root_folders: Optional[Iterable[str]] = None, max_depth: Optional[int] = None,
+               follow_symlinks: bool = False, prune: Optional[Callable[[str], bool]] = None,
+               on_directory_listed: Optional[Callable[[str, List[str]], None]] = None) -> Iterator[WalkEntry]:
+    """
+    Recursively yield the files under root as they are found. Each file is
+    stat-ed exactly once, and only one directory is held open at a time, so
+    the walk never builds a list of the files under root.
+
+    Patterns are fnmatch globs, tested against both the entry name and its
+    path relative to root (which uses '/').
+    :param root: directory to walk
+    :param include: if given, only files matching one of these are yielded
+    :param exclude: files and directories matching any of these are skipped
+    :param root_folders: if given, only files under one of these root folders are yielded
+    :param max_depth: 1 means only the files directly in root. None is unlimited
+    :param follow_symlinks: descend into symlinked directories and stat link targets
+    :param prune: called with the relative path of each directory ('' for root, else ending in '/'):
+    if it returns True, the directory is not walked at all
+    :param on_directory_listed: called once all the files of a directory have been yielded, with its
+    relative path and those of the subdirectories which will be walked. Parents are always listed before
+    their subdirectories
+
+    Directories and files which cannot be read (OSError) are reported and skipped. A directory which could
+    not be listed in full is not passed to on_directory_listed, so that a checkpoint leaves it to a resumed walk.
+    """
+    include = list(include)
+    exclude = list(exclude)
+    wanted = set(root_folders) if root_folders is not None else None
+    # (directory, path relative to root, depth, root folder of the directory)
+    stack: List[Tuple[str, str, int, Optional[str]]] = [(root, '', 1, None)] if not (prune and prune('')) else []
+    while stack:
+        directory, rel_dir, depth, dir_root_folder = stack.pop()
+        subdirs: List[str] = []
+        try:
+            it = os.scandir(directory)
+        except OSError as e:
+            print(f"Skipping directory {directory}. Error {e}")
+            continue
+        listed = True
+        with it:
+            while True:
+                try:
+                    entry = next(it, None)
+                except OSError as e:
+                    print(f"Skipping the rest of directory {directory}. Error {e}")
+                    listed = False
+                    break
+                if entry is None:
+                    break
+                rel_path = rel_dir + entry.name
+                if exclude and _matches(entry.name, rel_path, exclude):
+                    continue
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=follow_symlinks)
+                    is_file = not is_dir and entry.is_file(follow_symlinks=follow_symlinks)
+                except OSError as e:
+                    print(f"Skipping {entry.path}. Error {e}")
+                    continue
+                if is_dir:
+                    if max_depth is not None and depth >= max_depth:
+                        continue
+                    sub_root_folder = dir_root_folder
+                    if sub_root_folder is None and entry.name in ROOT_FOLDERS:
+                        sub_root_folder = entry.name
+                    # Prune whole root folders which were not asked for
+                    if wanted is not None and sub_root_folder is not None and sub_root_folder not in wanted:
+                        continue
+                    if prune and prune(rel_path + '/'):
+                        continue
+                    stack.append((entry.path, rel_path + '/', depth + 1, sub_root_folder))
+                    subdirs.append(rel_path + '/')
+                    continue
+                if not is_file:
+                    continue
+                if wanted is not None and dir_root_folder not in wanted:
+                    continue
+                if include and not _matches(entry.name, rel_path, include):
+                    continue
+                try:
+                    with time_proc.stage('stat', time_proc.ANY_FORMAT):
+                        st = entry.stat(follow_symlinks=follow_symlinks)
+                except OSError as e:
+                    print(f"Skipping {entry.path}. Error {e}")
+                    continue
+                yield WalkEntry(entry.path, st, dir_root_folder, rel_path)
+        if on_directory_listed and listed:
+            on_directory_listed(rel_dir, subdirs)
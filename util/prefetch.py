@@ -0,0 +1,139 @@
+"""
+Read-ahead of files for the extractors, for archive roots on network mounts
+"""
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from util import time_proc
+from util.file_walker import WalkEntry
+
+__all__ = ['DEFAULT_MAX_IN_FLIGHT', 'DEFAULT_MAX_BYTES', 'POOL_CHUNK_SIZE', 'Prefetcher']
+
+DEFAULT_MAX_IN_FLIGHT: int = 16
+DEFAULT_MAX_BYTES: int = 256 * 1024 * 1024
+
+# Chunk size of pool.imap_unordered over prefetch(). A pool sends nothing to its workers before it has
+# a whole chunk, and prefetch() blocks until bytes are released: with larger chunks, a byte cap
+# holding fewer files than a chunk deadlocks
+POOL_CHUNK_SIZE: int = 1
+
+
+def _read(path: str) -> bytes:
+    with time_proc.stage('read', time_proc.ANY_FORMAT), open(path, 'rb') as fh:
+        return fh.read()
+
+
+class Prefetcher:
+    """
+    Keeps up to max_in_flight file reads going in threads, ahead of whoever
+    consumes the files, so that the per-file round trip of a network mount is
+    paid concurrently rather than once per file.
+
+    Buffered bytes are capped: a file's size is reserved when its read starts,
+    and given back by release() once the consumer is done with its bytes. Reads
+    are not started while the reservations would exceed max_bytes (except for a
+    single read, so that one file larger than max_bytes still gets through).
+    Since multiprocessing pools pull their input from a feeder thread, release()
+    is what keeps a pool from draining all the files into memory. Pools must take
+    the files POOL_CHUNK_SIZE at a time.
+    """
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_file_size: Optional[int] = None, read: Callable[[str], bytes] = _read):
+        """
+        :param max_in_flight: concurrent reads
+        :param max_bytes: cap on the bytes read and not yet released
+        :param max_file_size: larger files are not read ahead: they come out with None bytes
+        :param read: reads a whole file from its path
+        """
+        self.max_in_flight = max_in_flight
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self._read = read
+        self._executor = ThreadPoolExecutor(max_in_flight, thread_name_prefix='prefetch')
+        self._reserved = 0
+        self._released = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    @property
+    def reserved(self) -> int:
+        """
+        Bytes read or being read, and not released yet
+        """
+        return self._reserved
+
+    def release(self, nbytes: int):
+        """
+        Give back the bytes of a file yielded by prefetch, once they are no longer needed
+        """
+        if not nbytes:
+            return
+        with self._released:
+            self._reserved -= nbytes
+            self._released.notify_all()
+
+    def _reserve(self, nbytes: int) -> bool:
+        with self._released:
+            if self._reserved and self._reserved + nbytes > self.max_bytes:
+                return False
+            self._reserved += nbytes
+            return True
+
+    def _wait_for_room(self, nbytes: int):
+        with self._released:
+            self._released.wait_for(lambda: not self._reserved or self._reserved + nbytes <= self.max_bytes)
+
+    def prefetch(self, entries: Iterable[WalkEntry]) -> Iterator[Tuple[WalkEntry, Optional[bytes]]]:
+        """
+        Read entries ahead, and yield them as their reads complete, not in the order of entries.
+        The consumer must release(len(data)) for every file yielded with data. A consumer
+        iterating in the same thread must do so before taking the next file, or it may block.
+        :return: (entry, its content) or (entry, None) for files over max_file_size or which could not be read,
+        which the consumer reads itself (and reports the error of)
+        """
+        entries = iter(entries)
+        pending: Dict[Future, Tuple[WalkEntry, int]] = {}
+        waiting: Optional[WalkEntry] = None
+        exhausted = False
+        while True:
+            # start reads while there is room
+            while not exhausted and len(pending) < self.max_in_flight:
+                entry = waiting if waiting is not None else next(entries, None)
+                waiting = None
+                if entry is None:
+                    exhausted = True
+                    break
+                size = entry.stat.st_size
+                if self.max_file_size is not None and size > self.max_file_size:
+                    yield entry, None
+                    continue
+                if not self._reserve(size):
+                    waiting = entry
+                    break
+                pending[self._executor.submit(self._read, entry.path)] = (entry, size)
+            if not pending:
+                if exhausted:
+                    return
+                # everything buffered is held by the consumer
+                self._wait_for_room(waiting.stat.st_size)
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                entry, size = pending.pop(future)
+                try:
+                    data = future.result()
+                except OSError:
+                    data = None
+                # hold on to what was actually read, which may differ if the file changed
+                self.release(size - (len(data) if data is not None else 0))
+                yield entry, data
+
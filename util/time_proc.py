@@ -0,0 +1,325 @@
+"""
+Per-stage timing of the scan: where the time of a slow run goes (walking, reading,
+hashing, pypdf, the database...)
+
+The stages are timed with stage(), a context manager, or timed(), a decorator:
+
+    with time_proc.stage('hash'):
+        digest = ...
+
+Timings of a stage are kept per file format, as a histogram of log-spaced buckets,
+so that recording is a bisect and a few additions. Stages timed without a format
+are accumulated for the file being processed, and recorded under its format once
+file_done() is called (the format is only known after sniffing, and some stages
+run before that). Stages which are not about one file (stat by the walker,
+database batches) are recorded under ANY_FORMAT.
+
+Timing is off until enable() is called, and costs one attribute test per stage then.
+Worker processes drain() their timings into the records they return, and the main
+process merge()s them.
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+__all__ = ['STAGES', 'ANY_FORMAT', 'UNKNOWN_FORMAT', 'BUCKET_BOUNDS', 'Histogram', 'StageTimings', 'TIMINGS',
+           'enable', 'enabled', 'stage', 'timed', 'note_format', 'file_done', 'drain', 'merge', 'summary',
+           'dump_json', 'dump_periodically']
+
+# In the order of a file's trip through the scan
+STAGES = ('stat', 'read', 'hash', 'sniff', 'parse', 'db_write', 'db_commit')
+
+# Format of stages which are not about one file
+ANY_FORMAT = '*'
+# Format of files done before, or without, sniffing
+UNKNOWN_FORMAT = 'unknown'
+
+# Upper bounds of the histogram buckets, in seconds: 10µs doubling up to about 3 minutes,
+# and a last bucket for anything longer
+BUCKET_BOUNDS: Tuple[float, ...] = tuple(10e-6 * 2 ** i for i in range(25))
+
+# drain() output: {(stage, format): (count, total seconds, max seconds, bucket counts)}
+Snapshot = Dict[Tuple[str, str], Tuple[int, float, float, Tuple[int, ...]]]
+
+T = TypeVar('T')
+
+
+class Histogram:
+    """
+    Latencies of one stage and format
+    """
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+
+    def merge(self, count: int, total: float, max_seconds: float, buckets: Iterable[int]):
+        self.count += count
+        self.total += total
+        self.max = max(self.max, max_seconds)
+        for i, n in enumerate(buckets):
+            self.buckets[i] += n
+
+    def quantile(self, fraction: float) -> float:
+        """
+        Upper bound of the bucket of this quantile, capped by the maximum
+        :param fraction: 0.5 for the median
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, round(fraction * self.count))
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[i], self.max) if i < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total_s': self.total,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.quantile(0.50) * 1000,
+            'p90_ms': self.quantile(0.90) * 1000,
+            'p99_ms': self.quantile(0.99) * 1000,
+            'max_ms': self.max * 1000,
+            'buckets': list(self.buckets),
+        }
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('_timings', '_name', '_format', '_start')
+
+    def __init__(self, timings: 'StageTimings', name: str, format_name: Optional[str]):
+        self._timings = timings
+        self._name = name
+        self._format = format_name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        elapsed = time.perf_counter() - self._start
+        if self._format is None:
+            self._timings._accumulate(self._name, elapsed)
+        else:
+            self._timings.add(self._name, self._format, elapsed)
+        return False
+
+
+class StageTimings:
+    """
+    Histograms by (stage, format), and the stages of the file being processed in each thread
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+        self._current = threading.local()
+
+    def stage(self, name: str, format_name: Optional[str] = None):
+        """
+        Context manager timing its block
+        :param name: one of STAGES
+        :param format_name: record under this format. None adds to the current file, see file_done
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, format_name)
+
+    def timed(self, name: str, format_name: Optional[str] = None):
+        """
+        Decorator timing every call of a function, see stage
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name, format_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add(self, name: str, format_name: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get((name, format_name))
+            if histogram is None:
+                histogram = self._histograms[(name, format_name)] = Histogram()
+            histogram.add(seconds)
+
+    def _pending(self) -> Dict[str, float]:
+        pending = getattr(self._current, 'stages', None)
+        if pending is None:
+            pending = self._current.stages = {}
+        return pending
+
+    def _accumulate(self, name: str, seconds: float):
+        pending = self._pending()
+        pending[name] = pending.get(name, 0.0) + seconds
+
+    def note_format(self, format_name: Optional[str]):
+        """
+        Set the format of the file being processed in this thread
+        """
+        if self.enabled:
+            self._current.format = format_name
+
+    def file_done(self, format_name: Optional[str] = None):
+        """
+        Record the stages of the file being processed in this thread, each as one sample
+        :param format_name: its format. Default: the one given to note_format, else UNKNOWN_FORMAT
+        """
+        if not self.enabled:
+            return
+        format_name = format_name or getattr(self._current, 'format', None) or UNKNOWN_FORMAT
+        pending = self._pending()
+        for name, seconds in pending.items():
+            self.add(name, format_name, seconds)
+        pending.clear()
+        self._current.format = None
+
+    def drain(self) -> Snapshot:
+        """
+        Take the recorded timings out, e.g. to send them to another process
+        """
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+        return {key: (h.count, h.total, h.max, tuple(h.buckets)) for key, h in histograms.items()}
+
+    def merge(self, snapshot: Snapshot):
+        """
+        Add timings taken out by drain()
+        """
+        with self._lock:
+            for key, (count, total, max_seconds, buckets) in snapshot.items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram()
+                histogram.merge(count, total, max_seconds, buckets)
+
+    def _sorted(self) -> List[Tuple[str, str, Histogram]]:
+        order = {name: i for i, name in enumerate(STAGES)}
+        with self._lock:
+            items = list(self._histograms.items())
+        return [(name, format_name, h) for (name, format_name), h in
+                sorted(items, key=lambda item: (order.get(item[0][0], len(STAGES)), item[0][0], item[0][1]))]
+
+    def to_dict(self) -> dict:
+        return {
+            'bucket_bounds_ms': [bound * 1000 for bound in BUCKET_BOUNDS],
+            'stages': [dict(stage=name, format=format_name, **h.to_dict()) for name, format_name, h in self._sorted()]
+        }
+
+    def summary(self) -> str:
+        """
+        A table of the stages by format, with their share of the total time.
+        Times of worker processes add up, so shares are of the summed time, not of the run's wall time
+        """
+        rows = self._sorted()
+        grand_total = sum(h.total for _, _, h in rows) or 1.0
+        lines = [f"{'stage':<10}{'format':<10}{'count':>9}{'total s':>10}{'share':>7}"
+                 f"{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for name, format_name, h in rows:
+            lines.append(f"{name:<10}{format_name:<10}{h.count:>9}{h.total:>10.2f}{h.total / grand_total:>7.1%}"
+                         f"{h.total / h.count * 1000:>10.2f}{h.quantile(0.5) * 1000:>10.2f}"
+                         f"{h.quantile(0.99) * 1000:>10.2f}{h.max * 1000:>10.2f}")
+        return '\n'.join(lines)
+
+    def dump_json(self, path: Path):
+        """
+        Write to_dict() to path, replacing it in one rename so that readers never see half a file
+        """
+        path = Path(path)
+        scratch = path.with_name(path.name + '.tmp')
+        scratch.write_text(json.dumps(self.to_dict(), indent=1))
+        scratch.replace(path)
+
+    def dump_periodically(self, items: Iterable[T], path: Path, interval: float = 60.0) -> Iterator[T]:
+        """
+        Pass items through, writing dump_json(path) every interval seconds, and once at the end
+        """
+        last = time.monotonic()
+        for item in items:
+            yield item
+            now = time.monotonic()
+            if now - last >= interval:
+                self.dump_json(path)
+                last = now
+        self.dump_json(path)
+
+
+# The timings of this process
+TIMINGS = StageTimings()
+
+
+def enable(on: bool = True):
+    TIMINGS.enabled = on
+
+
+def enabled() -> bool:
+    return TIMINGS.enabled
+
+
+def stage(name: str, format_name: Optional[str] = None):
+    return TIMINGS.stage(name, format_name)
+
+
+def timed(name: str, format_name: Optional[str] = None):
+    return TIMINGS.timed(name, format_name)
+
+
+def note_format(format_name: Optional[str]):
+    TIMINGS.note_format(format_name)
+
+
+def file_done(format_name: Optional[str] = None):
+    TIMINGS.file_done(format_name)
+
+
+def drain() -> Snapshot:
+    return TIMINGS.drain()
+
+
+def merge(snapshot: Snapshot):
+    TIMINGS.merge(snapshot)
+
+
+def summary() -> str:
+    return TIMINGS.summary()
+
+
+def dump_json(path: Path):
+    TIMINGS.dump_json(path)
+
+
+def dump_periodically(items: Iterable[T], path: Path, interval: float = 60.0) -> Iterator[T]:
+    return TIMINGS.dump_periodically(items, path, interval)